@@ -0,0 +1,120 @@
+"""
+Cold archive of closed emergencies and their notifications
+"""
+
+import logging
+
+from django.db import transaction
+
+from db.models import ArchivedEmergency, ArchivedNotification, Emergency, Notification
+from db.sharding import fan_out, get_current_shard
+
+from .serializers import EmergencySerializer, NotificationSerializer
+
+logger = logging.getLogger(__name__)
+
+CLOSED_STATUSES = ["COMPLETED", "CANCELLED"]
+
+
+def archive_emergency_batch(cutoff, batch_size=500):
+    """
+    Move one batch of closed emergencies into the archive tables
+
+    Emergencies created before the cutoff that are COMPLETED or CANCELLED
+    are copied with their notifications and deleted from the hot tables in
+    a single transaction on the current shard.
+
+    Args:
+        cutoff: Aware datetime; only emergencies created before it move
+        batch_size: Maximum number of emergencies to move
+
+    Returns:
+        Tuple of (emergencies archived, notifications archived)
+    """
+    with transaction.atomic(using=get_current_shard()):
+        emergencies = list(
+            Emergency.objects.filter(status__in=CLOSED_STATUSES, created_at__lt=cutoff)
+            .select_related("patient", "assigned_hospital")
+            .order_by("created_at")[:batch_size]
+        )
+        if not emergencies:
+            return 0, 0
+        notifications = list(
+            Notification.objects.filter(emergency__in=emergencies).select_related(
+                "hospital", "user", "emergency"
+            )
+        )
+
+        ArchivedEmergency.objects.bulk_create(
+            [
+                ArchivedEmergency(
+                    id=emergency.id,
+                    patient_id=emergency.patient_id,
+                    assigned_hospital_id=emergency.assigned_hospital_id,
+                    priority=emergency.priority,
+                    status=emergency.status,
+                    created_at=emergency.created_at,
+                    completed_at=emergency.completed_at,
+                    data=data,
+                )
+                for emergency, data in zip(
+                    emergencies, EmergencySerializer(emergencies, many=True).data
+                )
+            ]
+        )
+        ArchivedNotification.objects.bulk_create(
+            [
+                ArchivedNotification(
+                    id=notification.id,
+                    emergency_id=notification.emergency_id,
+                    hospital_id=notification.hospital_id,
+                    user_id=notification.user_id,
+                    notification_type=notification.notification_type,
+                    created_at=notification.created_at,
+                    data=data,
+                )
+                for notification, data in zip(
+                    notifications,
+                    NotificationSerializer(notifications, many=True).data,
+                )
+            ]
+        )
+        Emergency.objects.filter(
+            id__in=[emergency.id for emergency in emergencies]
+        ).delete()
+
+    logger.info(
+        f"Archived {len(emergencies)} emergencies and "
+        f"{len(notifications)} notifications"
+    )
+    return len(emergencies), len(notifications)
+
+
+def get_emergency_history(user):
+    """
+    Get a patient's emergencies from the live and archive tables
+
+    Args:
+        user: Patient User instance
+
+    Returns:
+        List of serialized emergencies, newest first
+    """
+
+    def load(alias):
+        live = list(
+            Emergency.objects.filter(patient=user).select_related(
+                "patient", "assigned_hospital"
+            )
+        )
+        archived = ArchivedEmergency.objects.filter(patient=user).values_list(
+            "created_at", "data"
+        )
+        return [
+            (emergency.created_at, data)
+            for emergency, data in zip(live, EmergencySerializer(live, many=True).data)
+        ] + list(archived)
+
+    history = [item for items in fan_out(load).values() for item in items]
+    history.sort(key=lambda item: item[0], reverse=True)
+    return [data for _, data in history]
@@ -0,0 +1,252 @@
+"""
+Chunked resumable uploads and ranged downloads of medical record attachments
+"""
+
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.http import content_disposition_header
+
+from db.models import AttachmentUpload
+
+COPY_BUFFER_SIZE = 64 * 1024
+
+RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class UploadError(Exception):
+    """A chunk or upload was rejected; carries the HTTP status to return"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+class AssembledFile(File):
+    """
+    Finished part file handed to the storage backend
+
+    FileSystemStorage moves files that expose temporary_file_path() instead
+    of copying them, so attaching a large upload is a rename.
+    """
+
+    def temporary_file_path(self):
+        return self.file.name
+
+
+def create_upload(record, user, filename, size, checksum=""):
+    """
+    Start a chunked upload for a medical record attachment
+
+    Args:
+        record: MedicalRecord instance
+        user: Uploading User
+        filename: Original file name
+        size: Total size in bytes
+        checksum: Optional SHA-256 (hex) of the whole file
+
+    Returns:
+        AttachmentUpload instance
+    """
+    upload = AttachmentUpload.objects.create(
+        medical_record=record,
+        uploaded_by=user,
+        filename=os.path.basename(filename),
+        size=size,
+        checksum=checksum.lower(),
+    )
+    upload.part_path.parent.mkdir(parents=True, exist_ok=True)
+    upload.part_path.touch()
+    return upload
+
+
+def write_chunk(upload, offset, stream, length, checksum):
+    """
+    Append one chunk to an upload
+
+    The chunk is streamed from the request into a scratch file in small
+    buffers while its SHA-256 is computed, so neither the chunk nor the
+    file is held in memory and no database lock is held while a slow
+    client sends it. Verified chunks are then appended to the part file
+    under a row lock.
+
+    Args:
+        upload: AttachmentUpload instance
+        offset: Byte offset the client says the chunk starts at
+        stream: File-like request body
+        length: Chunk length in bytes (Content-Length)
+        checksum: Expected SHA-256 (hex) of the chunk
+
+    Returns:
+        Updated AttachmentUpload instance
+
+    Raises:
+        UploadError: Offset, length or checksum is wrong
+    """
+    max_chunk = getattr(settings, "ATTACHMENT_MAX_CHUNK_SIZE", 8 * 1024 * 1024)
+    if not 0 < length <= max_chunk:
+        raise UploadError(f"Chunks must be 1 to {max_chunk} bytes")
+    if offset != upload.received:
+        raise UploadError(f"Expected offset {upload.received}, got {offset}", 409)
+    if offset + length > upload.size:
+        raise UploadError("Chunk runs past the declared file size")
+
+    digest = hashlib.sha256()
+    with tempfile.TemporaryFile(dir=upload.part_path.parent) as chunk:
+        remaining = length
+        while remaining:
+            data = stream.read(min(COPY_BUFFER_SIZE, remaining))
+            if not data:
+                break
+            chunk.write(data)
+            digest.update(data)
+            remaining -= len(data)
+        if remaining:
+            raise UploadError("Chunk is shorter than its Content-Length")
+        if digest.hexdigest() != checksum.lower():
+            raise UploadError("Chunk checksum mismatch")
+
+        with transaction.atomic():
+            upload = AttachmentUpload.objects.select_for_update().get(pk=upload.pk)
+            if offset != upload.received:
+                # A concurrent request stored this chunk first
+                raise UploadError(
+                    f"Expected offset {upload.received}, got {offset}", 409
+                )
+            chunk.seek(0)
+            with open(upload.part_path, "r+b") as part:
+                part.seek(offset)
+                shutil.copyfileobj(chunk, part, COPY_BUFFER_SIZE)
+                part.truncate()
+            upload.received = offset + length
+            upload.save(update_fields=["received", "updated_at"])
+    return upload
+
+
+def complete_upload(upload):
+    """
+    Attach a fully received upload to its medical record
+
+    Args:
+        upload: AttachmentUpload instance with every byte received
+
+    Returns:
+        Updated MedicalRecord instance
+
+    Raises:
+        UploadError: The whole-file checksum does not match
+    """
+    if upload.checksum:
+        digest = hashlib.sha256()
+        with open(upload.part_path, "rb") as part:
+            for data in iter(lambda: part.read(COPY_BUFFER_SIZE), b""):
+                digest.update(data)
+        if digest.hexdigest() != upload.checksum:
+            discard_upload(upload)
+            raise UploadError("File checksum mismatch; start a new upload")
+
+    record = upload.medical_record
+    previous = record.attachments.name if record.attachments else None
+    record.attachment_filename = upload.filename
+    with open(upload.part_path, "rb") as part:
+        record.attachments.save(upload.filename, AssembledFile(part), save=True)
+    if previous and previous != record.attachments.name:
+        record.attachments.storage.delete(previous)
+    discard_upload(upload)
+    return record
+
+
+def discard_upload(upload):
+    """Delete an upload and its part file"""
+    upload.part_path.unlink(missing_ok=True)
+    upload.delete()
+
+
+def parse_range(header, size):
+    """
+    Parse a single-range "Range: bytes=" header
+
+    Args:
+        header: Range header value, or None
+        size: File size in bytes
+
+    Returns:
+        (start, end) inclusive byte positions, None for the whole file,
+        or False if the range cannot be satisfied
+    """
+    if not header:
+        return None
+    match = RANGE_PATTERN.match(header.strip())
+    if not match or match.groups() == ("", ""):
+        # Multiple ranges or other units: serve the whole file
+        return None
+    first, last = match.groups()
+    if first == "":
+        length = int(last)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def _read_range(file, start, length):
+    try:
+        file.seek(start)
+        while length > 0:
+            data = file.read(min(COPY_BUFFER_SIZE, length))
+            if not data:
+                break
+            length -= len(data)
+            yield data
+    finally:
+        file.close()
+
+
+def attachment_response(record, range_header=None):
+    """
+    Stream a medical record attachment, honouring an HTTP Range header
+
+    Args:
+        record: MedicalRecord instance with an attachment
+        range_header: Value of the request's Range header
+
+    Returns:
+        FileResponse for the whole file, StreamingHttpResponse (206) for a
+        range, or a 416 HttpResponse
+    """
+    attachment = record.attachments
+    size = attachment.size
+    filename = record.attachment_filename or os.path.basename(attachment.name)
+    byte_range = parse_range(range_header, size)
+
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response["Content-Range"] = f"bytes */{size}"
+        return response
+
+    file = attachment.storage.open(attachment.name, "rb")
+    if byte_range is None:
+        response = FileResponse(file, as_attachment=True, filename=filename)
+    else:
+        start, end = byte_range
+        response = StreamingHttpResponse(
+            _read_range(file, start, end - start + 1),
+            status=206,
+            content_type="application/octet-stream",
+        )
+        response["Content-Length"] = str(end - start + 1)
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+        response["Content-Disposition"] = content_disposition_header(True, filename)
+    response["Accept-Ranges"] = "bytes"
+    return response
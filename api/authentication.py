@@ -0,0 +1,133 @@
+"""
+Authentication classes for the elderly healthcare system API
+"""
+
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import (
+    BaseAuthentication,
+    TokenAuthentication,
+    get_authorization_header,
+)
+
+from .tokens import verify_access_token
+
+
+class TokenCache:
+    """
+    Bounded LRU cache of token key -> (user, token) with a TTL
+
+    The cache is per process. Entries are dropped when their token is
+    deleted or their user is saved or deleted in this process; changes made
+    by other processes are picked up when the TTL expires.
+    """
+
+    def __init__(self, max_size=None, ttl=None):
+        self.max_size = max_size or getattr(settings, "TOKEN_AUTH_CACHE_SIZE", 10000)
+        self.ttl = (
+            ttl if ttl is not None else getattr(settings, "TOKEN_AUTH_CACHE_TTL", 60)
+        )
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        """Return the cached (user, token) for a key, or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[2] < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[0], entry[1]
+
+    def set(self, key, user, token):
+        """Cache the (user, token) pair of a key"""
+        with self._lock:
+            self._entries[key] = (user, token, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key):
+        """Drop a token from the cache"""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def invalidate_user(self, user_id):
+        """Drop every token belonging to a user"""
+        with self._lock:
+            for key in [
+                key for key, entry in self._entries.items() if entry[0].pk == user_id
+            ]:
+                del self._entries[key]
+
+    def clear(self):
+        """Drop every entry"""
+        with self._lock:
+            self._entries.clear()
+
+
+token_cache = TokenCache()
+
+
+def _copy_credentials(user, token):
+    """Copy a (user, token) pair so the copies reference each other"""
+    user = copy.copy(user)
+    token = copy.copy(token)
+    token.user = user
+    return user, token
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication that skips the token/user query for cached tokens
+
+    Each request gets its own copy of the cached user and token, so
+    changes made while handling one request never leak into another.
+    """
+
+    def authenticate_credentials(self, key):
+        cached = token_cache.get(key)
+        if cached is not None:
+            return _copy_credentials(*cached)
+
+        user, token = super().authenticate_credentials(key)
+        token_cache.set(key, *_copy_credentials(user, token))
+        return user, token
+
+
+class SignedTokenAuthentication(BaseAuthentication):
+    """
+    Authenticate "Authorization: Bearer <access token>" without the database
+
+    Access tokens are issued by the login endpoint and renewed with a
+    refresh token. A deactivated user, or one whose staff flag was removed,
+    keeps the access of their current token until it expires
+    (ACCESS_TOKEN_LIFETIME). Likewise a user who moves keeps the home
+    region (and so the default shard) of their current token.
+    """
+
+    keyword = "Bearer"
+
+    def authenticate(self, request):
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(auth) != 2:
+            raise exceptions.AuthenticationFailed(_("Invalid bearer token header."))
+
+        user = verify_access_token(auth[1].decode(errors="replace"))
+        if user is None:
+            raise exceptions.AuthenticationFailed(_("Invalid or expired access token."))
+        return (user, auth[1].decode())
+
+    def authenticate_header(self, request):
+        return self.keyword
@@ -0,0 +1,173 @@
+"""
+In-memory prefix index for hospital autocomplete
+"""
+
+import re
+import unicodedata
+from bisect import bisect_left, insort
+
+from django.db import DEFAULT_DB_ALIAS
+
+from db.models import Hospital
+
+from .inmemory import InMemoryIndex
+
+# Suggestions are ranked by which index matched: full name, a word of the
+# name, then the city
+INDEX_NAMES = ("name", "word", "city")
+
+
+def normalize(text):
+    """
+    Normalize text for prefix matching
+
+    Accents are stripped, case is folded and runs of punctuation and
+    whitespace collapse to a single space.
+    """
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return " ".join(re.findall(r"\w+", text.casefold()))
+
+
+class HospitalAutocompleteIndex(InMemoryIndex):
+    """
+    Sorted-array prefix index over active hospital names and cities
+
+    Each index is a sorted list of (normalized term, hospital id), so a
+    prefix lookup is a binary search followed by a short forward scan.
+    Like the ambulance registry the index is per process: it loads lazily
+    from the default database (which holds every hospital), is updated
+    incrementally on Hospital saves and deletes, and reloads every
+    HOSPITAL_AUTOCOMPLETE_REFRESH seconds to pick up other processes'
+    changes.
+    """
+
+    refresh_setting = "HOSPITAL_AUTOCOMPLETE_REFRESH"
+    default_refresh = 60
+
+    def __init__(self):
+        super().__init__()
+        self._hospitals = {}
+        self._indexes = {name: [] for name in INDEX_NAMES}
+
+    @staticmethod
+    def _terms(name, city):
+        # Each text is indexed from every word on, so "apollo hos" finds
+        # "Indraprastha Apollo Hospital" and "delhi" finds "New Delhi"
+        name_words = normalize(name).split()
+        city_words = normalize(city).split()
+        return {
+            "name": {" ".join(name_words)} if name_words else set(),
+            "word": {
+                " ".join(name_words[index:]) for index in range(1, len(name_words))
+            },
+            "city": {" ".join(city_words[index:]) for index in range(len(city_words))},
+        }
+
+    def _build(self):
+        """Read the index from the default database"""
+        rows = (
+            Hospital.objects.using(DEFAULT_DB_ALIAS)
+            .filter(is_active=True)
+            .values_list("id", "name", "city", "state")
+        )
+        hospitals = {}
+        indexes = {name: [] for name in INDEX_NAMES}
+        for hospital_id, name, city, state in rows:
+            hospitals[hospital_id] = (name, city, state)
+            for index_name, terms in self._terms(name, city).items():
+                indexes[index_name].extend((term, hospital_id) for term in terms)
+        for entries in indexes.values():
+            entries.sort()
+        return hospitals, indexes
+
+    def _install(self, data):
+        self._hospitals, self._indexes = data
+
+    def _remove(self, hospital_id):
+        entry = self._hospitals.pop(hospital_id, None)
+        if entry is None:
+            return
+        for index_name, terms in self._terms(entry[0], entry[1]).items():
+            entries = self._indexes[index_name]
+            for term in terms:
+                position = bisect_left(entries, (term, hospital_id))
+                if position < len(entries) and entries[position] == (
+                    term,
+                    hospital_id,
+                ):
+                    del entries[position]
+
+    def sync(self, hospital):
+        """
+        Add, update or remove a hospital based on its current state
+
+        Args:
+            hospital: Hospital instance
+        """
+        hospital_id = hospital.id
+        active = hospital.is_active
+        entry = (hospital.name, hospital.city, hospital.state)
+        terms = self._terms(hospital.name, hospital.city)
+
+        def change():
+            self._remove(hospital_id)
+            if active:
+                self._hospitals[hospital_id] = entry
+                for index_name, index_terms in terms.items():
+                    for term in index_terms:
+                        insort(self._indexes[index_name], (term, hospital_id))
+
+        with self._lock:
+            self._apply(change)
+
+    def discard(self, hospital_id):
+        """Remove a hospital from the index"""
+        with self._lock:
+            self._apply(lambda: self._remove(hospital_id))
+
+    def suggest(self, prefix, limit=10):
+        """
+        Suggest hospitals whose name, a word of their name or their city
+        starts with a prefix
+
+        Args:
+            prefix: Text typed so far
+            limit: Maximum number of suggestions
+
+        Returns:
+            List of dicts with id, name, city, state and matched field
+        """
+        self._ensure_loaded()
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+
+        results = []
+        seen = set()
+        with self._lock:
+            for index_name in INDEX_NAMES:
+                entries = self._indexes[index_name]
+                position = bisect_left(entries, (prefix,))
+                while len(results) < limit and position < len(entries):
+                    term, hospital_id = entries[position]
+                    if not term.startswith(prefix):
+                        break
+                    position += 1
+                    if hospital_id in seen:
+                        continue
+                    seen.add(hospital_id)
+                    name, city, state = self._hospitals[hospital_id]
+                    results.append(
+                        {
+                            "id": hospital_id,
+                            "name": name,
+                            "city": city,
+                            "state": state,
+                            "matched": index_name,
+                        }
+                    )
+        return results
+
+
+hospital_autocomplete = HospitalAutocompleteIndex()
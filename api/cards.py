@@ -0,0 +1,206 @@
+"""
+Precomputed patient emergency cards
+
+A card holds three sections, each rebuilt on its own when its source
+changes (see api.signals):
+
+- patient: identity, blood group, conditions, medications and notes (User)
+- contacts: the user's emergency contact and EmergencyContact rows
+- records: the latest MedicalRecord entries
+
+Cards live in the default database with the users, so emergency and
+notification views in any shard read them with one primary key lookup.
+"""
+
+import json
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Q
+
+from db.models import EmergencyCard, EmergencyContact, MedicalRecord, User
+from db.models.base import CompactJSONEncoder
+
+CARD_SECTIONS = ("patient", "contacts", "records")
+
+# Users that get an emergency card; staff, hospital and driver accounts do not
+PATIENTS = Q(is_elderly=True, is_staff=False)
+
+# User fields each section is built from; saves touching none are skipped
+PATIENT_FIELDS = {
+    "first_name",
+    "last_name",
+    "date_of_birth",
+    "phone_number",
+    "address",
+    "blood_group",
+    "medical_conditions",
+    "medications",
+    "medical_notes",
+}
+CONTACT_FIELDS = {
+    "emergency_contact_name",
+    "emergency_contact_phone",
+    "emergency_contact_relationship",
+}
+
+
+def is_patient(user):
+    """Whether a user gets an emergency card"""
+    return user.is_elderly and not user.is_staff
+
+
+def _truncate(text, limit):
+    text = (text or "").strip()
+    return text if len(text) <= limit else text[: limit - 1] + "…"
+
+
+def _patient_section(user):
+    return {
+        "id": user.pk,
+        "name": f"{user.first_name} {user.last_name}".strip(),
+        "date_of_birth": user.date_of_birth,
+        "phone": user.phone_number,
+        "address": user.address,
+        "blood_group": user.blood_group,
+        "conditions": user.medical_conditions,
+        "medications": user.medications,
+        "notes": user.medical_notes,
+    }
+
+
+def _contacts_section(user):
+    limit = getattr(settings, "EMERGENCY_CARD_CONTACTS", 5)
+    contacts = []
+    if user.emergency_contact_name or user.emergency_contact_phone:
+        contacts.append(
+            {
+                "name": user.emergency_contact_name,
+                "phone": user.emergency_contact_phone,
+                "relationship": user.emergency_contact_relationship,
+                "primary": True,
+            }
+        )
+    rows = (
+        EmergencyContact.objects.filter(patient_id=user.pk)
+        .order_by("-is_primary", "name")
+        .values_list("name", "phone_number", "relationship", "is_primary")
+    )
+    for name, phone, relationship, is_primary in rows[: limit - len(contacts)]:
+        contacts.append(
+            {
+                "name": name,
+                "phone": phone,
+                "relationship": relationship,
+                "primary": is_primary,
+            }
+        )
+    return contacts
+
+
+def _records_section(patient_id):
+    limit = getattr(settings, "EMERGENCY_CARD_RECORDS", 5)
+    text_limit = getattr(settings, "EMERGENCY_CARD_TEXT_LIMIT", 300)
+    rows = (
+        MedicalRecord.objects.filter(patient_id=patient_id)
+        .order_by("-visit_date")
+        .values(
+            "id",
+            "record_type",
+            "visit_date",
+            "diagnosis",
+            "treatment",
+            "medications_prescribed",
+            "doctor_name",
+            "hospital__name",
+        )[:limit]
+    )
+    return [
+        {
+            "id": row["id"],
+            "type": row["record_type"],
+            "visit_date": row["visit_date"],
+            "diagnosis": _truncate(row["diagnosis"], text_limit),
+            "treatment": _truncate(row["treatment"], text_limit),
+            "medications": _truncate(row["medications_prescribed"], text_limit),
+            "doctor": row["doctor_name"],
+            "hospital": row["hospital__name"],
+        }
+        for row in rows
+    ]
+
+
+def refresh_emergency_card(patient_id, sections=CARD_SECTIONS, user=None):
+    """
+    Rebuild sections of a patient's emergency card
+
+    A patient without a card gets every section built. Users that are not
+    patients get no card.
+
+    Args:
+        patient_id: Patient User id
+        sections: Names of the sections to rebuild
+        user: Patient User instance, if already loaded
+
+    Returns:
+        The card dict, or None if the user no longer exists or is not a
+        patient
+    """
+    with transaction.atomic(using=DEFAULT_DB_ALIAS):
+        card = (
+            EmergencyCard.objects.select_for_update()
+            .filter(patient_id=patient_id)
+            .first()
+        )
+        if card is None:
+            sections = CARD_SECTIONS
+        if user is None and {"patient", "contacts"} & set(sections):
+            user = User.objects.filter(pk=patient_id).first()
+            if user is None:
+                return None
+        if card is None:
+            if not is_patient(user):
+                return None
+            card, _ = EmergencyCard.objects.select_for_update().get_or_create(
+                patient_id=patient_id
+            )
+
+        data = dict(card.card)
+        if "patient" in sections:
+            data["patient"] = _patient_section(user)
+        if "contacts" in sections:
+            data["contacts"] = _contacts_section(user)
+        if "records" in sections:
+            data["records"] = _records_section(patient_id)
+        card.card = data
+        card.save()
+    # Return the card as it reads back from the database
+    return json.loads(json.dumps(data, cls=CompactJSONEncoder))
+
+
+def get_emergency_cards(patient_ids):
+    """
+    Get the emergency cards of several patients in one query
+
+    Cards missing for patients created before cards existed are built on
+    the spot.
+
+    Args:
+        patient_ids: Iterable of patient User ids
+
+    Returns:
+        Dict mapping patient id to card dict
+    """
+    patient_ids = set(patient_ids)
+    if not patient_ids:
+        return {}
+    cards = dict(
+        EmergencyCard.objects.filter(patient_id__in=patient_ids).values_list(
+            "patient_id", "card"
+        )
+    )
+    for patient_id in patient_ids - cards.keys():
+        card = refresh_emergency_card(patient_id)
+        if card is not None:
+            cards[patient_id] = card
+    return cards
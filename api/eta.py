@@ -0,0 +1,103 @@
+"""
+Incremental ETA recomputation for dispatched emergencies
+"""
+
+import logging
+
+from django.conf import settings
+from django.db.models import Case, DateTimeField, Value, When
+from django.utils import timezone
+
+from db.models import Emergency
+from db.models.base import MICRODEGREES
+
+from .feed import notify_hospital_feed
+from .registry import haversine_km
+
+logger = logging.getLogger(__name__)
+
+ETA_STATUSES = ["DISPATCHED", "IN_PROGRESS"]
+
+
+def estimate_travel_seconds(distance_km):
+    """
+    Estimate ambulance travel time for a straight-line distance
+
+    Args:
+        distance_km: Great-circle distance in kilometers
+
+    Returns:
+        Travel time in seconds
+    """
+    speed_kmh = getattr(settings, "AMBULANCE_ETA_SPEED_KMH", 40)
+    road_factor = getattr(settings, "AMBULANCE_ETA_ROAD_FACTOR", 1.3)
+    minimum = getattr(settings, "AMBULANCE_ETA_MIN_SECONDS", 60)
+    return max(distance_km * road_factor / speed_kmh * 3600, minimum)
+
+
+def recompute_emergency_etas(positions, now=None):
+    """
+    Recompute arrival times of emergencies served by moved ambulances
+
+    Only DISPATCHED and IN_PROGRESS emergencies whose ambulance appears in
+    the batch are touched, and they are written with a single UPDATE that
+    also bumps updated_at so the change reaches hospital feeds.
+
+    Args:
+        positions: Dict mapping ambulance id to (latitude, longitude)
+        now: Reference time (defaults to now)
+
+    Returns:
+        Number of emergencies updated
+    """
+    if not positions:
+        return 0
+
+    now = now or timezone.now()
+    rows = Emergency.objects.filter(
+        status__in=ETA_STATUSES, assigned_ambulance__id__in=positions
+    ).values_list(
+        "id",
+        "assigned_hospital_id",
+        "assigned_ambulance__id",
+        "location_latitude_e6",
+        "location_longitude_e6",
+        "patient__latitude_e6",
+        "patient__longitude_e6",
+    )
+
+    cases = []
+    hospital_ids = set()
+    for emergency_id, hospital_id, ambulance_id, lat, lon, *patient in rows:
+        # Same fallback as Emergency.get_emergency_location
+        if lat is None or lon is None:
+            lat, lon = patient
+        if lat is None or lon is None:
+            continue
+        ambulance_lat, ambulance_lon = positions[ambulance_id]
+        distance = haversine_km(
+            float(ambulance_lat),
+            float(ambulance_lon),
+            lat / MICRODEGREES,
+            lon / MICRODEGREES,
+        )
+        eta = now + timezone.timedelta(seconds=estimate_travel_seconds(distance))
+        cases.append((emergency_id, eta))
+        hospital_ids.add(hospital_id)
+
+    if not cases:
+        return 0
+
+    updated = Emergency.objects.filter(
+        id__in=[emergency_id for emergency_id, _ in cases]
+    ).update(
+        estimated_arrival_time=Case(
+            *[When(id=emergency_id, then=Value(eta)) for emergency_id, eta in cases],
+            output_field=DateTimeField(),
+        ),
+        updated_at=timezone.now(),
+    )
+    for hospital_id in hospital_ids:
+        notify_hospital_feed(hospital_id)
+    logger.debug(f"Recomputed ETA for {updated} emergencies")
+    return updated
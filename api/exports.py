@@ -0,0 +1,331 @@
+"""
+Streaming exports of emergencies and notifications
+
+Rows are read column values only with QuerySet.iterator(), which uses a
+server-side cursor on PostgreSQL and fetchmany() elsewhere, and are encoded
+to NDJSON or CSV and optionally gzip-compressed in small buffers. Memory use
+is constant however many rows are exported.
+
+Emergencies and notifications moved to the archive tables are exported
+after each shard's live rows, in creation order, from the API
+representation they were archived with.
+"""
+
+import csv
+import io
+import logging
+import time
+import zlib
+from datetime import datetime
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.utils import timezone
+
+from db.models import (
+    ArchivedEmergency,
+    ArchivedNotification,
+    Emergency,
+    Notification,
+)
+from db.sharding import get_shard_aliases
+
+logger = logging.getLogger(__name__)
+
+EMERGENCY_EXPORT_COLUMNS = [
+    "id",
+    "patient_id",
+    "priority",
+    "status",
+    "description",
+    "location_latitude",
+    "location_longitude",
+    "location_address",
+    "assigned_hospital_id",
+    "ambulance_dispatched_at",
+    "estimated_arrival_time",
+    "completed_at",
+    "response_notes",
+    "created_at",
+    "updated_at",
+]
+
+NOTIFICATION_EXPORT_COLUMNS = [
+    "id",
+    "notification_type",
+    "recipient_type",
+    "status",
+    "title",
+    "message",
+    "hospital_id",
+    "user_id",
+    "emergency_contact_name",
+    "emergency_contact_phone",
+    "emergency_id",
+    "sent_at",
+    "delivered_at",
+    "read_at",
+    "created_at",
+    "updated_at",
+]
+
+# Dataset name -> (model, exported columns)
+EXPORT_DATASETS = {
+    "emergencies": (Emergency, EMERGENCY_EXPORT_COLUMNS),
+    "notifications": (Notification, NOTIFICATION_EXPORT_COLUMNS),
+}
+
+# Dataset name -> (archive model, API list filter or search field -> archive
+# lookup); fields missing from the archive columns are read from its data
+ARCHIVE_DATASETS = {
+    "emergencies": (
+        ArchivedEmergency,
+        {
+            "priority": "priority",
+            "status": "status",
+            "assigned_hospital": "assigned_hospital_id",
+            "description": "data__description",
+            "patient__first_name": "patient__first_name",
+            "patient__last_name": "patient__last_name",
+        },
+    ),
+    "notifications": (
+        ArchivedNotification,
+        {
+            "notification_type": "notification_type",
+            "recipient_type": "data__recipient_type",
+            "status": "data__status",
+            "title": "data__title",
+            "message": "data__message",
+        },
+    ),
+}
+
+EXPORT_CONTENT_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+# Encoded bytes collected before compressing and writing them out
+FLUSH_SIZE = 64 * 1024
+
+
+class ExportStats:
+    """Row count and throughput of one export"""
+
+    def __init__(self):
+        self.rows = 0
+        self.started = time.monotonic()
+
+    @property
+    def seconds(self):
+        return time.monotonic() - self.started
+
+    @property
+    def rows_per_second(self):
+        seconds = self.seconds
+        return round(self.rows / seconds) if seconds else 0
+
+
+def month_range(month):
+    """
+    Get the creation time range of a calendar month
+
+    Args:
+        month: "YYYY-MM"
+
+    Returns:
+        (start, end) aware datetimes, end exclusive
+
+    Raises:
+        ValueError: month is not YYYY-MM
+    """
+    start = datetime.strptime(month, "%Y-%m")
+    end = start.replace(year=start.year + start.month // 12, month=start.month % 12 + 1)
+    return timezone.make_aware(start), timezone.make_aware(end)
+
+
+def filter_export_period(queryset, month=None, created_after=None, created_before=None):
+    """
+    Restrict an export queryset to a creation period
+
+    Args:
+        queryset: Queryset of the exported model
+        month: "YYYY-MM" calendar month
+        created_after: Earliest creation time (inclusive)
+        created_before: Latest creation time (exclusive)
+
+    Returns:
+        Filtered queryset
+    """
+    if month:
+        start, end = month_range(month)
+        queryset = queryset.filter(created_at__gte=start, created_at__lt=end)
+    if created_after:
+        queryset = queryset.filter(created_at__gte=created_after)
+    if created_before:
+        queryset = queryset.filter(created_at__lt=created_before)
+    return queryset
+
+
+def archived_export_queryset(dataset, filters=None, search_fields=(), search=""):
+    """
+    Build the archive queryset matching an export's API list parameters
+
+    Args:
+        dataset: Key of EXPORT_DATASETS
+        filters: Dict of API list filter field -> value
+        search_fields: Search fields of the API list
+        search: Search terms, matched like the API list's SearchFilter
+
+    Returns:
+        Queryset of the dataset's archive model in creation order
+    """
+    model, lookups = ARCHIVE_DATASETS[dataset]
+    queryset = model.objects.order_by("created_at")
+    for field, value in (filters or {}).items():
+        if value not in (None, ""):
+            # Filter forms clean foreign keys to instances
+            queryset = queryset.filter(**{lookups[field]: getattr(value, "pk", value)})
+    for term in search.replace(",", " ").split():
+        condition = Q()
+        for field in search_fields:
+            condition |= Q(**{f"{lookups[field]}__icontains": term})
+        queryset = queryset.filter(condition)
+    return queryset
+
+
+def export_filename(dataset, file_format, compress, month=None):
+    """Download or output file name of an export"""
+    name = f"{dataset}-{month}" if month else dataset
+    return f"{name}.{file_format}" + (".gz" if compress else "")
+
+
+def iter_export_rows(queryset, columns, aliases=None, archived=None):
+    """
+    Read the exported columns of a queryset from every shard
+
+    Args:
+        queryset: Filtered queryset of the exported model
+        columns: Column names to read
+        aliases: Database aliases to read (defaults to every shard)
+        archived: Filtered queryset of the archive model, read after each
+            shard's live rows
+
+    Yields:
+        Tuples of column values
+    """
+    chunk_size = getattr(settings, "EXPORT_CHUNK_SIZE", 2000)
+    # Archived data holds the API fields, which name foreign keys without _id
+    keys = [
+        column.removesuffix("_id") if column != "id" else column for column in columns
+    ]
+    for alias in aliases or get_shard_aliases():
+        yield from (
+            queryset.using(alias).values_list(*columns).iterator(chunk_size=chunk_size)
+        )
+        if archived is not None:
+            for data in (
+                archived.using(alias)
+                .values_list("data", flat=True)
+                .iterator(chunk_size=chunk_size)
+            ):
+                yield tuple(data.get(key) for key in keys)
+
+
+def _encode_ndjson(rows, columns, stats):
+    encoder = DjangoJSONEncoder(separators=(",", ":"), ensure_ascii=False)
+    for row in rows:
+        stats.rows += 1
+        yield encoder.encode(dict(zip(columns, row))) + "\n"
+
+
+def _encode_csv(rows, columns, stats):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for row in rows:
+        stats.rows += 1
+        writer.writerow(
+            value.isoformat() if hasattr(value, "isoformat") else value for value in row
+        )
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+def encode_export(rows, columns, file_format, compress=True, stats=None):
+    """
+    Encode rows as NDJSON or CSV in bounded chunks
+
+    Args:
+        rows: Iterable of column value tuples
+        columns: Column names
+        file_format: "ndjson" or "csv"
+        compress: Gzip the output
+        stats: ExportStats to count rows into
+
+    Yields:
+        Bytes chunks of the output file
+    """
+    stats = stats or ExportStats()
+    encode = _encode_csv if file_format == "csv" else _encode_ndjson
+    compressor = zlib.compressobj(wbits=31) if compress else None
+
+    pending = []
+    pending_size = 0
+    for text in encode(rows, columns, stats):
+        pending.append(text)
+        pending_size += len(text)
+        if pending_size >= FLUSH_SIZE:
+            data = "".join(pending).encode()
+            pending = []
+            pending_size = 0
+            if compressor is not None:
+                data = compressor.compress(data)
+            if data:
+                yield data
+
+    data = "".join(pending).encode()
+    if compressor is not None:
+        data = compressor.compress(data) + compressor.flush()
+    if data:
+        yield data
+
+
+def stream_export(
+    dataset,
+    queryset,
+    file_format,
+    compress=True,
+    aliases=None,
+    stats=None,
+    archived=None,
+):
+    """
+    Stream an export of a dataset, logging its throughput when done
+
+    Args:
+        dataset: Key of EXPORT_DATASETS
+        queryset: Filtered queryset of the dataset's model
+        file_format: "ndjson" or "csv"
+        compress: Gzip the output
+        aliases: Database aliases to read (defaults to every shard)
+        stats: ExportStats to count rows into
+        archived: Filtered queryset of the dataset's archive model
+
+    Yields:
+        Bytes chunks of the output file
+    """
+    _, columns = EXPORT_DATASETS[dataset]
+    stats = stats or ExportStats()
+    yield from encode_export(
+        iter_export_rows(queryset, columns, aliases, archived),
+        columns,
+        file_format,
+        compress,
+        stats,
+    )
+    logger.info(
+        f"Exported {stats.rows} {dataset} in {stats.seconds:.1f}s "
+        f"({stats.rows_per_second} rows/s)"
+    )
@@ -0,0 +1,285 @@
+"""
+Incremental hospital feed with since-cursor and long-poll support
+
+The feed pages on (updated_at, id), so it only sees a change when the
+write bumps updated_at. Model saves do that through auto_now; code that
+changes feed rows with QuerySet.update() must set updated_at itself and
+call notify_hospital_feed. The feed does not see:
+
+- Emergencies and notifications moved to the archive tables, which
+  disappear from the feed instead of appearing as changed
+- Ambulance location and status changes, which are not feed items
+
+A write's updated_at is taken before its transaction commits, so a slow
+transaction can commit a row behind a cursor another request already
+handed out. Each response therefore repeats the items changed within
+HOSPITAL_FEED_OVERLAP seconds before the cursor; clients de-duplicate
+items by id and keep the latest copy.
+"""
+
+import threading
+import time
+import uuid
+from datetime import timezone as dt_timezone
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from db.models import Emergency, Notification
+
+# Per-hospital change counters, bumped whenever something in a hospital's
+# feed is saved in this process. Long-poll requests wait on the condition
+# and re-check the database only when their hospital's counter moves or
+# the poll interval expires (to catch writes from other worker processes).
+_feed_condition = threading.Condition()
+_feed_versions = {}
+
+# Sorts before every item id, so a cursor without an id resumes at the
+# first item changed at its timestamp
+NO_ID = uuid.UUID(int=0)
+
+
+def notify_hospital_feed(hospital_id):
+    """
+    Wake long-poll requests waiting on a hospital's feed
+
+    Args:
+        hospital_id: Hospital primary key
+    """
+    if hospital_id is None:
+        return
+    with _feed_condition:
+        _feed_versions[hospital_id] = _feed_versions.get(hospital_id, 0) + 1
+        _feed_condition.notify_all()
+
+
+def get_feed_version(hospital_id):
+    """Return the current in-process change counter for a hospital"""
+    with _feed_condition:
+        return _feed_versions.get(hospital_id, 0)
+
+
+def wait_for_feed_change(hospital_id, version, timeout):
+    """
+    Block until the hospital's feed changes or the timeout passes
+
+    Args:
+        hospital_id: Hospital primary key
+        version: Counter value observed before the last database check
+        timeout: Maximum seconds to wait
+
+    Returns:
+        Boolean indicating whether a change was signalled
+    """
+    with _feed_condition:
+        return _feed_condition.wait_for(
+            lambda: _feed_versions.get(hospital_id, 0) != version, timeout
+        )
+
+
+def format_feed_cursor(position):
+    """
+    Format a feed position as a cursor string
+
+    Args:
+        position: Tuple of (updated_at, id) of the last item delivered
+
+    Returns:
+        "<ISO 8601 updated_at>~<id>"
+    """
+    updated_at, item_id = position
+    return f"{updated_at.isoformat()}~{item_id}"
+
+
+def parse_feed_cursor(value):
+    """
+    Parse a feed cursor into a feed position
+
+    Items are ordered by (updated_at, id), so items changed in the same
+    instant are neither skipped nor repeated across pages. A bare timestamp
+    (the cursor format before ids were added) resumes at the first item
+    changed at that time.
+
+    Args:
+        value: Cursor string as returned by a previous feed response
+
+    Returns:
+        Tuple of (aware datetime, UUID), or None if the cursor is invalid
+    """
+    try:
+        timestamp, _, item_id = value.partition("~")
+        cursor = parse_datetime(timestamp)
+        item_id = uuid.UUID(item_id) if item_id else NO_ID
+    except (AttributeError, TypeError, ValueError):
+        return None
+    if cursor is None:
+        return None
+    if timezone.is_naive(cursor):
+        cursor = timezone.make_aware(cursor, dt_timezone.utc)
+    return cursor, item_id
+
+
+def _position(item):
+    return item.updated_at, item.id
+
+
+def filter_feed_after(queryset, position):
+    """
+    Restrict a feed queryset to items after a position, in feed order
+
+    Args:
+        queryset: Notification or Emergency queryset
+        position: Tuple of (updated_at, id)
+
+    Returns:
+        Queryset ordered by (updated_at, id)
+    """
+    updated_at, item_id = position
+    return queryset.filter(
+        Q(updated_at__gt=updated_at) | Q(updated_at=updated_at, id__gt=item_id)
+    ).order_by("updated_at", "id")
+
+
+def get_hospital_feed_querysets(hospital):
+    """
+    Get the base querysets behind a hospital's feed
+
+    Args:
+        hospital: Hospital instance
+
+    Returns:
+        Tuple of (notifications, emergencies) querysets
+    """
+    notifications = Notification.objects.filter(hospital=hospital).select_related(
+        "hospital", "user", "emergency"
+    )
+    emergencies = Emergency.objects.filter(
+        Q(assigned_hospital=hospital)
+        | Q(id__in=Notification.objects.filter(hospital=hospital).values("emergency"))
+    ).select_related("patient", "assigned_hospital")
+    return notifications, emergencies
+
+
+def filter_feed_overlap(queryset, position, overlap):
+    """
+    Restrict a feed queryset to items up to a position changed shortly before it
+
+    Args:
+        queryset: Notification or Emergency queryset
+        position: Tuple of (updated_at, id)
+        overlap: Look-back window as a timedelta
+
+    Returns:
+        Queryset ordered by (updated_at, id)
+    """
+    updated_at, item_id = position
+    return (
+        queryset.filter(updated_at__gt=updated_at - overlap)
+        .exclude(
+            Q(updated_at__gt=updated_at) | Q(updated_at=updated_at, id__gt=item_id)
+        )
+        .order_by("updated_at", "id")
+    )
+
+
+def _with_overlap(items, queryset, position, overlap, limit):
+    # A crowded window keeps its most recent items
+    repeated = list(filter_feed_overlap(queryset, position, overlap).reverse()[:limit])
+    repeated.reverse()
+    return repeated + items
+
+
+def get_hospital_feed(hospital, since=None, limit=100):
+    """
+    Get notifications and emergencies changed since a cursor
+
+    Items changed within HOSPITAL_FEED_OVERLAP seconds before the cursor
+    are repeated ahead of the new ones (up to `limit` per collection), so a
+    row committed after the cursor was handed out is still delivered.
+
+    Args:
+        hospital: Hospital instance
+        since: (updated_at, id) cursor position, or None for the latest items
+        limit: Maximum number of new items per collection
+
+    Returns:
+        Tuple of (notifications, emergencies, cursor position, has_more);
+        the cursor is the position of the last new item
+    """
+    notifications, emergencies = get_hospital_feed_querysets(hospital)
+
+    if since is None:
+        # Initial load: only the most recent items, newest last
+        notifications = list(notifications.order_by("-updated_at", "-id")[:limit])
+        emergencies = list(emergencies.order_by("-updated_at", "-id")[:limit])
+        notifications.reverse()
+        emergencies.reverse()
+        has_more = False
+    else:
+        notifications = list(filter_feed_after(notifications, since)[: limit + 1])
+        emergencies = list(filter_feed_after(emergencies, since)[: limit + 1])
+        has_more = len(notifications) > limit or len(emergencies) > limit
+        notifications = notifications[:limit]
+        emergencies = emergencies[:limit]
+
+        if has_more:
+            # Only advance to the point both collections are complete up to,
+            # so nothing is skipped on the next page
+            tails = [
+                _position(items[-1])
+                for items in (notifications, emergencies)
+                if len(items) == limit
+            ]
+            boundary = min(tails)
+            notifications = [n for n in notifications if _position(n) <= boundary]
+            emergencies = [e for e in emergencies if _position(e) <= boundary]
+
+    positions = [_position(item) for item in notifications + emergencies]
+    if positions:
+        cursor = max(positions)
+    else:
+        cursor = since or (timezone.now(), NO_ID)
+
+    overlap = getattr(settings, "HOSPITAL_FEED_OVERLAP", 5)
+    if since is not None and overlap:
+        overlap = timezone.timedelta(seconds=overlap)
+        repeated = get_hospital_feed_querysets(hospital)
+        notifications = _with_overlap(notifications, repeated[0], since, overlap, limit)
+        emergencies = _with_overlap(emergencies, repeated[1], since, overlap, limit)
+
+    return notifications, emergencies, cursor, has_more
+
+
+def poll_hospital_feed(hospital, since=None, limit=100, wait=0):
+    """
+    Get the hospital feed, long-polling until new items arrive
+
+    The wait blocks the calling thread, so under a threaded WSGI server
+    every idle console holds a worker for up to ``wait`` seconds. Size
+    the worker pool for the number of open consoles or keep
+    HOSPITAL_FEED_MAX_WAIT short. Only items after the cursor end the
+    wait; items repeated from the overlap window ride along with them.
+
+    Args:
+        hospital: Hospital instance
+        since: (updated_at, id) cursor position, or None for the latest items
+        limit: Maximum number of items per collection
+        wait: Seconds to block when there is nothing new
+
+    Returns:
+        Tuple of (notifications, emergencies, cursor position, has_more)
+    """
+    poll_interval = getattr(settings, "HOSPITAL_FEED_POLL_INTERVAL", 2)
+    deadline = time.monotonic() + wait
+
+    while True:
+        version = get_feed_version(hospital.id)
+        notifications, emergencies, cursor, has_more = get_hospital_feed(
+            hospital, since=since, limit=limit
+        )
+        remaining = deadline - time.monotonic()
+        if since is None or cursor != since or remaining <= 0:
+            return notifications, emergencies, cursor, has_more
+        wait_for_feed_change(hospital.id, version, min(poll_interval, remaining))
@@ -0,0 +1,415 @@
+"""
+Streaming bulk import of the hospital directory
+
+Rows are read one at a time from CSV or NDJSON, validated and upserted on
+registration_number in batches of HOSPITAL_IMPORT_BATCH_SIZE, so memory
+use depends on the batch size and not on the file size. Each hospital is
+written to the shard of its state and mirrored to the default directory,
+as a save through the API would. A hospital whose new state belongs to
+another region moves there with its id, unless its old region still holds
+ambulances, emergencies or notifications for it.
+"""
+
+import csv
+import json
+import time
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, transaction
+from rest_framework.exceptions import ValidationError
+
+from db.models import (
+    Ambulance,
+    Emergency,
+    Hospital,
+    HospitalSpecialization,
+    Notification,
+    Specialization,
+)
+from db.models.base import split_specializations, to_microdegrees, uuid7
+from db.sharding import (
+    forget_shard_location,
+    mirror_rows,
+    region_for_shard,
+    shard_for_region,
+    shard_for_state,
+)
+
+from .autocomplete import hospital_autocomplete
+from .serializers import HospitalImportSerializer
+
+# Request Content-Type -> import format
+IMPORT_CONTENT_TYPES = {
+    "text/csv": "csv",
+    "application/x-ndjson": "ndjson",
+    "application/ndjson": "ndjson",
+    "application/jsonl": "ndjson",
+}
+
+# Hospital columns an import row replaces
+UPDATE_FIELDS = [
+    *HospitalImportSerializer.Meta.fields,
+    "latitude_e6",
+    "longitude_e6",
+    "specialization_mask",
+    "home_region",
+    "updated_at",
+]
+
+
+class HospitalImportReport:
+    """Counts and per-row errors of one import"""
+
+    def __init__(self, max_errors=None):
+        self.max_errors = max_errors or getattr(
+            settings, "HOSPITAL_IMPORT_MAX_ERRORS", 1000
+        )
+        self.started = time.monotonic()
+        self.processed = 0
+        self.created = 0
+        self.updated = 0
+        # Rows replaced by a later row for the same hospital in their batch
+        self.duplicates = 0
+        self.failed = 0
+        self.errors = []
+
+    def add_error(self, line, registration_number, errors, failed=True):
+        if failed:
+            self.failed += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append(
+                {
+                    "line": line,
+                    "registration_number": registration_number,
+                    "errors": errors,
+                }
+            )
+
+    def as_dict(self):
+        seconds = time.monotonic() - self.started
+        return {
+            "processed": self.processed,
+            "created": self.created,
+            "updated": self.updated,
+            "duplicates": self.duplicates,
+            "failed": self.failed,
+            "errors": self.errors,
+            "errors_truncated": self.failed > len(self.errors),
+            "seconds": round(seconds, 3),
+            "rows_per_second": round(self.processed / seconds) if seconds else None,
+        }
+
+
+def _decode_lines(stream, invalid):
+    """Decode a binary stream line by line, noting lines that are not UTF-8"""
+    for line_number, line in enumerate(stream, start=1):
+        try:
+            yield line.decode("utf-8-sig" if line_number == 1 else "utf-8")
+        except UnicodeDecodeError as error:
+            invalid[line_number] = f"Invalid UTF-8: {error}"
+            yield line.decode("utf-8", "replace")
+
+
+def iter_csv_rows(stream):
+    """
+    Read rows from a binary CSV stream with a header line
+
+    Empty cells are dropped so the field's default applies.
+
+    Yields:
+        (line number, row dict), or (line number, error message) for a row
+        that is not valid UTF-8 or not valid CSV
+    """
+    invalid = {}
+    reader = csv.reader(_decode_lines(stream, invalid))
+    header = None
+    last_line = 0
+    while True:
+        try:
+            values = next(reader)
+        except StopIteration:
+            return
+        except csv.Error as error:
+            yield reader.line_num, f"Malformed CSV: {error}"
+            if header is None:
+                return
+            last_line = reader.line_num
+            continue
+
+        # A quoted cell may span several physical lines
+        lines = range(last_line + 1, reader.line_num + 1)
+        last_line = reader.line_num
+        errors = [invalid.pop(number) for number in lines if number in invalid]
+        if header is None:
+            if errors:
+                yield reader.line_num, errors[0]
+                return
+            header = [name.strip() for name in values]
+            continue
+        if errors:
+            yield reader.line_num, errors[0]
+            continue
+        if not values:
+            continue
+        yield reader.line_num, {
+            key: value.strip()
+            for key, value in zip(header, values)
+            if key and value.strip()
+        }
+
+
+def iter_ndjson_rows(stream):
+    """
+    Read rows from a binary stream of one JSON object per line
+
+    Yields:
+        (line number, row dict), or (line number, error message) for a line
+        that is not a JSON object
+    """
+    for line_number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as error:
+            yield line_number, f"Invalid JSON: {error}"
+            continue
+        if not isinstance(row, dict):
+            yield line_number, "Each line must be a JSON object"
+            continue
+        yield line_number, row
+
+
+def import_hospitals(stream, file_format, batch_size=None, on_error=None):
+    """
+    Upsert hospitals from a CSV or NDJSON stream
+
+    Args:
+        stream: Binary file-like object
+        file_format: "csv" or "ndjson"
+        batch_size: Rows validated and written together (defaults to
+            HOSPITAL_IMPORT_BATCH_SIZE)
+        on_error: Optional callable receiving each row error dict as it
+            happens
+
+    Returns:
+        HospitalImportReport
+    """
+    batch_size = batch_size or getattr(settings, "HOSPITAL_IMPORT_BATCH_SIZE", 1000)
+    rows = iter_csv_rows(stream) if file_format == "csv" else iter_ndjson_rows(stream)
+    report = HospitalImportReport()
+    # One serializer validates every row; its fields are built only once
+    serializer = HospitalImportSerializer()
+
+    def fail(line, registration_number, errors, failed=True):
+        report.add_error(line, registration_number, errors, failed)
+        if on_error is not None:
+            on_error(
+                {
+                    "line": line,
+                    "registration_number": registration_number,
+                    "errors": errors,
+                }
+            )
+
+    batch = {}
+    for line, row in rows:
+        report.processed += 1
+        if isinstance(row, str):
+            fail(line, None, {"non_field_errors": [row]})
+            continue
+        try:
+            data = serializer.run_validation(row)
+        except ValidationError as error:
+            fail(line, row.get("registration_number"), error.detail)
+            continue
+        # A later row for the same hospital replaces an earlier one
+        if batch.pop(data["registration_number"], None) is not None:
+            report.duplicates += 1
+        batch[data["registration_number"]] = (line, data)
+        if len(batch) >= batch_size:
+            _write_batch(list(batch.values()), report, fail)
+            batch = {}
+    if batch:
+        _write_batch(list(batch.values()), report, fail)
+
+    hospital_autocomplete.invalidate()
+    return report
+
+
+def _write_batch(rows, report, fail):
+    """Upsert one batch of validated rows, grouped by shard"""
+    vocabulary = {
+        specialization.key: specialization
+        for specialization in Specialization.resolve(
+            ",".join(data["specializations"] for _, data in rows)
+        )
+    }
+    # The default directory copy tells which shard already holds a hospital
+    directory = {
+        number: (hospital_id, shard_for_region(home_region))
+        for number, hospital_id, home_region in Hospital.objects.using(DEFAULT_DB_ALIAS)
+        .filter(
+            registration_number__in=[data["registration_number"] for _, data in rows]
+        )
+        .values_list("registration_number", "id", "home_region")
+    }
+
+    by_shard = {}
+    moves = {}  # previous shard -> [(line, hospital)]
+    for line, data in rows:
+        hospital = Hospital(id=uuid7(), **data)
+        for field, field_e6 in Hospital.coordinate_fields:
+            setattr(hospital, field_e6, to_microdegrees(getattr(hospital, field)))
+        hospital.specialization_list = [
+            vocabulary[key] for key in split_specializations(hospital.specializations)
+        ]
+        hospital.specialization_mask = Specialization.mask_for(
+            hospital.specialization_list
+        )
+        alias = shard_for_state(hospital.state)
+        hospital.home_region = region_for_shard(alias)
+        if hospital.registration_number in directory:
+            # Keep the id medical records and the directory copy refer to
+            hospital.id, previous = directory[hospital.registration_number]
+            if previous is not None and previous != alias:
+                moves.setdefault(previous, []).append((line, hospital))
+        by_shard.setdefault(alias, []).append((line, hospital))
+
+    blocked = set()
+    for previous, entries in moves.items():
+        for line, hospital in _blocked_moves(previous, entries):
+            blocked.add(hospital.registration_number)
+            fail(
+                line,
+                hospital.registration_number,
+                {
+                    "state": [
+                        f"Hospital has ambulances, emergencies or notifications "
+                        f"in region {region_for_shard(previous)!r} and cannot "
+                        f"move to another region"
+                    ]
+                },
+            )
+
+    written = set()
+    for alias, entries in by_shard.items():
+        entries = [
+            (line, hospital)
+            for line, hospital in entries
+            if hospital.registration_number not in blocked
+        ]
+        hospitals = [hospital for _, hospital in entries]
+        if not hospitals:
+            continue
+        try:
+            created = _upsert(alias, hospitals, directory)
+        except DatabaseError as error:
+            for line, hospital in entries:
+                fail(line, hospital.registration_number, {"database": [str(error)]})
+            continue
+        report.created += created
+        report.updated += len(hospitals) - created
+        written.update(hospital.registration_number for hospital in hospitals)
+
+        if alias != DEFAULT_DB_ALIAS:
+            try:
+                mirror_rows(hospitals, DEFAULT_DB_ALIAS)
+            except DatabaseError as error:
+                # The shard write stands; only the directory copy is stale
+                for line, hospital in entries:
+                    fail(
+                        line,
+                        hospital.registration_number,
+                        {"directory": [str(error)]},
+                        failed=False,
+                    )
+
+    for previous, entries in moves.items():
+        moved = [
+            hospital
+            for _, hospital in entries
+            if hospital.registration_number in written
+        ]
+        ids = [hospital.id for hospital in moved]
+        if previous == DEFAULT_DB_ALIAS:
+            # The old row stays as the directory copy, without its links
+            HospitalSpecialization.objects.using(previous).filter(
+                hospital_id__in=ids
+            ).delete()
+        else:
+            Hospital.objects.using(previous).filter(id__in=ids).delete()
+        for hospital in moved:
+            forget_shard_location(Hospital, hospital.id)
+
+
+def _blocked_moves(alias, entries):
+    """Hospitals whose old row in a shard still has regional data"""
+    ids = [hospital.id for _, hospital in entries]
+    referenced = {
+        *Ambulance.objects.using(alias)
+        .filter(hospital_id__in=ids)
+        .values_list("hospital_id", flat=True),
+        *Emergency.objects.using(alias)
+        .filter(assigned_hospital_id__in=ids)
+        .values_list("assigned_hospital_id", flat=True),
+        *Notification.objects.using(alias)
+        .filter(hospital_id__in=ids)
+        .values_list("hospital_id", flat=True),
+    }
+    return [(line, hospital) for line, hospital in entries if hospital.id in referenced]
+
+
+def _upsert(alias, hospitals, directory):
+    """
+    Upsert hospitals in one shard with their specialization links
+
+    Returns:
+        Number of hospitals that did not exist before
+    """
+    numbers = [hospital.registration_number for hospital in hospitals]
+    with transaction.atomic(using=alias):
+        existing = dict(
+            Hospital.objects.using(alias)
+            .filter(registration_number__in=numbers)
+            .values_list("registration_number", "id")
+        )
+        Hospital.objects.using(alias).bulk_create(
+            hospitals,
+            update_conflicts=True,
+            unique_fields=["registration_number"],
+            update_fields=UPDATE_FIELDS,
+        )
+        for hospital in hospitals:
+            # Updated rows keep their id; the generated one was not stored
+            hospital.id = existing.get(hospital.registration_number, hospital.id)
+
+        used = {
+            specialization.id: specialization
+            for hospital in hospitals
+            for specialization in hospital.specialization_list
+        }
+        if alias != DEFAULT_DB_ALIAS:
+            Specialization.objects.using(alias).bulk_create(
+                list(used.values()), ignore_conflicts=True
+            )
+        HospitalSpecialization.objects.using(alias).filter(
+            hospital_id__in=existing.values()
+        ).delete()
+        HospitalSpecialization.objects.using(alias).bulk_create(
+            [
+                HospitalSpecialization(
+                    hospital_id=hospital.id, specialization_id=specialization.id
+                )
+                for hospital in hospitals
+                for specialization in hospital.specialization_list
+            ],
+            ignore_conflicts=True,
+        )
+
+    # Hospitals moved here from another region were not new
+    return sum(
+        hospital.registration_number not in existing
+        and hospital.registration_number not in directory
+        for hospital in hospitals
+    )
@@ -0,0 +1,105 @@
+"""
+Base class for per-process in-memory indexes loaded from the database
+"""
+
+import threading
+import time
+
+from django.conf import settings
+
+
+class InMemoryIndex:
+    """
+    Per-process index that loads lazily and reloads periodically
+
+    Subclasses read the database in `_build()` and install the result in
+    `_install()`, and route every incremental change through `_apply()`.
+    Only one thread reloads at a time: the first load makes readers wait
+    for it, while a periodic refresh runs on the first thread to see the
+    index stale and the others keep reading the current data. A reload
+    builds the new data before taking the index lock, and changes applied
+    while it reads the database are replayed on its result so they are
+    not lost.
+    """
+
+    # Setting with the seconds between reloads, and its default
+    refresh_setting = None
+    default_refresh = 60
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self._loaded_at = None
+        # Bumped by invalidate(), so a reload already reading the database
+        # does not mark the index fresh
+        self._generation = 0
+        # Changes applied during a reload, or None when none is running
+        self._pending = None
+
+    def _stale(self):
+        refresh = getattr(settings, self.refresh_setting, self.default_refresh)
+        return self._loaded_at is None or time.monotonic() - self._loaded_at > refresh
+
+    def _ensure_loaded(self):
+        if self._loaded_at is None:
+            with self._reload_lock:
+                if self._loaded_at is None:
+                    self._reload()
+        elif self._stale() and self._reload_lock.acquire(blocking=False):
+            try:
+                if self._stale():
+                    self._reload()
+            finally:
+                self._reload_lock.release()
+
+    def reload(self):
+        """Rebuild the index from the database"""
+        with self._reload_lock:
+            self._reload()
+
+    def _reload(self):
+        with self._lock:
+            generation = self._generation
+            self._pending = []
+        try:
+            data = self._build()
+        except Exception:
+            with self._lock:
+                self._pending = None
+            raise
+
+        with self._lock:
+            self._install(data)
+            for change in self._pending:
+                change()
+            self._pending = None
+            if self._generation == generation:
+                self._loaded_at = time.monotonic()
+
+    def invalidate(self):
+        """Reload the index on its next use, e.g. after a bulk import"""
+        with self._lock:
+            self._generation += 1
+            self._loaded_at = None
+
+    def _apply(self, change):
+        """
+        Apply a change to the loaded data and to a reload in progress
+
+        Must be called with the index lock held.
+
+        Args:
+            change: Callable mutating the installed data
+        """
+        if self._pending is not None:
+            self._pending.append(change)
+        if self._loaded_at is not None:
+            change()
+
+    def _build(self):
+        """Read the index data from the database"""
+        raise NotImplementedError
+
+    def _install(self, data):
+        """Replace the index data with the result of `_build()`"""
+        raise NotImplementedError
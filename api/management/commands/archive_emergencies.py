@@ -0,0 +1,45 @@
+"""
+Move closed emergencies and their notifications into the archive tables
+"""
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from api.archive import archive_emergency_batch
+from db.sharding import get_shard_aliases, use_shard
+
+
+class Command(BaseCommand):
+    help = "Archive COMPLETED and CANCELLED emergencies older than a threshold"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=getattr(settings, "EMERGENCY_ARCHIVE_AFTER_DAYS", 90),
+            help="Archive emergencies created more than this many days ago",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=getattr(settings, "EMERGENCY_ARCHIVE_BATCH_SIZE", 500),
+        )
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timezone.timedelta(days=options["days"])
+        for alias in get_shard_aliases():
+            emergencies = notifications = 0
+            with use_shard(alias):
+                while True:
+                    moved, moved_notifications = archive_emergency_batch(
+                        cutoff, options["batch_size"]
+                    )
+                    if not moved:
+                        break
+                    emergencies += moved
+                    notifications += moved_notifications
+            self.stdout.write(
+                f"{alias}: archived {emergencies} emergencies and "
+                f"{notifications} notifications"
+            )
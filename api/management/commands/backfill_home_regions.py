@@ -0,0 +1,39 @@
+"""
+Fill hospital home regions and redact user copies across the shards
+"""
+
+from django.contrib.auth.hashers import UNUSABLE_PASSWORD_PREFIX
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+
+from db.models import Hospital, User
+from db.sharding import get_shard_aliases, region_for_shard
+
+BATCH_SIZE = 500
+
+
+class Command(BaseCommand):
+    help = (
+        "Set home_region on every hospital and clear password hashes copied "
+        "into the shards; run after migrating default and every shard"
+    )
+
+    def handle(self, *args, **options):
+        for alias in get_shard_aliases()[1:]:
+            region = region_for_shard(alias)
+            hospitals = Hospital.objects.using(alias).update(home_region=region)
+            # Users are copied to shards only so emergencies can reference them
+            User.objects.using(alias).update(password=UNUSABLE_PASSWORD_PREFIX)
+
+            # Directory copies are the default rows whose id is also in a shard
+            ids = list(Hospital.objects.using(alias).values_list("id", flat=True))
+            copies = 0
+            for start in range(0, len(ids), BATCH_SIZE):
+                copies += (
+                    Hospital.objects.using(DEFAULT_DB_ALIAS)
+                    .filter(id__in=ids[start : start + BATCH_SIZE])
+                    .update(home_region=region)
+                )
+            self.stdout.write(
+                f"{region}: {hospitals} hospitals, {copies} directory copies"
+            )
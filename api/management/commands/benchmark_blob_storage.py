@@ -0,0 +1,73 @@
+"""
+Benchmark content-addressed storage against plain file storage
+"""
+
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from db.storage import ContentAddressedStorage
+
+
+def disk_usage(location):
+    """Total size in bytes of the files under a directory"""
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, names in os.walk(location)
+        for name in names
+    )
+
+
+class Command(BaseCommand):
+    help = "Compare disk usage and upload throughput of the attachment storages"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--files", type=int, default=500)
+        parser.add_argument("--size-kb", type=int, default=256)
+        parser.add_argument(
+            "--duplicates",
+            type=float,
+            default=0.5,
+            help="Share of uploads that repeat an earlier file",
+        )
+
+    def handle(self, *args, **options):
+        rng = random.Random(7)
+        count = options["files"]
+        distinct = max(1, round(count * (1 - options["duplicates"])))
+        payloads = [rng.randbytes(options["size_kb"] * 1024) for _ in range(distinct)]
+        uploads = payloads + [rng.choice(payloads) for _ in range(count - distinct)]
+        rng.shuffle(uploads)
+        logical = sum(len(payload) for payload in uploads)
+
+        root = tempfile.mkdtemp(prefix="blob-bench-")
+        try:
+            # StoredBlob rows written by the benchmark are rolled back
+            with transaction.atomic():
+                for label, storage in [
+                    ("FileSystemStorage", FileSystemStorage(location=f"{root}/plain")),
+                    (
+                        "ContentAddressedStorage",
+                        ContentAddressedStorage(location=f"{root}/cas"),
+                    ),
+                ]:
+                    began = time.perf_counter()
+                    for index, payload in enumerate(uploads):
+                        storage.save(f"report_{index}.pdf", ContentFile(payload))
+                    seconds = time.perf_counter() - began
+                    stored = disk_usage(storage.location)
+                    self.stdout.write(
+                        f"{label:24} {logical / seconds / 1024 / 1024:8.1f} MiB/s "
+                        f"{stored / 1024 / 1024:8.1f} MiB on disk "
+                        f"({1 - stored / logical:6.1%} saved)"
+                    )
+                transaction.set_rollback(True)
+        finally:
+            shutil.rmtree(root, ignore_errors=True)
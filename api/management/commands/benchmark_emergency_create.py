@@ -0,0 +1,158 @@
+"""
+Concurrent read/write benchmark of the emergency-create path
+"""
+
+import os
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+from django.test.utils import setup_databases, teardown_databases
+from rest_framework.test import APIClient
+
+from db.models import Hospital, User
+
+
+@contextmanager
+def throwaway_databases():
+    """
+    Point every database alias at a freshly migrated throwaway database
+
+    Writer and reader threads commit on their own connections, so the run
+    cannot be rolled back. SQLite aliases get temporary files rather than
+    the in-memory test default, keeping the profile's WAL settings in play;
+    other backends get the usual test_<name> databases.
+    """
+    workdir = tempfile.mkdtemp(prefix="benchmark_")
+    for alias in connections:
+        settings_dict = connections[alias].settings_dict
+        if connections[alias].vendor == "sqlite" and not settings_dict["TEST"]["NAME"]:
+            settings_dict["TEST"]["NAME"] = os.path.join(workdir, f"{alias}.sqlite3")
+    old_config = setup_databases(verbosity=0, interactive=False)
+    try:
+        yield
+    finally:
+        teardown_databases(old_config, verbosity=0)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+class Command(BaseCommand):
+    help = (
+        "Create emergencies from writer threads while reader threads list "
+        "them, and report throughput and latency for the active DB profile"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--writers", type=int, default=4)
+        parser.add_argument("--readers", type=int, default=8)
+        parser.add_argument("--duration", type=float, default=10.0)
+
+    def handle(self, *args, **options):
+        with throwaway_databases():
+            self._run(options)
+
+    def _run(self, options):
+        tag = uuid.uuid4().hex[:8]
+        patients = [
+            User.objects.create_user(
+                username=f"bench_{tag}_{index}",
+                password=uuid.uuid4().hex,
+                phone_number=f"+0{tag}{index:04d}"[:15],
+                address="Benchmark",
+                latitude=12.97,
+                longitude=77.59,
+                emergency_contact_name="Benchmark Contact",
+                emergency_contact_phone="+10000000000",
+                emergency_contact_relationship="Other",
+            )
+            for index in range(options["writers"] + options["readers"])
+        ]
+        for index in range(5):
+            Hospital.objects.create(
+                name=f"Benchmark Hospital {index}",
+                registration_number=f"BENCH-{tag}-{index}",
+                phone_number="0",
+                email="bench@example.com",
+                address="-",
+                city="-",
+                state="-",
+                pincode="0",
+                latitude=12.97 + index * 0.01,
+                longitude=77.59,
+                specializations="Emergency Medicine",
+                available_ambulances=5,
+            )
+
+        results = {"write": [], "read": []}
+        errors = {"write": 0, "read": 0}
+        lock = threading.Lock()
+        deadline = time.perf_counter() + options["duration"]
+
+        def worker(kind, user):
+            client = APIClient(HTTP_HOST="localhost")
+            client.force_authenticate(user)
+            latencies = []
+            failures = 0
+            try:
+                while time.perf_counter() < deadline:
+                    started = time.perf_counter()
+                    if kind == "write":
+                        response = client.post(
+                            "/api/emergencies/",
+                            {
+                                "priority": "HIGH",
+                                "description": "Benchmark emergency",
+                                "location_latitude": "12.97",
+                                "location_longitude": "77.59",
+                            },
+                            format="json",
+                        )
+                        ok = response.status_code == 201
+                    else:
+                        response = client.get("/api/emergencies/")
+                        ok = response.status_code == 200
+                    latencies.append(time.perf_counter() - started)
+                    failures += not ok
+            except Exception:
+                failures += 1
+            finally:
+                connections.close_all()
+            with lock:
+                results[kind].extend(latencies)
+                errors[kind] += failures
+
+        threads = [
+            threading.Thread(target=worker, args=(kind, user))
+            for kind, user in zip(
+                ["write"] * options["writers"] + ["read"] * options["readers"],
+                patients,
+            )
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.stdout.write(
+            f"Profile: {getattr(settings, 'DATABASE_PROFILE', connection.vendor)} "
+            f"({connection.vendor}), {options['writers']} writers, "
+            f"{options['readers']} readers, {options['duration']}s"
+        )
+        for kind in ("write", "read"):
+            latencies = sorted(results[kind])
+            if not latencies:
+                self.stdout.write(f"{kind}: no requests completed")
+                continue
+            self.stdout.write(
+                f"{kind}: {len(latencies) / options['duration']:.1f} req/s, "
+                f"p50 {statistics.median(latencies) * 1000:.1f} ms, "
+                f"p95 {latencies[int(len(latencies) * 0.95) - 1] * 1000:.1f} ms, "
+                f"errors {errors[kind]}"
+            )
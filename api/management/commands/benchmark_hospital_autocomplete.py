@@ -0,0 +1,123 @@
+"""
+Benchmark hospital autocomplete against the SearchFilter path
+"""
+
+import random
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.filters import SearchFilter
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from api.autocomplete import hospital_autocomplete
+from api.views import HospitalViewSet
+from db.models import Hospital
+
+CITIES = [
+    "Mumbai",
+    "Delhi",
+    "Bengaluru",
+    "Hyderabad",
+    "Chennai",
+    "Kolkata",
+    "Pune",
+    "Ahmedabad",
+    "Jaipur",
+    "Lucknow",
+]
+WORDS = [
+    "City",
+    "General",
+    "Apollo",
+    "Care",
+    "Lifeline",
+    "Sunrise",
+    "Memorial",
+    "Heart",
+    "Children's",
+    "Medical",
+    "Trust",
+    "Mission",
+]
+
+
+class Command(BaseCommand):
+    help = "Compare autocomplete index lookups with SearchFilter queries"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--hospitals", type=int, default=5000)
+        parser.add_argument("--queries", type=int, default=500)
+
+    def handle(self, *args, **options):
+        rng = random.Random(7)
+
+        # Everything runs inside a transaction that is rolled back at the end
+        with transaction.atomic():
+            tag = uuid.uuid4().hex[:8]
+            names = [
+                " ".join(rng.sample(WORDS, 2)) + f" Hospital {index}"
+                for index in range(options["hospitals"])
+            ]
+            Hospital.objects.bulk_create(
+                [
+                    Hospital(
+                        name=name,
+                        registration_number=f"BENCH-{tag}-{index}",
+                        phone_number="0",
+                        email="bench@example.com",
+                        address="-",
+                        city=rng.choice(CITIES),
+                        state="-",
+                        pincode="0",
+                        latitude=12.97,
+                        longitude=77.59,
+                        specializations="Emergency Medicine",
+                    )
+                    for index, name in enumerate(names)
+                ],
+                batch_size=1000,
+            )
+
+            # Keystroke prefixes of 1-6 characters of names and cities
+            prefixes = []
+            for _ in range(options["queries"]):
+                text = rng.choice(names + CITIES)
+                prefixes.append(text[: rng.randint(1, 6)])
+
+            began = time.perf_counter()
+            hospital_autocomplete.reload()
+            self.stdout.write(
+                f"index build        {(time.perf_counter() - began) * 1000:8.1f} ms"
+            )
+
+            began = time.perf_counter()
+            for prefix in prefixes:
+                hospital_autocomplete.suggest(prefix, limit=10)
+            index_seconds = time.perf_counter() - began
+
+            view = HospitalViewSet()
+            search_filter = SearchFilter()
+            factory = APIRequestFactory()
+            began = time.perf_counter()
+            for prefix in prefixes:
+                request = Request(factory.get("/api/hospitals/", {"search": prefix}))
+                list(
+                    search_filter.filter_queryset(
+                        request, HospitalViewSet.queryset.all(), view
+                    )[:10]
+                )
+            filter_seconds = time.perf_counter() - began
+
+            count = len(prefixes)
+            self.stdout.write(
+                f"autocomplete index {index_seconds / count * 1_000_000:8.1f} us/query"
+            )
+            self.stdout.write(
+                f"SearchFilter       {filter_seconds / count * 1_000_000:8.1f} us/query"
+            )
+
+            transaction.set_rollback(True)
+        hospital_autocomplete.reload()
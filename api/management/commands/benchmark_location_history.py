@@ -0,0 +1,96 @@
+"""
+Benchmark ambulance location history storage and range queries
+"""
+
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from api.tracking import get_location_history, record_location_history
+from db.models import Ambulance, AmbulanceLocationSegment, Hospital
+
+
+class Command(BaseCommand):
+    help = "Measure storage cost and query speed of the location history store"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--points", type=int, default=1_000_000)
+        parser.add_argument("--batch", type=int, default=60)
+        parser.add_argument("--queries", type=int, default=100)
+
+    def handle(self, *args, **options):
+        points = options["points"]
+        batch = options["batch"]
+
+        # Everything runs inside a transaction that is rolled back at the end
+        with transaction.atomic():
+            hospital = Hospital.objects.create(
+                name="Benchmark Hospital",
+                registration_number=f"BENCH-{time.time_ns()}",
+                phone_number="0",
+                email="bench@example.com",
+                address="-",
+                city="-",
+                state="-",
+                pincode="0",
+                latitude=12.97,
+                longitude=77.59,
+                specializations="",
+            )
+            ambulance = Ambulance.objects.create(
+                hospital=hospital,
+                vehicle_number=f"BENCH-{time.time_ns()}"[:20],
+                driver_name="-",
+                driver_phone="0",
+            )
+
+            start = timezone.now() - timezone.timedelta(seconds=points)
+            latitude, longitude = 12.97, 77.59
+            track = []
+            for index in range(points):
+                latitude += random.uniform(-0.0001, 0.0001)
+                longitude += random.uniform(-0.0001, 0.0001)
+                track.append(
+                    (start + timezone.timedelta(seconds=index), latitude, longitude)
+                )
+
+            began = time.perf_counter()
+            for offset in range(0, points, batch):
+                record_location_history({ambulance.id: track[offset : offset + batch]})
+            write_seconds = time.perf_counter() - began
+
+            segments = AmbulanceLocationSegment.objects.filter(ambulance=ambulance)
+            segment_count = segments.count()
+            stored_bytes = sum(
+                len(data) for data in segments.values_list("data", flat=True)
+            )
+
+            began = time.perf_counter()
+            for _ in range(options["queries"]):
+                query_start = start + timezone.timedelta(
+                    seconds=random.randrange(max(points - 3600, 1))
+                )
+                get_location_history(
+                    ambulance,
+                    query_start,
+                    query_start + timezone.timedelta(hours=1),
+                )
+            query_seconds = (time.perf_counter() - began) / options["queries"]
+
+            transaction.set_rollback(True)
+
+        per_million = 1_000_000 / points
+        self.stdout.write(f"Points:            {points}")
+        self.stdout.write(f"Segments:          {segment_count}")
+        self.stdout.write(
+            f"Payload per 1M:    {stored_bytes * per_million / 1_048_576:.2f} MiB "
+            f"({stored_bytes / points:.1f} bytes/point)"
+        )
+        self.stdout.write(
+            f"Append per 1M:     {write_seconds * per_million:.2f} s "
+            f"({points / write_seconds:.0f} points/s)"
+        )
+        self.stdout.write(f"1h range query:    {query_seconds * 1000:.2f} ms")
@@ -0,0 +1,86 @@
+"""
+Benchmark per-request token authentication overhead
+"""
+
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from api.authentication import (
+    CachedTokenAuthentication,
+    SignedTokenAuthentication,
+    token_cache,
+)
+from api.tokens import issue_access_token
+from db.models import User
+
+
+class Command(BaseCommand):
+    help = "Compare per-request cost of the token authentication classes"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=10000)
+
+    def handle(self, *args, **options):
+        count = options["requests"]
+
+        # Everything runs inside a transaction that is rolled back at the end
+        with transaction.atomic():
+            tag = uuid.uuid4().hex[:8]
+            user = User.objects.create_user(
+                username=f"bench_{tag}",
+                password=uuid.uuid4().hex,
+                phone_number=f"+0{tag}",
+                address="Benchmark",
+                emergency_contact_name="Benchmark Contact",
+                emergency_contact_phone="+10000000000",
+                emergency_contact_relationship="Other",
+            )
+            token = Token.objects.create(user=user)
+            factory = APIRequestFactory()
+            token_request = factory.get(
+                "/api/dashboard/", HTTP_AUTHORIZATION=f"Token {token.key}"
+            )
+            bearer_request = factory.get(
+                "/api/dashboard/",
+                HTTP_AUTHORIZATION=f"Bearer {issue_access_token(user)}",
+            )
+            token_cache.clear()
+
+            for name, authenticator, django_request in [
+                ("TokenAuthentication", TokenAuthentication(), token_request),
+                (
+                    "CachedTokenAuthentication",
+                    CachedTokenAuthentication(),
+                    token_request,
+                ),
+                (
+                    "SignedTokenAuthentication",
+                    SignedTokenAuthentication(),
+                    bearer_request,
+                ),
+            ]:
+                queries = []
+
+                def count_query(execute, sql, params, many, context):
+                    queries.append(sql)
+                    return execute(sql, params, many, context)
+
+                with connection.execute_wrapper(count_query):
+                    began = time.perf_counter()
+                    for _ in range(count):
+                        authenticator.authenticate(Request(django_request))
+                    seconds = time.perf_counter() - began
+                self.stdout.write(
+                    f"{name:27} {seconds / count * 1_000_000:8.1f} us/request "
+                    f"{len(queries) / count:6.3f} queries/request"
+                )
+
+            token_cache.clear()
+            transaction.set_rollback(True)
@@ -0,0 +1,175 @@
+"""
+Benchmark primary key insert cost for random (v4) and time-ordered (v7) UUIDs
+"""
+
+import time
+import uuid
+
+from django.apps.registry import Apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, models
+from django.utils import timezone
+
+from db.models import Notification
+from db.models.base import uuid7
+
+GENERATORS = {"uuid4": uuid.uuid4, "uuid7": uuid7}
+
+# Notifications sent per emergency in the generated rows
+NOTIFICATIONS_PER_EMERGENCY = 3
+
+
+def scratch_notification_model(table):
+    """
+    Copy of the Notification table's columns and indexes under another name
+
+    Foreign keys become indexed UUID columns, so rows need no parents.
+
+    Args:
+        table: Scratch table name
+
+    Returns:
+        Model class registered in its own app registry
+    """
+    attrs = {"__module__": __name__}
+    for field in Notification._meta.local_fields:
+        if field.is_relation:
+            attrs[field.name] = models.UUIDField(
+                null=field.null, db_index=True, db_column=field.column
+            )
+        else:
+            attrs[field.name] = field.clone()
+    attrs["Meta"] = type(
+        "Meta",
+        (),
+        {
+            "app_label": "benchmark",
+            "apps": Apps(),
+            "db_table": table,
+            "indexes": [
+                models.Index(fields=index.fields, name=f"{table[:20]}_{position}")
+                for position, index in enumerate(Notification._meta.indexes)
+            ],
+        },
+    )
+    return type(f"Scratch{table.title().replace('_', '')}", (models.Model,), attrs)
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare notification insert throughput and index size of uuid4 and uuid7 keys"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=10_000_000)
+        parser.add_argument("--batch", type=int, default=5000)
+        parser.add_argument(
+            "--users", type=int, default=100_000, help="Distinct recipient users"
+        )
+        parser.add_argument(
+            "--hospitals", type=int, default=2_000, help="Distinct hospitals"
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor not in ("sqlite", "postgresql"):
+            raise CommandError("Only SQLite and PostgreSQL are supported")
+
+        for name, generate in GENERATORS.items():
+            model = scratch_notification_model(f"benchmark_{name}_notification")
+            with connection.schema_editor() as editor:
+                editor.execute(f"DROP TABLE IF EXISTS {model._meta.db_table}")
+                editor.create_model(model)
+            try:
+                rows_per_second, tail_rows_per_second = self._insert(
+                    model, generate, options
+                )
+                pk_bytes, index_bytes = self._index_sizes(model._meta.db_table)
+            finally:
+                with connection.schema_editor() as editor:
+                    editor.delete_model(model)
+
+            self.stdout.write(
+                f"{name}: {rows_per_second:,.0f} rows/s "
+                f"(last 10%: {tail_rows_per_second:,.0f} rows/s), "
+                f"primary key index {pk_bytes / 1_048_576:.1f} MiB, "
+                f"all indexes {index_bytes / 1_048_576:.1f} MiB"
+            )
+
+    def _insert(self, model, generate, options):
+        """
+        Insert notification-shaped rows keyed by a UUID generator
+
+        Returns:
+            (rows per second overall, rows per second over the last tenth)
+        """
+        rows = options["rows"]
+        batch = options["batch"]
+        fields = model._meta.local_fields
+        columns = ", ".join(field.column for field in fields)
+        placeholders = ", ".join(["%s"] * len(fields))
+        sql = f"INSERT INTO {model._meta.db_table} ({columns}) VALUES ({placeholders})"
+        key = model._meta.pk.get_db_prep_value
+        users = [key(generate(), connection) for _ in range(options["users"])]
+        hospitals = [key(generate(), connection) for _ in range(options["hospitals"])]
+        values = {
+            "notification_type": "EMERGENCY_ALERT",
+            "recipient_type": "HOSPITAL",
+            "status": "SENT",
+            "title": "Emergency alert",
+            "message": "A patient needs an ambulance. " * 4,
+            "emergency_contact_name": "",
+            "emergency_contact_phone": "",
+            "is_active": True,
+        }
+
+        tail_start = rows - rows // 10
+        tail_began = None
+        emergency = None
+        began = time.perf_counter()
+        for offset in range(0, rows, batch):
+            if tail_began is None and offset + batch > tail_start:
+                tail_began, tail_offset = time.perf_counter(), offset
+            now = connection.ops.adapt_datetimefield_value(timezone.now())
+            batch_rows = []
+            for number in range(offset, min(offset + batch, rows)):
+                if number % NOTIFICATIONS_PER_EMERGENCY == 0:
+                    emergency = key(generate(), connection)
+                row = {
+                    **values,
+                    "id": key(generate(), connection),
+                    "hospital": hospitals[number % len(hospitals)],
+                    "user": users[number % len(users)],
+                    "emergency": emergency,
+                    "sent_at": now,
+                    "created_at": now,
+                    "updated_at": now,
+                }
+                batch_rows.append([row.get(field.name) for field in fields])
+            with connection.cursor() as cursor:
+                cursor.executemany(sql, batch_rows)
+        ended = time.perf_counter()
+        return (
+            rows / (ended - began),
+            (rows - tail_offset) / (ended - tail_began),
+        )
+
+    def _index_sizes(self, table):
+        """Return the on-disk size of a table's primary key and all its indexes"""
+        with connection.cursor() as cursor:
+            if connection.vendor == "sqlite":
+                cursor.execute(
+                    "SELECT SUM(pgsize) FROM dbstat WHERE name = %s",
+                    [f"sqlite_autoindex_{table}_1"],
+                )
+                pk_bytes = cursor.fetchone()[0]
+                cursor.execute(
+                    "SELECT SUM(pgsize) FROM dbstat WHERE name IN "
+                    "(SELECT name FROM sqlite_master "
+                    "WHERE type = 'index' AND tbl_name = %s)",
+                    [table],
+                )
+            else:
+                cursor.execute("SELECT pg_relation_size(%s)", [f"{table}_pkey"])
+                pk_bytes = cursor.fetchone()[0]
+                cursor.execute("SELECT pg_indexes_size(%s)", [table])
+            return pk_bytes or 0, cursor.fetchone()[0] or 0
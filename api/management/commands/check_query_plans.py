@@ -0,0 +1,182 @@
+"""
+Check that hot-path API queries are served by indexes
+"""
+
+import uuid
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from api.feed import NO_ID, filter_feed_after, get_hospital_feed_querysets
+from api.utils import phone_lookup_queryset
+from api.views import (
+    AmbulanceViewSet,
+    EmergencyContactViewSet,
+    EmergencyViewSet,
+    HospitalViewSet,
+    MedicalRecordViewSet,
+    NotificationViewSet,
+)
+from db.models import (
+    Ambulance,
+    Emergency,
+    EmergencyCard,
+    Hospital,
+    MedicalRecord,
+    Notification,
+    User,
+)
+
+ACTIVE_STATUSES = ["PENDING", "ACKNOWLEDGED", "DISPATCHED", "IN_PROGRESS"]
+
+# Queries allowed to walk an index in ORDER BY order. Each one has no
+# filter beyond the index's own condition, so the page LIMIT bounds the
+# walk; any other SCAN, with or without an index, reads the whole table
+# or index.
+ORDERED_INDEX_SCANS = {
+    "emergencies: staff list",
+    "notifications: staff list",
+}
+
+
+def viewset_queryset(viewset_class, user, params=None, action="list"):
+    """Build the filtered queryset a viewset would use for a request"""
+    request = Request(APIRequestFactory().get("/", params or {}))
+    request.user = user
+    view = viewset_class(request=request, action=action, format_kwarg=None)
+    view.kwargs = {}
+    return view.filter_queryset(view.get_queryset())
+
+
+def hot_path_queries():
+    """Yield (label, queryset) pairs for every hot-path query"""
+    patient = User(id=uuid.uuid4(), is_staff=False)
+    staff = User(id=uuid.uuid4(), is_staff=True)
+    hospital = Hospital(id=uuid.uuid4())
+
+    yield "emergencies: patient list", viewset_queryset(EmergencyViewSet, patient)
+    yield "emergencies: staff list", viewset_queryset(EmergencyViewSet, staff)
+    yield "emergencies: staff list by status", viewset_queryset(
+        EmergencyViewSet, staff, {"status": "PENDING"}
+    )
+    yield "notifications: patient list", viewset_queryset(NotificationViewSet, patient)
+    yield "notifications: patient unread", viewset_queryset(
+        NotificationViewSet, patient
+    ).exclude(status="READ")
+    yield "notifications: staff list", viewset_queryset(NotificationViewSet, staff)
+    yield "notifications: staff list by status", viewset_queryset(
+        NotificationViewSet, staff, {"status": "PENDING"}
+    )
+    yield "hospitals: list", viewset_queryset(HospitalViewSet, patient)
+    yield "hospitals: nearby candidates", Hospital.objects.regional().filter(
+        is_active=True,
+        has_emergency_services=True,
+        has_ambulance=True,
+        available_ambulances__gt=0,
+    )
+    yield "hospitals: emergencies", hospital.emergencies.all()
+    yield "hospitals: ambulances", hospital.ambulances.all()
+
+    feed_notifications, feed_emergencies = get_hospital_feed_querysets(hospital)
+    yield "hospitals: feed notifications", feed_notifications.order_by("-updated_at")
+    yield "hospitals: feed emergencies", feed_emergencies.order_by("-updated_at")
+    position = (timezone.now(), NO_ID)
+    yield "hospitals: feed notifications since cursor", filter_feed_after(
+        feed_notifications, position
+    )
+    yield "hospitals: feed emergencies since cursor", filter_feed_after(
+        feed_emergencies, position
+    )
+
+    yield "ambulances: available", viewset_queryset(AmbulanceViewSet, staff).filter(
+        status="AVAILABLE"
+    )
+    yield "ambulances: hospital available", Ambulance.objects.filter(
+        hospital=hospital, status="AVAILABLE"
+    )
+    yield "medical records: patient list", viewset_queryset(
+        MedicalRecordViewSet, patient
+    )
+    yield "emergency contacts: patient list", viewset_queryset(
+        EmergencyContactViewSet, patient
+    )
+
+    yield "dashboard: active emergencies", Emergency.objects.filter(
+        status__in=ACTIVE_STATUSES
+    )
+    yield "dashboard: pending notifications", Notification.objects.filter(
+        status="PENDING"
+    )
+    yield "dashboard: patient active emergencies", Emergency.objects.filter(
+        patient=patient, status__in=ACTIVE_STATUSES
+    )
+    yield "dashboard: patient unread notifications", Notification.objects.filter(
+        user=patient, status__in=["PENDING", "SENT", "DELIVERED"]
+    )
+
+    yield "users: lookup by phone", phone_lookup_queryset("+919800000000")
+
+    yield "emergency cards: lookup", EmergencyCard.objects.filter(
+        patient_id__in=[patient.id, staff.id]
+    )
+    yield "emergency cards: latest records", MedicalRecord.objects.filter(
+        patient=patient
+    ).order_by("-visit_date")
+
+
+def full_scans(plan, ordered_scan=False):
+    """
+    Return the plan lines that read a whole table or index
+
+    Only SEARCH lines seek into an index. A SCAN line is accepted only for
+    queries in ORDERED_INDEX_SCANS, and only when it walks an index that
+    also yields the ORDER BY, so the LIMIT stops it early.
+
+    Args:
+        plan: Output of QuerySet.explain() on SQLite
+        ordered_scan: Whether the query may walk an index in order
+
+    Returns:
+        List of offending plan lines
+    """
+    lines = [line.strip() for line in plan.splitlines()]
+    sorted_by_index = not any("USE TEMP B-TREE FOR ORDER BY" in line for line in lines)
+    return [
+        line
+        for line in lines
+        if " SCAN " in f" {line} "
+        and "CONSTANT ROW" not in line
+        and not (ordered_scan and sorted_by_index and " USING " in line)
+    ]
+
+
+class Command(BaseCommand):
+    help = "Fail if any hot-path API query falls back to a full table scan"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--verbose-plans", action="store_true", help="Print every query plan"
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != "sqlite":
+            raise CommandError("Query plan checks are only supported on SQLite")
+
+        failures = []
+        for label, queryset in hot_path_queries():
+            plan = queryset[:20].explain()
+            scans = full_scans(plan, ordered_scan=label in ORDERED_INDEX_SCANS)
+            if options["verbose_plans"]:
+                self.stdout.write(f"{label}\n{plan}\n")
+            if scans:
+                failures.append(label)
+                self.stdout.write(self.style.ERROR(f"FULL SCAN  {label}: {scans}"))
+            else:
+                self.stdout.write(f"ok         {label}")
+
+        if failures:
+            raise CommandError(f"{len(failures)} queries fall back to a full scan")
+        self.stdout.write(self.style.SUCCESS("All hot-path queries use indexes"))
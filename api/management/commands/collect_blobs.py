@@ -0,0 +1,92 @@
+"""
+Garbage-collect unreferenced blobs from the content-addressed storage
+"""
+
+import os
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from api.renditions import discard_renditions
+from db.models import StoredBlob
+from db.storage import (
+    BLOB_PREFIX,
+    blob_digest,
+    blob_files,
+    blob_reference_fields,
+    content_storage,
+)
+
+
+class Command(BaseCommand):
+    help = "Delete stored blobs that no model file field references"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--grace",
+            type=int,
+            default=getattr(settings, "BLOB_COLLECT_GRACE", 3600),
+            help="Keep blobs saved within this many seconds",
+        )
+        parser.add_argument(
+            "--recount",
+            action="store_true",
+            help="Rebuild reference counts from the model fields first",
+        )
+
+    def recount(self):
+        """Set every blob's refcount from the rows that reference it"""
+        references = Counter()
+        for model, field in blob_reference_fields():
+            if model._meta.proxy:
+                continue
+            references.update(
+                model._default_manager.filter(
+                    **{f"{field.attname}__startswith": BLOB_PREFIX}
+                ).values_list(field.attname, flat=True)
+            )
+        counts = Counter()
+        for name, count in references.items():
+            counts[blob_digest(name)] += count
+
+        blobs = list(StoredBlob.objects.only("digest", "refcount"))
+        changed = [
+            blob for blob in blobs if blob.refcount != counts.get(blob.digest, 0)
+        ]
+        for blob in changed:
+            blob.refcount = counts.get(blob.digest, 0)
+        StoredBlob.objects.bulk_update(changed, ["refcount"], batch_size=1000)
+        self.stdout.write(f"Corrected {len(changed)} reference counts")
+
+    def handle(self, *args, **options):
+        if options["recount"]:
+            self.recount()
+
+        cutoff = timezone.now() - timezone.timedelta(seconds=options["grace"])
+        removed = freed = 0
+        for blob in StoredBlob.objects.filter(
+            refcount__lte=0, last_saved_at__lt=cutoff
+        ).iterator():
+            # Conditional delete: skips blobs referenced or saved meanwhile
+            deleted, _ = StoredBlob.objects.filter(
+                digest=blob.digest, refcount__lte=0, last_saved_at__lt=cutoff
+            ).delete()
+            if not deleted:
+                continue
+            for name in blob_files(blob):
+                path = content_storage.path(name)
+                try:
+                    # A save racing with this delete touches the file first
+                    if os.path.getmtime(path) < cutoff.timestamp():
+                        os.unlink(path)
+                        discard_renditions(name)
+                except FileNotFoundError:
+                    pass
+            removed += 1
+            freed += blob.size
+
+        self.stdout.write(
+            f"Removed {removed} unreferenced blobs, freed {freed / 1024 / 1024:.1f} MiB"
+        )
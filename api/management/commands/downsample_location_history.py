@@ -0,0 +1,27 @@
+"""
+Downsample old ambulance location history
+"""
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from api.tracking import downsample_location_history
+
+
+class Command(BaseCommand):
+    help = "Re-encode old ambulance location history at coarser resolutions"
+
+    def handle(self, *args, **options):
+        tiers = getattr(settings, "AMBULANCE_HISTORY_DOWNSAMPLE_TIERS", [])
+        for age, resolution in tiers:
+            try:
+                before, after = downsample_location_history(
+                    timezone.timedelta(seconds=age), resolution
+                )
+            except ValueError as error:
+                raise CommandError(str(error)) from error
+            self.stdout.write(
+                f"Older than {age}s at {resolution}s resolution: "
+                f"{before} points -> {after} points"
+            )
@@ -0,0 +1,106 @@
+"""
+Export emergencies or notifications as compressed NDJSON or CSV, archived
+rows included
+"""
+
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django_filters.filterset import filterset_factory
+
+from api.exports import (
+    EXPORT_DATASETS,
+    ExportStats,
+    archived_export_queryset,
+    export_filename,
+    filter_export_period,
+    stream_export,
+)
+from api.views import EmergencyViewSet, NotificationViewSet
+from db.sharding import shard_for_region
+
+# Dataset -> filterset fields of its API list
+FILTER_FIELDS = {
+    "emergencies": EmergencyViewSet.filterset_fields,
+    "notifications": NotificationViewSet.filterset_fields,
+}
+
+
+class Command(BaseCommand):
+    help = "Stream emergencies or notifications to a gzip NDJSON or CSV file"
+
+    def add_arguments(self, parser):
+        parser.add_argument("dataset", choices=sorted(EXPORT_DATASETS))
+        parser.add_argument(
+            "--output",
+            help="Output file, or - for stdout (defaults to a name from the options)",
+        )
+        parser.add_argument("--format", choices=["ndjson", "csv"], default="ndjson")
+        parser.add_argument("--no-compress", action="store_true")
+        parser.add_argument("--month", help="Only rows created in YYYY-MM")
+        parser.add_argument("--region", help="Only this region's shard")
+        parser.add_argument(
+            "--filter",
+            action="append",
+            default=[],
+            metavar="FIELD=VALUE",
+            help="API list filter, e.g. status=COMPLETED (repeatable)",
+        )
+
+    def handle(self, *args, **options):
+        dataset = options["dataset"]
+        model, _ = EXPORT_DATASETS[dataset]
+        compress = not options["no_compress"]
+
+        filters = {}
+        for item in options["filter"]:
+            field, _, value = item.partition("=")
+            if field not in FILTER_FIELDS[dataset]:
+                raise CommandError(
+                    f"Cannot filter {dataset} on {field!r}; "
+                    f"use one of {', '.join(FILTER_FIELDS[dataset])}"
+                )
+            filters[field] = value
+        filterset = filterset_factory(model, fields=FILTER_FIELDS[dataset])(
+            filters, queryset=model.objects.order_by("created_at")
+        )
+        if not filterset.is_valid():
+            raise CommandError(filterset.errors.as_text())
+        try:
+            queryset = filter_export_period(filterset.qs, month=options["month"])
+            archived = filter_export_period(
+                archived_export_queryset(dataset, filterset.form.cleaned_data),
+                month=options["month"],
+            )
+        except ValueError:
+            raise CommandError("--month must be YYYY-MM")
+
+        aliases = None
+        if options["region"]:
+            alias = shard_for_region(options["region"])
+            if alias is None:
+                raise CommandError(f"Unknown region {options['region']!r}")
+            aliases = [alias]
+
+        output = options["output"] or export_filename(
+            dataset, options["format"], compress, options["month"]
+        )
+        stats = ExportStats()
+        chunks = stream_export(
+            dataset, queryset, options["format"], compress, aliases, stats, archived
+        )
+        if output == "-":
+            for chunk in chunks:
+                sys.stdout.buffer.write(chunk)
+            sys.stdout.buffer.flush()
+        else:
+            with open(output, "wb") as file:
+                for chunk in chunks:
+                    file.write(chunk)
+
+        # Keep the summary out of the data when exporting to stdout
+        log = self.stderr if output == "-" else self.stdout
+        log.write(
+            f"Exported {stats.rows} {dataset} to {output} in {stats.seconds:.1f}s "
+            f"({stats.rows_per_second} rows/s)"
+        )
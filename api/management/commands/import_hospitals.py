@@ -0,0 +1,65 @@
+"""
+Import the hospital directory from a CSV or NDJSON file
+"""
+
+import json
+import sys
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.imports import import_hospitals
+
+FORMATS_BY_SUFFIX = {".csv": "csv", ".ndjson": "ndjson", ".jsonl": "ndjson"}
+
+
+class Command(BaseCommand):
+    help = "Upsert hospitals on registration_number from a CSV or NDJSON file"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="File to import, or - for stdin")
+        parser.add_argument(
+            "--format",
+            choices=["csv", "ndjson"],
+            help="File format (defaults to the file extension)",
+        )
+        parser.add_argument("--batch-size", type=int)
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        file_format = options["format"] or FORMATS_BY_SUFFIX.get(
+            Path(path).suffix.lower()
+        )
+        if file_format is None:
+            raise CommandError("Cannot tell the format; pass --format")
+
+        def print_error(error):
+            self.stderr.write(
+                f"line {error['line']} "
+                f"({error['registration_number'] or 'no registration number'}): "
+                f"{json.dumps(error['errors'])}"
+            )
+
+        if path == "-":
+            report = import_hospitals(
+                sys.stdin.buffer,
+                file_format,
+                batch_size=options["batch_size"],
+                on_error=print_error,
+            )
+        else:
+            with open(path, "rb") as stream:
+                report = import_hospitals(
+                    stream,
+                    file_format,
+                    batch_size=options["batch_size"],
+                    on_error=print_error,
+                )
+
+        summary = report.as_dict()
+        self.stdout.write(
+            f"Processed {summary['processed']} rows in {summary['seconds']}s "
+            f"({summary['rows_per_second']} rows/s): {summary['created']} created, "
+            f"{summary['updated']} updated, {summary['duplicates']} duplicates, "
+            f"{summary['failed']} failed"
+        )
@@ -0,0 +1,47 @@
+"""
+Delete abandoned chunked attachment uploads and their part files
+"""
+
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from api.attachments import discard_upload
+from db.models import AttachmentUpload
+
+
+class Command(BaseCommand):
+    help = "Purge attachment uploads idle longer than ATTACHMENT_UPLOAD_EXPIRY"
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timezone.timedelta(
+            seconds=getattr(settings, "ATTACHMENT_UPLOAD_EXPIRY", 24 * 3600)
+        )
+        purged = 0
+        for upload in AttachmentUpload.objects.filter(updated_at__lt=cutoff):
+            discard_upload(upload)
+            purged += 1
+
+        # Part files left behind when their record or upload row was deleted
+        orphans = 0
+        upload_dir = Path(settings.ATTACHMENT_UPLOAD_DIR)
+        if upload_dir.is_dir():
+            live = {
+                str(upload_id)
+                for upload_id in AttachmentUpload.objects.values_list("id", flat=True)
+            }
+            for part in upload_dir.glob("*.part"):
+                # Skip recent files, which may belong to an upload created
+                # after the ids above were read
+                if (
+                    part.stem not in live
+                    and part.stat().st_mtime < cutoff.timestamp()
+                ):
+                    part.unlink(missing_ok=True)
+                    orphans += 1
+
+        self.stdout.write(
+            f"Purged {purged} idle uploads and {orphans} orphaned part files"
+        )
@@ -0,0 +1,29 @@
+"""
+Rebuild patient emergency cards
+"""
+
+from django.core.management.base import BaseCommand
+
+from api.cards import PATIENTS, refresh_emergency_card
+from db.models import User
+
+
+class Command(BaseCommand):
+    help = "Rebuild the emergency cards of every patient, or only missing ones"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--missing",
+            action="store_true",
+            help="Only build cards for patients that have none",
+        )
+
+    def handle(self, *args, **options):
+        users = User.objects.filter(PATIENTS).order_by("pk")
+        if options["missing"]:
+            users = users.filter(emergency_card__isnull=True)
+        built = 0
+        for user in users.iterator(chunk_size=500):
+            refresh_emergency_card(user.pk, user=user)
+            built += 1
+        self.stdout.write(f"Built {built} emergency cards")
@@ -0,0 +1,27 @@
+"""
+Rebuild the full-text search index of medical records
+"""
+
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from api.search import FTS_TABLE, rebuild_medical_record_index
+
+
+class Command(BaseCommand):
+    help = "Rebuild the SQLite full-text index of medical records"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--database", default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        connection = connections[options["database"]]
+        if connection.vendor != "sqlite":
+            self.stdout.write(
+                "Nothing to rebuild: the search column is maintained by the database"
+            )
+            return
+        rebuild_medical_record_index(using=options["database"])
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT count(*) FROM {FTS_TABLE}")
+            self.stdout.write(f"Indexed {cursor.fetchone()[0]} medical records")
@@ -0,0 +1,79 @@
+"""
+Middleware for the elderly healthcare system API
+"""
+
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.permissions import SAFE_METHODS
+
+from db.routers import replica_reads
+
+PIN_KEY_PREFIX = "db-pin:"
+
+
+def get_client_key(request):
+    """
+    Identify the client behind a request by its credentials
+
+    Args:
+        request: Django HttpRequest
+
+    Returns:
+        Hex digest of the Authorization header or session cookie, or None
+        for anonymous clients
+    """
+    credential = request.META.get("HTTP_AUTHORIZATION") or request.COOKIES.get(
+        settings.SESSION_COOKIE_NAME
+    )
+    if not credential:
+        return None
+    return hashlib.sha256(credential.encode()).hexdigest()[:32]
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Serve safe requests to the API viewsets from the read replicas
+
+    After a client writes, its reads go to the primary for
+    DATABASE_REPLICA_PIN_SECONDS so it always sees its own changes. Pins
+    live in the default cache, which must be shared between processes
+    (e.g. Redis or Memcached) for stickiness to hold across workers.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not getattr(settings, "DATABASE_REPLICAS", []):
+            return self.get_response(request)
+
+        client_key = get_client_key(request)
+        with replica_reads(allowed=False) as state:
+            request._replica_read_state = state
+            response = self.get_response(request)
+
+        if client_key and (state.wrote or request.method not in SAFE_METHODS):
+            cache.set(
+                PIN_KEY_PREFIX + client_key,
+                True,
+                getattr(settings, "DATABASE_REPLICA_PIN_SECONDS", 5),
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        state = getattr(request, "_replica_read_state", None)
+        view_class = getattr(view_func, "cls", None)
+        if (
+            state is None
+            or view_class is None
+            or view_class.__module__ != "api.views"
+            or request.method not in SAFE_METHODS
+        ):
+            return None
+
+        client_key = get_client_key(request)
+        if client_key is None or not cache.get(PIN_KEY_PREFIX + client_key):
+            state.allowed = True
+        return None
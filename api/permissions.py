@@ -0,0 +1,61 @@
+"""
+Permission classes for the elderly healthcare system API
+"""
+
+from rest_framework.permissions import BasePermission
+
+
+def is_hospital_operator(user, hospital):
+    """
+    Check whether a user may act for a hospital and see its patients' data
+
+    Hospitals are run by staff accounts; users have no per-hospital
+    membership yet.
+
+    Args:
+        user: Requesting User
+        hospital: Hospital instance
+
+    Returns:
+        True for staff
+    """
+    return user.is_authenticated and user.is_staff
+
+
+def can_report_location(user, ambulance):
+    """
+    Check whether a user may report an ambulance's position
+
+    Drivers are matched on Ambulance.driver, which only staff can set, and
+    never on phone numbers, which users register unverified.
+
+    Args:
+        user: Requesting User
+        ambulance: Ambulance instance
+
+    Returns:
+        True for staff and the ambulance's driver
+    """
+    if not user.is_authenticated:
+        return False
+    return user.is_staff or (
+        ambulance.driver_id is not None and ambulance.driver_id == user.pk
+    )
+
+
+class IsHospitalOperator(BasePermission):
+    """Allow hospital detail actions only to the hospital's operators (staff)"""
+
+    message = "Only staff can access this hospital's emergencies."
+
+    def has_object_permission(self, request, view, obj):
+        return is_hospital_operator(request.user, obj)
+
+
+class CanReportLocation(BasePermission):
+    """Allow ambulance location updates only to staff and its driver"""
+
+    message = "Only staff or the assigned driver can report this ambulance."
+
+    def has_object_permission(self, request, view, obj):
+        return can_report_location(request.user, obj)
@@ -0,0 +1,252 @@
+"""
+In-memory registry of available ambulances with nearest-neighbour queries
+"""
+
+import math
+
+from django.conf import settings
+
+from db.models import Ambulance
+from db.models.base import MICRODEGREES
+from db.sharding import get_shard_aliases
+
+from .inmemory import InMemoryIndex
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance between two points in kilometers"""
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = (
+        math.sin((lat2 - lat1) / 2) ** 2
+        + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+class AmbulanceRegistry(InMemoryIndex):
+    """
+    Grid index of AVAILABLE ambulances with a known position
+
+    The registry is per process. It loads lazily from the database, is kept
+    current by the location update paths and Ambulance saves, and reloads
+    every AMBULANCE_REGISTRY_REFRESH seconds to pick up changes made by
+    other processes.
+    """
+
+    refresh_setting = "AMBULANCE_REGISTRY_REFRESH"
+    default_refresh = 30
+
+    def __init__(self, cell_size=None):
+        super().__init__()
+        self.cell_size = cell_size or getattr(
+            settings, "AMBULANCE_REGISTRY_CELL_SIZE", 0.05
+        )
+        self._entries = {}
+        self._cells = {}
+
+    def _cell(self, latitude, longitude):
+        return (
+            math.floor(latitude / self.cell_size),
+            math.floor(longitude / self.cell_size),
+        )
+
+    def _build(self):
+        """Read the registry from every regional shard"""
+        rows = [
+            row
+            for alias in get_shard_aliases()
+            for row in Ambulance.objects.using(alias)
+            .filter(
+                status="AVAILABLE",
+                current_latitude_e6__isnull=False,
+                current_longitude_e6__isnull=False,
+            )
+            .values_list(
+                "id",
+                "vehicle_number",
+                "hospital_id",
+                "has_ventilator",
+                "current_latitude_e6",
+                "current_longitude_e6",
+            )
+        ]
+        entries = {}
+        cells = {}
+        for ambulance_id, vehicle_number, hospital_id, ventilator, lat, lon in rows:
+            entry = (
+                vehicle_number,
+                hospital_id,
+                ventilator,
+                lat / MICRODEGREES,
+                lon / MICRODEGREES,
+            )
+            entries[ambulance_id] = entry
+            cells.setdefault(self._cell(entry[3], entry[4]), set()).add(ambulance_id)
+        return entries, cells
+
+    def _install(self, data):
+        self._entries, self._cells = data
+
+    def _remove(self, ambulance_id):
+        entry = self._entries.pop(ambulance_id, None)
+        if entry is not None:
+            cell = self._cell(entry[3], entry[4])
+            members = self._cells.get(cell)
+            if members is not None:
+                members.discard(ambulance_id)
+                if not members:
+                    del self._cells[cell]
+        return entry
+
+    def _insert(self, ambulance_id, entry):
+        self._entries[ambulance_id] = entry
+        self._cells.setdefault(self._cell(entry[3], entry[4]), set()).add(ambulance_id)
+
+    def sync(self, ambulance):
+        """
+        Add, move or remove an ambulance based on its current state
+
+        Args:
+            ambulance: Ambulance instance
+        """
+        location = ambulance.get_current_location()
+        entry = None
+        if ambulance.status == "AVAILABLE" and location:
+            entry = (
+                ambulance.vehicle_number,
+                ambulance.hospital_id,
+                ambulance.has_ventilator,
+                location[0],
+                location[1],
+            )
+
+        def change():
+            self._remove(ambulance.id)
+            if entry is not None:
+                self._insert(ambulance.id, entry)
+
+        with self._lock:
+            self._apply(change)
+
+    def discard(self, ambulance_id):
+        """Remove an ambulance from the registry"""
+        with self._lock:
+            self._apply(lambda: self._remove(ambulance_id))
+
+    def move(self, positions):
+        """
+        Update positions of ambulances already in the registry
+
+        Args:
+            positions: Dict mapping ambulance id to (latitude, longitude)
+        """
+
+        def change():
+            for ambulance_id, (latitude, longitude) in positions.items():
+                entry = self._remove(ambulance_id)
+                if entry is not None:
+                    self._insert(
+                        ambulance_id,
+                        entry[:3] + (float(latitude), float(longitude)),
+                    )
+
+        with self._lock:
+            self._apply(change)
+
+    def nearest(self, latitude, longitude, count=5, ventilator=False, hospital_id=None):
+        """
+        Find the nearest available ambulances to a point
+
+        Args:
+            latitude: Point latitude
+            longitude: Point longitude
+            count: Maximum number of ambulances to return
+            ventilator: Only return ambulances with a ventilator
+            hospital_id: Only return ambulances of this hospital
+
+        Returns:
+            List of dicts sorted by distance
+        """
+        self._ensure_loaded()
+        latitude = float(latitude)
+        longitude = float(longitude)
+        origin = self._cell(latitude, longitude)
+
+        with self._lock:
+            remaining = len(self._entries)
+            found = []
+            ring = 0
+            while remaining > 0:
+                full_scan = 8 * ring > remaining
+                if full_scan:
+                    # The index is sparse this far out; a linear scan of
+                    # every entry is cheaper than walking empty rings
+                    candidates = self._entries.keys()
+                    found = []
+                else:
+                    candidates = [
+                        ambulance_id
+                        for cell in self._ring_cells(origin, ring)
+                        for ambulance_id in self._cells.get(cell, ())
+                    ]
+                    remaining -= len(candidates)
+                for ambulance_id in candidates:
+                    entry = self._entries[ambulance_id]
+                    if ventilator and not entry[2]:
+                        continue
+                    if hospital_id is not None and entry[1] != hospital_id:
+                        continue
+                    distance = haversine_km(latitude, longitude, entry[3], entry[4])
+                    found.append((distance, ambulance_id, entry))
+                if full_scan:
+                    break
+
+                # Anything outside the rings searched so far is at least
+                # this far away; stop once the best results are closer
+                if len(found) >= count:
+                    found.sort(key=lambda item: item[0])
+                    del found[count:]
+                    edge = abs(latitude) + (ring + 1) * self.cell_size
+                    bound = (
+                        ring
+                        * self.cell_size
+                        * KM_PER_DEGREE
+                        * math.cos(math.radians(min(edge, 90)))
+                    )
+                    if found[-1][0] <= bound:
+                        break
+                ring += 1
+
+        found.sort(key=lambda item: item[0])
+        return [
+            {
+                "id": ambulance_id,
+                "vehicle_number": entry[0],
+                "hospital": entry[1],
+                "has_ventilator": entry[2],
+                "latitude": entry[3],
+                "longitude": entry[4],
+                "distance_km": round(distance, 2),
+            }
+            for distance, ambulance_id, entry in found[:count]
+        ]
+
+    @staticmethod
+    def _ring_cells(origin, ring):
+        """Yield the grid cells at Chebyshev distance `ring` from origin"""
+        row, col = origin
+        if ring == 0:
+            yield origin
+            return
+        for offset in range(-ring, ring + 1):
+            yield (row - ring, col + offset)
+            yield (row + ring, col + offset)
+        for offset in range(-ring + 1, ring):
+            yield (row + offset, col - ring)
+            yield (row + offset, col + ring)
+
+
+ambulance_registry = AmbulanceRegistry()
@@ -0,0 +1,216 @@
+"""
+Resized renditions of profile pictures
+
+Each picture gets small square WebP and JPEG renditions, stored in the
+default storage under renditions/<key>/<size>.<format>. They are built in
+a per-process worker pool after a picture is saved, and on first request
+for pictures uploaded before renditions existed. Each rendition is written
+to a temporary file and renamed into place, so a rendition that exists is
+complete.
+"""
+
+import hashlib
+import io
+import logging
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+logger = logging.getLogger(__name__)
+
+RENDITION_FORMATS = {
+    "webp": ("WEBP", "image/webp", {"quality": 80, "method": 4}),
+    "jpeg": ("JPEG", "image/jpeg", {"quality": 82, "optimize": True}),
+}
+
+BUILT_KEY_PREFIX = "renditions-built:"
+
+_pool = None
+_pool_lock = threading.Lock()
+_pending = set()
+
+
+def rendition_sizes():
+    """Rendition name -> edge length in pixels, largest first"""
+    sizes = getattr(
+        settings,
+        "PROFILE_PICTURE_RENDITIONS",
+        {"thumb": 64, "small": 160, "medium": 320},
+    )
+    return dict(sorted(sizes.items(), key=lambda item: -item[1]))
+
+
+def rendition_key(name):
+    """
+    Directory key for a picture's renditions
+
+    Derived from the storage name, so a replaced picture gets new rendition
+    URLs that caches can keep forever; content-addressed pictures with the
+    same bytes share renditions.
+    """
+    return hashlib.sha256(name.encode()).hexdigest()[:32]
+
+
+def rendition_name(name, size, image_format):
+    """Storage name of one rendition of a picture"""
+    return f"renditions/{rendition_key(name)}/{size}.{image_format}"
+
+
+def renditions_exist(name):
+    """Whether every rendition of a picture has been written"""
+    # Renditions are written largest first, so the smallest one is last
+    smallest = list(rendition_sizes())[-1]
+    return default_storage.exists(
+        rendition_name(name, smallest, list(RENDITION_FORMATS)[-1])
+    )
+
+
+def renditions_built(name):
+    """
+    Whether a picture's renditions exist, remembered in the default cache
+
+    Serializing a user checks this, so only pictures not yet known to be
+    built touch the storage.
+    """
+    key = BUILT_KEY_PREFIX + rendition_key(name)
+    if cache.get(key):
+        return True
+    if not renditions_exist(name):
+        return False
+    cache.set(key, True, getattr(settings, "RENDITION_BUILT_CACHE_SECONDS", 3600))
+    return True
+
+
+def _write(name, data):
+    path = default_storage.path(name)
+    if os.path.exists(path):
+        return
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    # Rename a complete file into place: readers never see a partial one,
+    # and a worker writing the same rendition replaces it with equal bytes
+    handle, temporary = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(handle, "wb") as file:
+            file.write(data)
+        if default_storage.file_permissions_mode is not None:
+            os.chmod(temporary, default_storage.file_permissions_mode)
+        os.replace(temporary, path)
+    except Exception:
+        os.unlink(temporary)
+        raise
+
+
+def generate_renditions(field_file):
+    """
+    Write every missing rendition of a picture
+
+    Args:
+        field_file: FieldFile of the picture
+
+    Returns:
+        True if the renditions exist, False if the picture is unreadable
+    """
+    name = field_file.name
+    if renditions_exist(name):
+        return True
+
+    sizes = rendition_sizes()
+    try:
+        with field_file.storage.open(name, "rb") as source:
+            image = Image.open(source)
+            # Let the JPEG decoder downscale while decoding
+            largest = max(sizes.values())
+            image.draft("RGB", (largest * 2, largest * 2))
+            image = ImageOps.exif_transpose(image).convert("RGB")
+    except (OSError, UnidentifiedImageError, Image.DecompressionBombError):
+        logger.warning(f"Cannot build renditions of {name}", exc_info=True)
+        return False
+
+    # Each size is resized from the previous one, not the original
+    for size, edge in sizes.items():
+        image = ImageOps.fit(image, (edge, edge), Image.Resampling.LANCZOS)
+        for image_format, (pil_format, _, options) in RENDITION_FORMATS.items():
+            buffer = io.BytesIO()
+            image.save(buffer, pil_format, **options)
+            _write(rendition_name(name, size, image_format), buffer.getvalue())
+    return True
+
+
+def _generate(field_file):
+    try:
+        generate_renditions(field_file)
+    except Exception:
+        logger.exception(f"Rendition worker failed for {field_file.name}")
+    finally:
+        with _pool_lock:
+            _pending.discard(field_file.name)
+
+
+def schedule_renditions(field_file):
+    """
+    Build a picture's renditions in the background worker pool
+
+    Pictures already queued are not queued again.
+
+    Args:
+        field_file: FieldFile of the picture
+    """
+    global _pool
+    with _pool_lock:
+        if field_file.name in _pending:
+            return
+        _pending.add(field_file.name)
+        if _pool is None:
+            _pool = ThreadPoolExecutor(
+                max_workers=getattr(settings, "RENDITION_WORKERS", 2),
+                thread_name_prefix="renditions",
+            )
+    _pool.submit(_generate, field_file)
+
+
+def rendition_urls(field_file, url_for):
+    """
+    URLs of a picture's renditions
+
+    Built renditions are linked directly in the media storage. Otherwise
+    their build is queued and the links point at the API endpoint, which
+    builds a rendition on first request.
+
+    Args:
+        field_file: FieldFile of the picture
+        url_for: Callable (size, format) -> endpoint URL
+
+    Returns:
+        Dict of size -> format -> URL, or None without a picture
+    """
+    if not field_file:
+        return None
+    built = renditions_built(field_file.name)
+    if not built:
+        schedule_renditions(field_file)
+    return {
+        size: {
+            image_format: (
+                default_storage.url(rendition_name(field_file.name, size, image_format))
+                if built
+                else url_for(size, image_format)
+            )
+            for image_format in RENDITION_FORMATS
+        }
+        for size in rendition_sizes()
+    }
+
+
+def discard_renditions(name):
+    """Delete every rendition of a picture"""
+    cache.delete(BUILT_KEY_PREFIX + rendition_key(name))
+    for size in rendition_sizes():
+        for image_format in RENDITION_FORMATS:
+            default_storage.delete(rendition_name(name, size, image_format))
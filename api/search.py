@@ -0,0 +1,265 @@
+"""
+Full-text search over medical records
+
+SQLite keeps an FTS5 table (medical_record_fts) in step with the records
+through signals. PostgreSQL uses a generated tsvector column with a GIN
+index, which the database keeps current on its own. Both are created by
+migration 0010_medical_record_search. Other databases fall back to an
+unranked icontains match on the same fields.
+"""
+
+import html
+import re
+import uuid
+
+from django.conf import settings
+from django.db import connections, router
+from django.db.models import Case, IntegerField, Q, When
+from rest_framework.filters import SearchFilter
+
+from db.models import MedicalRecord
+
+FTS_TABLE = "medical_record_fts"
+
+# bm25 weights for (record_id, patient_id, diagnosis, treatment, doctor_name);
+# the id columns are not indexed
+FTS_WEIGHTS = (0.0, 0.0, 10.0, 5.0, 2.0)
+
+HIGHLIGHT_START = "<mark>"
+HIGHLIGHT_END = "</mark>"
+# Private-use characters the databases wrap matches in, so the record text
+# can be HTML-escaped before they are turned into the highlight tags
+MATCH_START = "\ue000"
+MATCH_END = "\ue001"
+
+# Fields matched by the icontains fallback
+FALLBACK_FIELDS = ("diagnosis", "treatment", "doctor_name")
+FALLBACK_SNIPPET_LENGTH = 160
+
+
+def _fts_query(text):
+    """Turn free text into an FTS5 query: all words, last one as a prefix"""
+    words = re.findall(r"\w+", text)
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += "*"
+    return " ".join(terms)
+
+
+def index_medical_record(record):
+    """
+    Add or refresh a record in the SQLite full-text index
+
+    Args:
+        record: MedicalRecord instance
+    """
+    connection = connections[router.db_for_write(MedicalRecord, instance=record)]
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE record_id = %s", [record.id.hex])
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE} "
+            f"(record_id, patient_id, diagnosis, treatment, doctor_name) "
+            f"VALUES (%s, %s, %s, %s, %s)",
+            [
+                record.id.hex,
+                record.patient_id.hex,
+                record.diagnosis,
+                record.treatment,
+                record.doctor_name,
+            ],
+        )
+
+
+def unindex_medical_record(record):
+    """
+    Remove a record from the SQLite full-text index
+
+    Args:
+        record: MedicalRecord instance
+    """
+    connection = connections[router.db_for_write(MedicalRecord, instance=record)]
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE record_id = %s", [record.id.hex])
+
+
+def rebuild_medical_record_index(using=None):
+    """
+    Rebuild the SQLite full-text index from the medical records table
+
+    Needed after bulk writes that bypass model signals.
+
+    Args:
+        using: Database alias (defaults to the write database)
+    """
+    connection = connections[using or router.db_for_write(MedicalRecord)]
+    if connection.vendor != "sqlite":
+        return
+    table = MedicalRecord._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE}")
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE} "
+            f"(record_id, patient_id, diagnosis, treatment, doctor_name) "
+            f"SELECT id, patient_id, diagnosis, treatment, doctor_name FROM {table}"
+        )
+
+
+def search_medical_records(text, patient_id=None, limit=None):
+    """
+    Rank medical records matching free text
+
+    Args:
+        text: Search text
+        patient_id: Only search this patient's records
+        limit: Maximum number of matches (defaults to
+            MEDICAL_RECORD_SEARCH_LIMIT)
+
+    Returns:
+        List of (record id, rank, snippet) ordered best match first; a
+        higher rank is a better match and snippets are HTML-escaped text
+        that marks matched words with <mark> tags
+    """
+    limit = limit or getattr(settings, "MEDICAL_RECORD_SEARCH_LIMIT", 500)
+    connection = connections[router.db_for_read(MedicalRecord)]
+    if connection.vendor == "sqlite":
+        rows = _search_sqlite(connection, text, patient_id, limit)
+    elif connection.vendor == "postgresql":
+        rows = _search_postgresql(connection, text, patient_id, limit)
+    else:
+        rows = _search_fallback(connection.alias, text, patient_id, limit)
+    return [
+        (uuid.UUID(str(record_id)), float(rank), _highlight(snippet))
+        for record_id, rank, snippet in rows
+    ]
+
+
+def _highlight(snippet):
+    """Escape a snippet as HTML and turn its match markers into <mark> tags"""
+    return (
+        html.escape(snippet)
+        .replace(MATCH_START, HIGHLIGHT_START)
+        .replace(MATCH_END, HIGHLIGHT_END)
+    )
+
+
+def _search_sqlite(connection, text, patient_id, limit):
+    query = _fts_query(text)
+    if query is None:
+        return []
+    weights = ", ".join(str(weight) for weight in FTS_WEIGHTS)
+    sql = (
+        f"SELECT record_id, -bm25({FTS_TABLE}, {weights}) AS rank, "
+        f"snippet({FTS_TABLE}, -1, %s, %s, '…', 16) "
+        f"FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s"
+    )
+    params = [MATCH_START, MATCH_END, query]
+    if patient_id is not None:
+        sql += " AND patient_id = %s"
+        params.append(uuid.UUID(str(patient_id)).hex)
+    sql += " ORDER BY rank DESC LIMIT %s"
+    params.append(limit)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+
+def _search_postgresql(connection, text, patient_id, limit):
+    table = MedicalRecord._meta.db_table
+    patient_filter = ""
+    params = [text]
+    if patient_id is not None:
+        patient_filter = "AND patient_id = %s"
+        params.append(patient_id)
+    params.append(limit)
+    # Rank and limit first so ts_headline only runs on the returned rows
+    sql = (
+        f"SELECT matches.id, matches.rank, "
+        f"ts_headline('english', record.diagnosis || ' ' || record.treatment, "
+        f"matches.query, %s) "
+        f"FROM (SELECT id, query, ts_rank(search_vector, query) AS rank "
+        f"FROM {table}, websearch_to_tsquery('english', %s) query "
+        f"WHERE search_vector @@ query {patient_filter} "
+        f"ORDER BY rank DESC LIMIT %s) matches "
+        f"JOIN {table} record ON record.id = matches.id "
+        f"ORDER BY matches.rank DESC"
+    )
+    options = (
+        f"StartSel={MATCH_START}, StopSel={MATCH_END}, "
+        f"MaxFragments=2, MaxWords=16, MinWords=4"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [options, *params])
+        return cursor.fetchall()
+
+
+def _search_fallback(alias, text, patient_id, limit):
+    # Every word must appear in one of the fields; newest visits first
+    words = re.findall(r"\w+", text)
+    if not words:
+        return []
+    queryset = MedicalRecord.objects.using(alias)
+    if patient_id is not None:
+        queryset = queryset.filter(patient_id=patient_id)
+    for word in words:
+        condition = Q()
+        for field in FALLBACK_FIELDS:
+            condition |= Q(**{f"{field}__icontains": word})
+        queryset = queryset.filter(condition)
+    pattern = re.compile("|".join(re.escape(word) for word in words), re.IGNORECASE)
+    return [
+        (
+            record_id,
+            0.0,
+            pattern.sub(
+                lambda match: f"{MATCH_START}{match.group()}{MATCH_END}",
+                f"{diagnosis} {treatment}"[:FALLBACK_SNIPPET_LENGTH],
+            ),
+        )
+        for record_id, diagnosis, treatment in queryset.order_by(
+            "-visit_date"
+        ).values_list("id", "diagnosis", "treatment")[:limit]
+    ]
+
+
+class MedicalRecordSearchFilter(SearchFilter):
+    """
+    SearchFilter for ?search= backed by the full-text index
+
+    Matches are ordered best first unless an ordering is requested. Patients
+    only search their own records. At most MEDICAL_RECORD_SEARCH_LIMIT
+    matches are listed; `request.search_truncated` tells whether more
+    records matched.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        text = " ".join(self.get_search_terms(request))
+        if not text:
+            return queryset
+
+        patient_id = None if request.user.is_staff else request.user.pk
+        limit = getattr(settings, "MEDICAL_RECORD_SEARCH_LIMIT", 500)
+        # One match past the limit shows whether the list was cut
+        ids = [
+            record_id
+            for record_id, _, _ in search_medical_records(
+                text, patient_id=patient_id, limit=limit + 1
+            )
+        ]
+        request.search_truncated = len(ids) > limit
+        ids = ids[:limit]
+        if not ids:
+            return queryset.none()
+        return queryset.filter(id__in=ids).order_by(
+            Case(
+                *[
+                    When(id=record_id, then=position)
+                    for position, record_id in enumerate(ids)
+                ],
+                output_field=IntegerField(),
+            )
+        )
@@ -1,8 +1,19 @@
+import os
+import re
+from contextlib import contextmanager
+
+from django.conf import settings
 from django.contrib.auth import authenticate
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import IntegrityError, transaction
+from django.db.models.manager import BaseManager
+from django.urls import reverse
+from django.utils import timezone
 from rest_framework import serializers
 
 from db.models import (
     Ambulance,
+    AttachmentUpload,
     Emergency,
     EmergencyContact,
     Hospital,
@@ -10,6 +21,48 @@ from db.models import (
     Notification,
     User,
 )
+from db.models.base import to_e164
+
+from .cards import get_emergency_cards
+from .feed import parse_feed_cursor
+from .renditions import rendition_key, rendition_urls
+from .tracking import parse_fix
+
+
+def validate_unique_phone(value, instance=None):
+    """Reject a phone number that normalizes to another user's number"""
+    phone = to_e164(value)
+    if phone:
+        users = User.objects.filter(phone_e164=phone)
+        if instance is not None:
+            users = users.exclude(pk=instance.pk)
+        if users.exists():
+            raise serializers.ValidationError(
+                "A user with this phone number already exists."
+            )
+    return value
+
+
+@contextmanager
+def unique_phone_errors():
+    """
+    Report a phone number taken by another user as a validation error
+
+    validate_unique_phone runs before the write, so a concurrent request
+    can still claim the number first; the unique constraint or the model's
+    own check then rejects the save, which becomes a 400 here.
+    """
+    try:
+        with transaction.atomic():
+            yield
+    except DjangoValidationError as error:
+        raise serializers.ValidationError(error.message_dict)
+    except IntegrityError as error:
+        if "phone_number" not in str(error) and "phone_e164" not in str(error):
+            raise
+        raise serializers.ValidationError(
+            {"phone_number": ["A user with this phone number already exists."]}
+        )
 
 
 class UserRegistrationSerializer(serializers.ModelSerializer):
@@ -52,6 +105,9 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
             "emergency_contact_phone": {"required": True},
         }
 
+    def validate_phone_number(self, value):
+        return validate_unique_phone(value)
+
     def validate(self, attrs):
         if attrs["password"] != attrs["password_confirm"]:
             raise serializers.ValidationError("Passwords don't match")
@@ -60,9 +116,10 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         validated_data.pop("password_confirm")
         password = validated_data.pop("password")
-        user = User.objects.create_user(**validated_data)
-        user.set_password(password)
-        user.save()
+        with unique_phone_errors():
+            user = User.objects.create_user(**validated_data)
+            user.set_password(password)
+            user.save()
         return user
 
 
@@ -71,6 +128,7 @@ class UserSerializer(serializers.ModelSerializer):
 
     full_name = serializers.SerializerMethodField()
     location = serializers.SerializerMethodField()
+    profile_picture_renditions = serializers.SerializerMethodField()
 
     class Meta:
         model = User
@@ -96,18 +154,42 @@ class UserSerializer(serializers.ModelSerializer):
             "medications",
             "medical_notes",
             "profile_picture",
+            "profile_picture_renditions",
             "is_elderly",
             "date_joined",
             "last_login",
         ]
         read_only_fields = ["id", "username", "date_joined", "last_login"]
 
+    def validate_phone_number(self, value):
+        return validate_unique_phone(value, self.instance)
+
+    def update(self, instance, validated_data):
+        with unique_phone_errors():
+            return super().update(instance, validated_data)
+
     def get_full_name(self, obj):
         return f"{obj.first_name} {obj.last_name}"
 
     def get_location(self, obj):
         return obj.get_location()
 
+    def get_profile_picture_renditions(self, obj):
+        def endpoint(size, image_format):
+            url = reverse(
+                "api:users-profile-picture-rendition",
+                kwargs={"pk": obj.pk, "size": size, "image_format": image_format},
+            )
+            return f"{url}?v={rendition_key(obj.profile_picture.name)}"
+
+        urls = rendition_urls(obj.profile_picture, endpoint)
+        request = self.context.get("request")
+        if urls and request is not None:
+            for formats in urls.values():
+                for image_format, url in formats.items():
+                    formats[image_format] = request.build_absolute_uri(url)
+        return urls
+
 
 class LoginSerializer(serializers.Serializer):
     """Serializer for user login"""
@@ -131,6 +213,12 @@ class LoginSerializer(serializers.Serializer):
             raise serializers.ValidationError("Must include username and password")
 
 
+class RefreshTokenSerializer(serializers.Serializer):
+    """Serializer for exchanging a refresh token"""
+
+    refresh_token = serializers.CharField()
+
+
 class HospitalSerializer(serializers.ModelSerializer):
     """Serializer for hospital"""
 
@@ -176,9 +264,7 @@ class HospitalSerializer(serializers.ModelSerializer):
         return getattr(obj, "distance_to_user", None)
 
     def get_specializations_list(self, obj):
-        if obj.specializations:
-            return [spec.strip() for spec in obj.specializations.split(",")]
-        return []
+        return obj.get_specializations_list()
 
 
 class EmergencySerializer(serializers.ModelSerializer):
@@ -227,6 +313,39 @@ class EmergencySerializer(serializers.ModelSerializer):
         return obj.get_emergency_location()
 
 
+class EmergencyCardListSerializer(serializers.ListSerializer):
+    """List serializer that loads every item's emergency card in one query"""
+
+    def to_representation(self, data):
+        items = list(data.all() if isinstance(data, BaseManager) else data)
+        self.child.emergency_cards = get_emergency_cards(
+            patient_id
+            for patient_id in map(self.child.get_card_patient_id, items)
+            if patient_id is not None
+        )
+        return super().to_representation(items)
+
+
+class HospitalEmergencySerializer(EmergencySerializer):
+    """Emergency serializer for responders, with the patient's emergency card"""
+
+    emergency_card = serializers.SerializerMethodField()
+    emergency_cards = None
+
+    class Meta(EmergencySerializer.Meta):
+        fields = EmergencySerializer.Meta.fields + ["emergency_card"]
+        list_serializer_class = EmergencyCardListSerializer
+
+    def get_card_patient_id(self, obj):
+        return obj.patient_id
+
+    def get_emergency_card(self, obj):
+        cards = self.emergency_cards
+        if cards is None:
+            cards = get_emergency_cards([obj.patient_id])
+        return cards.get(obj.patient_id)
+
+
 class EmergencyCreateSerializer(serializers.ModelSerializer):
     """Serializer for creating emergency requests"""
 
@@ -290,6 +409,35 @@ class NotificationSerializer(serializers.ModelSerializer):
         return obj.emergency.description if obj.emergency else None
 
 
+class HospitalNotificationSerializer(NotificationSerializer):
+    """
+    Notification serializer for responders
+
+    Hospital notifications carry the emergency card of the patient.
+    """
+
+    emergency_card = serializers.SerializerMethodField()
+    emergency_cards = None
+
+    class Meta(NotificationSerializer.Meta):
+        fields = NotificationSerializer.Meta.fields + ["emergency_card"]
+        list_serializer_class = EmergencyCardListSerializer
+
+    def get_card_patient_id(self, obj):
+        if obj.recipient_type != "HOSPITAL" or obj.emergency is None:
+            return None
+        return obj.emergency.patient_id
+
+    def get_emergency_card(self, obj):
+        patient_id = self.get_card_patient_id(obj)
+        if patient_id is None:
+            return None
+        cards = self.emergency_cards
+        if cards is None:
+            cards = get_emergency_cards([patient_id])
+        return cards.get(patient_id)
+
+
 class MedicalRecordSerializer(serializers.ModelSerializer):
     """Serializer for medical records"""
 
@@ -311,6 +459,7 @@ class MedicalRecordSerializer(serializers.ModelSerializer):
             "doctor_name",
             "doctor_notes",
             "attachments",
+            "attachment_filename",
             "visit_date",
             "next_appointment",
             "created_at",
@@ -324,6 +473,49 @@ class MedicalRecordSerializer(serializers.ModelSerializer):
     def get_hospital_name(self, obj):
         return obj.hospital.name if obj.hospital else None
 
+    def validate(self, attrs):
+        if "attachments" in attrs:
+            attachment = attrs["attachments"]
+            attrs["attachment_filename"] = (
+                os.path.basename(attachment.name) if attachment else ""
+            )
+        return attrs
+
+
+class AttachmentUploadSerializer(serializers.ModelSerializer):
+    """Serializer for chunked medical record attachment uploads"""
+
+    class Meta:
+        model = AttachmentUpload
+        fields = [
+            "id",
+            "medical_record",
+            "filename",
+            "size",
+            "checksum",
+            "received",
+            "created_at",
+            "updated_at",
+        ]
+        read_only_fields = [
+            "id",
+            "medical_record",
+            "received",
+            "created_at",
+            "updated_at",
+        ]
+
+    def validate_size(self, value):
+        max_size = getattr(settings, "ATTACHMENT_MAX_SIZE", 512 * 1024 * 1024)
+        if not 0 < value <= max_size:
+            raise serializers.ValidationError(f"Size must be 1 to {max_size} bytes")
+        return value
+
+    def validate_checksum(self, value):
+        if value and not re.fullmatch(r"[0-9a-fA-F]{64}", value):
+            raise serializers.ValidationError("Checksum must be a hex SHA-256")
+        return value
+
 
 class AmbulanceSerializer(serializers.ModelSerializer):
     """Serializer for ambulance"""
@@ -341,6 +533,7 @@ class AmbulanceSerializer(serializers.ModelSerializer):
             "vehicle_number",
             "driver_name",
             "driver_phone",
+            "driver",
             "status",
             "current_latitude",
             "current_longitude",
@@ -356,6 +549,19 @@ class AmbulanceSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ["id", "created_at", "updated_at"]
 
+    def validate_driver(self, value):
+        # The driver may report the ambulance's position, so only staff
+        # link accounts to ambulances
+        current = self.instance.driver_id if self.instance else None
+        request = self.context.get("request")
+        if (value and value.pk) != current and not (
+            request is not None and request.user.is_staff
+        ):
+            raise serializers.ValidationError(
+                "Only staff can assign an ambulance's driver."
+            )
+        return value
+
     def get_hospital_name(self, obj):
         return obj.hospital.name
 
@@ -403,6 +609,13 @@ class EmergencyResponseSerializer(serializers.Serializer):
     response_notes = serializers.CharField(max_length=1000, required=False)
 
 
+class HospitalAutocompleteSerializer(serializers.Serializer):
+    """Serializer for hospital name and city autocomplete"""
+
+    q = serializers.CharField(max_length=100)
+    limit = serializers.IntegerField(min_value=1, max_value=20, default=10)
+
+
 class NearbyHospitalsSerializer(serializers.Serializer):
     """Serializer for finding nearby hospitals"""
 
@@ -411,6 +624,9 @@ class NearbyHospitalsSerializer(serializers.Serializer):
     radius_km = serializers.IntegerField(min_value=1, max_value=50, default=10)
     emergency_services_only = serializers.BooleanField(default=True)
     available_ambulance_only = serializers.BooleanField(default=True)
+    specializations = serializers.ListField(
+        child=serializers.CharField(max_length=100), required=False, max_length=20
+    )
 
 
 class EmergencyStatusUpdateSerializer(serializers.Serializer):
@@ -419,3 +635,142 @@ class EmergencyStatusUpdateSerializer(serializers.Serializer):
     status = serializers.ChoiceField(choices=Emergency.STATUS_CHOICES)
     response_notes = serializers.CharField(max_length=1000, required=False)
     estimated_arrival_time = serializers.DateTimeField(required=False)
+
+
+class HospitalFeedSerializer(serializers.Serializer):
+    """Serializer for hospital feed query parameters"""
+
+    since = serializers.CharField(required=False)
+    wait = serializers.IntegerField(min_value=0, max_value=60, default=0)
+    limit = serializers.IntegerField(min_value=1, max_value=500, default=100)
+
+    def validate_since(self, value):
+        cursor = parse_feed_cursor(value)
+        if cursor is None:
+            raise serializers.ValidationError("Invalid feed cursor")
+        return cursor
+
+
+class AmbulanceLocationBatchSerializer(serializers.Serializer):
+    """Serializer for batched ambulance GPS fixes"""
+
+    fixes = serializers.ListField(
+        child=serializers.ListField(min_length=4, max_length=4),
+        allow_empty=False,
+        max_length=5000,
+        help_text="List of [vehicle_number, latitude, longitude, timestamp]",
+    )
+
+    def validate_fixes(self, value):
+        parsed = []
+        for index, fix in enumerate(value):
+            fix = parse_fix(fix)
+            if fix is None:
+                raise serializers.ValidationError(f"Invalid fix at index {index}")
+            parsed.append(fix)
+        return parsed
+
+
+class AmbulanceHistorySerializer(serializers.Serializer):
+    """Serializer for ambulance location history query parameters"""
+
+    start = serializers.DateTimeField(required=False)
+    end = serializers.DateTimeField(required=False)
+    resolution = serializers.IntegerField(
+        min_value=1,
+        required=False,
+        help_text="Seconds between returned fixes; omit for every fix",
+    )
+
+    def validate(self, attrs):
+        attrs.setdefault("end", timezone.now())
+        attrs.setdefault("start", attrs["end"] - timezone.timedelta(hours=1))
+        if attrs["start"] > attrs["end"]:
+            raise serializers.ValidationError("start must be before end")
+        return attrs
+
+
+class NearestAmbulancesSerializer(serializers.Serializer):
+    """Serializer for finding the nearest available ambulances"""
+
+    emergency_id = serializers.UUIDField(required=False)
+    latitude = serializers.DecimalField(max_digits=10, decimal_places=8, required=False)
+    longitude = serializers.DecimalField(
+        max_digits=11, decimal_places=8, required=False
+    )
+    count = serializers.IntegerField(min_value=1, max_value=50, default=5)
+    ventilator = serializers.BooleanField(default=False)
+
+    def validate(self, attrs):
+        has_point = "latitude" in attrs and "longitude" in attrs
+        if not has_point and "emergency_id" not in attrs:
+            raise serializers.ValidationError(
+                "Provide emergency_id or latitude and longitude"
+            )
+        return attrs
+
+
+class MedicalRecordSearchSerializer(serializers.Serializer):
+    """Serializer for full-text medical record search"""
+
+    q = serializers.CharField(max_length=200)
+    patient = serializers.UUIDField(required=False)
+    limit = serializers.IntegerField(min_value=1, max_value=100, default=20)
+
+
+class PhoneLookupSerializer(serializers.Serializer):
+    """Serializer for resolving a caller's phone number"""
+
+    phone = serializers.CharField(max_length=32)
+
+    def validate_phone(self, value):
+        phone = to_e164(value)
+        if phone is None:
+            raise serializers.ValidationError("Not a valid phone number")
+        return phone
+
+
+class HospitalImportSerializer(serializers.ModelSerializer):
+    """
+    Serializer for one row of a bulk hospital directory import
+
+    Rows are upserted on registration_number, so its uniqueness check is
+    left to the database.
+    """
+
+    class Meta:
+        model = Hospital
+        fields = [
+            "name",
+            "registration_number",
+            "phone_number",
+            "email",
+            "website",
+            "address",
+            "city",
+            "state",
+            "pincode",
+            "latitude",
+            "longitude",
+            "has_emergency_services",
+            "has_ambulance",
+            "total_ambulances",
+            "available_ambulances",
+            "specializations",
+            "operates_24x7",
+            "operating_hours",
+            "is_active",
+        ]
+        extra_kwargs = {"registration_number": {"validators": []}}
+
+
+class ExportSerializer(serializers.Serializer):
+    """Serializer for streaming export query parameters"""
+
+    # Not "format": DRF takes ?format= as a renderer override
+    # (URL_FORMAT_OVERRIDE) and answers ?format=csv with a 404
+    file_format = serializers.ChoiceField(choices=["ndjson", "csv"], default="ndjson")
+    compress = serializers.BooleanField(default=True)
+    month = serializers.RegexField(r"^\d{4}-(0[1-9]|1[0-2])$", required=False)
+    created_after = serializers.DateTimeField(required=False)
+    created_before = serializers.DateTimeField(required=False)
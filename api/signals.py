@@ -0,0 +1,217 @@
+"""
+Signal handlers for the elderly healthcare system API
+"""
+
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from db.models import (
+    Ambulance,
+    Emergency,
+    EmergencyContact,
+    Hospital,
+    MedicalRecord,
+    Notification,
+    TokenUser,
+    User,
+)
+from db.sharding import mirror_row
+from db.storage import blob_reference_fields, change_blob_references
+
+from .authentication import token_cache
+from .autocomplete import hospital_autocomplete
+from .cards import (
+    CONTACT_FIELDS,
+    PATIENT_FIELDS,
+    is_patient,
+    refresh_emergency_card,
+)
+from .feed import notify_hospital_feed
+from .registry import ambulance_registry
+from .renditions import renditions_exist, schedule_renditions
+from .search import index_medical_record, unindex_medical_record
+
+
+@receiver(post_save, sender=Notification)
+def notification_saved(sender, instance, **kwargs):
+    """Wake hospital feed long-polls when a hospital notification changes"""
+    notify_hospital_feed(instance.hospital_id)
+
+
+@receiver(post_save, sender=Emergency)
+def emergency_saved(sender, instance, **kwargs):
+    """Wake hospital feed long-polls when an assigned emergency changes"""
+    notify_hospital_feed(instance.assigned_hospital_id)
+
+
+@receiver(post_save, sender=Ambulance)
+def ambulance_saved(sender, instance, **kwargs):
+    """Keep the live ambulance registry in step with status and location"""
+    ambulance_registry.sync(instance)
+
+
+@receiver(post_delete, sender=Ambulance)
+def ambulance_deleted(sender, instance, **kwargs):
+    """Drop deleted ambulances from the live ambulance registry"""
+    ambulance_registry.discard(instance.id)
+
+
+@receiver(post_save, sender=Hospital)
+def hospital_saved(sender, instance, using, **kwargs):
+    """Keep the directory copy and autocomplete index of hospitals current"""
+    if using != DEFAULT_DB_ALIAS:
+        mirror_row(instance, DEFAULT_DB_ALIAS)
+    hospital_autocomplete.sync(instance)
+
+
+@receiver(post_delete, sender=Hospital)
+def hospital_deleted(sender, instance, **kwargs):
+    """Drop deleted hospitals from the autocomplete index"""
+    hospital_autocomplete.discard(instance.id)
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    """Stop accepting a deleted token from the authentication cache"""
+    token_cache.invalidate(instance.key)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+@receiver(post_save, sender=TokenUser)
+@receiver(post_delete, sender=TokenUser)
+def user_changed(sender, instance, **kwargs):
+    """Drop cached credentials of a changed or deleted user"""
+    token_cache.invalidate_user(instance.pk)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_save, sender=TokenUser)
+def profile_picture_saved(sender, instance, using, update_fields=None, **kwargs):
+    """Build renditions of a new profile picture once it is committed"""
+    if update_fields is not None and "profile_picture" not in update_fields:
+        return
+    if "profile_picture" in instance.get_deferred_fields():
+        return
+    picture = instance.profile_picture
+    if picture and not renditions_exist(picture.name):
+        transaction.on_commit(lambda: schedule_renditions(picture), using=using)
+
+
+@receiver(post_save, sender=MedicalRecord)
+def medical_record_saved(sender, instance, **kwargs):
+    """Keep the full-text search index in step with record text"""
+    index_medical_record(instance)
+
+
+@receiver(post_delete, sender=MedicalRecord)
+def medical_record_deleted(sender, instance, **kwargs):
+    """Drop deleted records from the full-text search index"""
+    unindex_medical_record(instance)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_save, sender=TokenUser)
+def patient_card_saved(sender, instance, created, using, update_fields=None, **kwargs):
+    """Rebuild the patient and contact sections of a patient's emergency card"""
+    if using != DEFAULT_DB_ALIAS:
+        return
+    deferred = instance.get_deferred_fields()
+    # A user restored from a token is checked once the card is built
+    if not {"is_elderly", "is_staff"} & deferred and not is_patient(instance):
+        return
+    sections = ["patient", "contacts"]
+    if update_fields is not None:
+        sections = [
+            section
+            for section, fields in (
+                ("patient", PATIENT_FIELDS),
+                ("contacts", CONTACT_FIELDS),
+            )
+            if fields & set(update_fields)
+        ]
+        if not sections:
+            return
+    user = None if deferred else instance
+    transaction.on_commit(
+        lambda: refresh_emergency_card(instance.pk, sections, user=user), using=using
+    )
+
+
+@receiver(post_save, sender=EmergencyContact)
+@receiver(post_delete, sender=EmergencyContact)
+def emergency_contact_changed(sender, instance, using, **kwargs):
+    """Rebuild the contact section of the patient's emergency card"""
+    transaction.on_commit(
+        lambda: refresh_emergency_card(instance.patient_id, ["contacts"]), using=using
+    )
+
+
+@receiver(post_save, sender=MedicalRecord)
+@receiver(post_delete, sender=MedicalRecord)
+def medical_record_changed(sender, instance, using, **kwargs):
+    """Rebuild the records section of the patient's emergency card"""
+    transaction.on_commit(
+        lambda: refresh_emergency_card(instance.patient_id, ["records"]), using=using
+    )
+
+
+# Model -> attnames of its file fields in the content-addressed storage
+BLOB_FIELDS = {}
+for model, field in blob_reference_fields():
+    BLOB_FIELDS.setdefault(model, []).append(field.attname)
+
+
+def _stored_names(instance):
+    """Current storage names of an instance's blob fields; None if deferred"""
+    names = {}
+    for attname in BLOB_FIELDS[type(instance)]:
+        if attname not in instance.__dict__:
+            names[attname] = None
+            continue
+        value = instance.__dict__[attname]
+        names[attname] = getattr(value, "name", value) or ""
+    return names
+
+
+def blob_fields_loaded(sender, instance, **kwargs):
+    """Remember which blobs an instance referenced when it was loaded"""
+    instance._stored_blobs = _stored_names(instance)
+
+
+def blob_fields_saved(sender, instance, created, using, **kwargs):
+    """Move blob reference counts from replaced files to new ones"""
+    previous = {} if created else instance._stored_blobs
+    current = _stored_names(instance)
+    added = []
+    released = []
+    for attname, name in current.items():
+        old = previous.get(attname, "")
+        if name is None or old is None or name == old:
+            continue
+        added.append(name)
+        released.append(old)
+    instance._stored_blobs = current
+
+    # Counts change only once the row change is committed, so a rolled back
+    # save never leaves a blob counted or released
+    def move_references():
+        change_blob_references(added, 1)
+        change_blob_references(released, -1)
+
+    if added:
+        transaction.on_commit(move_references, using=using)
+
+
+def blob_fields_deleted(sender, instance, using, **kwargs):
+    """Release the blobs a deleted instance referenced"""
+    released = list(instance._stored_blobs.values())
+    transaction.on_commit(lambda: change_blob_references(released, -1), using=using)
+
+
+for model in BLOB_FIELDS:
+    post_init.connect(blob_fields_loaded, sender=model)
+    post_save.connect(blob_fields_saved, sender=model)
+    post_delete.connect(blob_fields_deleted, sender=model)
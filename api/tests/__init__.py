@@ -0,0 +1,3 @@
+"""
+Tests for the elderly healthcare system API (run with `manage.py test`)
+"""
@@ -0,0 +1,69 @@
+"""
+Helpers creating the rows API tests need
+"""
+
+import itertools
+
+from rest_framework.test import APIClient
+
+from db.models import Ambulance, Hospital, User
+
+_sequence = itertools.count(1)
+
+
+def make_user(is_staff=False, is_elderly=True, **fields):
+    """Create a user with a unique username and phone number"""
+    number = next(_sequence)
+    defaults = {
+        "username": f"user{number}",
+        "password": "pass12345",
+        "phone_number": f"+9198{number:08d}",
+        "address": "1 Test Street",
+        "emergency_contact_name": "Contact",
+        "emergency_contact_phone": "+15550001111",
+        "emergency_contact_relationship": "Son",
+        "is_staff": is_staff,
+        "is_elderly": is_elderly,
+    }
+    defaults.update(fields)
+    return User.objects.create_user(**defaults)
+
+
+def make_hospital(**fields):
+    """Create a hospital with a unique registration number"""
+    number = next(_sequence)
+    defaults = {
+        "name": f"Hospital {number}",
+        "registration_number": f"REG{number:06d}",
+        "phone_number": "080123456",
+        "email": "hospital@example.com",
+        "address": "1 Hospital Road",
+        "city": "Bengaluru",
+        "state": "Karnataka",
+        "pincode": "560001",
+        "latitude": "12.980000",
+        "longitude": "77.600000",
+        "specializations": "Cardiology, Emergency Medicine",
+    }
+    defaults.update(fields)
+    return Hospital.objects.create(**defaults)
+
+
+def make_ambulance(hospital, **fields):
+    """Create an available ambulance with a unique vehicle number"""
+    number = next(_sequence)
+    defaults = {
+        "hospital": hospital,
+        "vehicle_number": f"KA01AB{number:04d}",
+        "driver_name": "Driver",
+        "driver_phone": f"+9197{number:08d}",
+    }
+    defaults.update(fields)
+    return Ambulance.objects.create(**defaults)
+
+
+def api_client(user):
+    """API client authenticated as a user"""
+    client = APIClient()
+    client.force_authenticate(user)
+    return client
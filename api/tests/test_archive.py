@@ -0,0 +1,109 @@
+import io
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from db.models import ArchivedEmergency, ArchivedNotification, Emergency, Notification
+
+from .factories import api_client, make_hospital, make_user
+
+
+class ArchiveEmergenciesTests(TestCase):
+    def setUp(self):
+        self.patient = make_user()
+        self.hospital = make_hospital()
+        self.old_completed = self.make_emergency("COMPLETED", days_ago=120)
+        self.old_cancelled = self.make_emergency("CANCELLED", days_ago=100)
+        self.old_active = self.make_emergency("IN_PROGRESS", days_ago=110)
+        self.recent_completed = self.make_emergency("COMPLETED", days_ago=10)
+        self.notification = Notification.objects.create(
+            notification_type="EMERGENCY_ALERT",
+            recipient_type="HOSPITAL",
+            title="Alert",
+            message="Patient needs help",
+            hospital=self.hospital,
+            user=self.patient,
+            emergency=self.old_completed,
+        )
+
+    def make_emergency(self, status, days_ago):
+        emergency = Emergency.objects.create(
+            patient=self.patient,
+            description=f"{status} {days_ago} days ago",
+            status=status,
+            assigned_hospital=self.hospital,
+        )
+        created_at = timezone.now() - timezone.timedelta(days=days_ago)
+        Emergency.objects.filter(pk=emergency.pk).update(created_at=created_at)
+        emergency.refresh_from_db()
+        return emergency
+
+    def archive(self):
+        output = io.StringIO()
+        call_command("archive_emergencies", "--days", "90", stdout=output)
+        return output.getvalue()
+
+    def test_moves_closed_emergencies_past_the_cutoff(self):
+        output = self.archive()
+
+        self.assertIn("archived 2 emergencies and 1 notifications", output)
+        self.assertCountEqual(
+            ArchivedEmergency.objects.values_list("id", flat=True),
+            [self.old_completed.id, self.old_cancelled.id],
+        )
+        self.assertCountEqual(
+            Emergency.objects.values_list("id", flat=True),
+            [self.old_active.id, self.recent_completed.id],
+        )
+        archived = ArchivedNotification.objects.get()
+        self.assertEqual(archived.id, self.notification.id)
+        self.assertEqual(archived.data["title"], "Alert")
+        self.assertFalse(Notification.objects.exists())
+        self.assertEqual(
+            ArchivedEmergency.objects.get(pk=self.old_completed.pk).data["description"],
+            self.old_completed.description,
+        )
+
+    def test_rerunning_changes_nothing(self):
+        self.archive()
+        archived = list(ArchivedEmergency.objects.order_by("id").values())
+
+        output = self.archive()
+
+        self.assertIn("archived 0 emergencies and 0 notifications", output)
+        self.assertEqual(
+            list(ArchivedEmergency.objects.order_by("id").values()), archived
+        )
+        self.assertEqual(Emergency.objects.count(), 2)
+
+    def test_history_merges_live_and_archived_emergencies(self):
+        url = f"/api/users/{self.patient.id}/emergency-history/"
+        client = api_client(self.patient)
+        before = client.get(url).json()
+
+        self.archive()
+        after = client.get(url).json()
+
+        expected = [
+            self.recent_completed,
+            self.old_cancelled,
+            self.old_active,
+            self.old_completed,
+        ]
+        self.assertEqual([item["id"] for item in after], [str(e.id) for e in expected])
+        self.assertEqual(after, before)
+
+    def test_dashboard_counts_are_unchanged(self):
+        patient = api_client(self.patient)
+        staff = api_client(make_user(is_staff=True))
+        before = [client.get("/api/dashboard/").json() for client in (patient, staff)]
+
+        self.archive()
+
+        after = [client.get("/api/dashboard/").json() for client in (patient, staff)]
+        self.assertEqual(after, before)
+        self.assertEqual(after[0]["my_emergencies"], 4)
+        self.assertEqual(after[0]["completed_emergencies"], 2)
+        self.assertEqual(after[0]["unread_notifications"], 1)
+        self.assertEqual(after[1]["pending_notifications"], 1)
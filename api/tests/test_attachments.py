@@ -0,0 +1,203 @@
+import hashlib
+import os
+import shutil
+import tempfile
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+
+from db.models import AttachmentUpload, MedicalRecord
+
+from .factories import api_client, make_user
+
+
+def sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+class AttachmentTestCase(TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        settings_override = override_settings(
+            MEDIA_ROOT=os.path.join(directory, "media"),
+            ATTACHMENT_UPLOAD_DIR=os.path.join(directory, "uploads"),
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.patient = make_user()
+        self.client = api_client(self.patient)
+        self.record = MedicalRecord.objects.create(
+            patient=self.patient,
+            record_type="LAB_REPORT",
+            diagnosis="Anaemia",
+            treatment="Iron",
+            doctor_name="Dr Rao",
+        )
+        self.data = os.urandom(12)
+        self.chunks = [self.data[:4], self.data[4:8], self.data[8:]]
+
+    def start_upload(self, checksum=None, filename="report.pdf"):
+        response = self.client.post(
+            f"/api/medical-records/{self.record.id}/attachment-uploads/",
+            {
+                "filename": filename,
+                "size": len(self.data),
+                "checksum": sha256(self.data) if checksum is None else checksum,
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, 201)
+        return response.json()["id"]
+
+    def send_chunk(self, upload_id, offset, data, checksum=None):
+        return self.client.put(
+            f"/api/medical-records/{self.record.id}/attachment-uploads/{upload_id}/",
+            data,
+            content_type="application/octet-stream",
+            HTTP_UPLOAD_OFFSET=str(offset),
+            HTTP_UPLOAD_CHECKSUM=checksum or sha256(data),
+        )
+
+    def upload(self, **options):
+        upload_id = self.start_upload(**options)
+        for offset, chunk in zip((0, 4, 8), self.chunks):
+            response = self.send_chunk(upload_id, offset, chunk)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()["complete"])
+        return response
+
+    def download(self, **headers):
+        return self.client.get(
+            f"/api/medical-records/{self.record.id}/attachment/", **headers
+        )
+
+
+class ChunkedUploadTests(AttachmentTestCase):
+    def test_chunks_in_order_attach_the_file(self):
+        self.upload()
+
+        self.record.refresh_from_db()
+        with self.record.attachments.open("rb") as attachment:
+            self.assertEqual(attachment.read(), self.data)
+        self.assertFalse(AttachmentUpload.objects.exists())
+
+    def test_out_of_order_chunks_are_refused(self):
+        upload_id = self.start_upload()
+
+        response = self.send_chunk(upload_id, 4, self.chunks[1])
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()["received"], 0)
+
+    def test_a_repeated_chunk_is_refused(self):
+        upload_id = self.start_upload()
+        self.assertEqual(self.send_chunk(upload_id, 0, self.chunks[0]).status_code, 200)
+
+        response = self.send_chunk(upload_id, 0, self.chunks[0])
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()["received"], 4)
+
+    def test_chunk_checksum_mismatch_keeps_the_progress(self):
+        upload_id = self.start_upload()
+        self.send_chunk(upload_id, 0, self.chunks[0])
+
+        response = self.send_chunk(upload_id, 4, self.chunks[1], checksum="0" * 64)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["received"], 4)
+        # The client resends the same chunk
+        self.assertEqual(self.send_chunk(upload_id, 4, self.chunks[1]).status_code, 200)
+
+    def test_file_checksum_mismatch_discards_the_upload(self):
+        upload_id = self.start_upload(checksum="0" * 64)
+        self.send_chunk(upload_id, 0, self.chunks[0])
+        self.send_chunk(upload_id, 4, self.chunks[1])
+
+        response = self.send_chunk(upload_id, 8, self.chunks[2])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIsNone(response.json()["received"])
+        self.assertFalse(AttachmentUpload.objects.exists())
+        self.record.refresh_from_db()
+        self.assertFalse(self.record.attachments)
+
+    def test_a_gap_does_not_complete_the_upload(self):
+        upload_id = self.start_upload()
+        self.send_chunk(upload_id, 0, self.chunks[0])
+
+        # The last chunk would make up the size, but the middle one is missing
+        response = self.send_chunk(upload_id, 8, self.chunks[2])
+
+        self.assertEqual(response.status_code, 409)
+        progress = self.client.get(
+            f"/api/medical-records/{self.record.id}/attachment-uploads/{upload_id}/"
+        ).json()
+        self.assertEqual((progress["complete"], progress["received"]), (False, 4))
+        self.record.refresh_from_db()
+        self.assertFalse(self.record.attachments)
+
+
+class RangedDownloadTests(AttachmentTestCase):
+    def setUp(self):
+        super().setUp()
+        self.upload()
+
+    def assertPartial(self, response, start, end):
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(
+            response["Content-Range"], f"bytes {start}-{end}/{len(self.data)}"
+        )
+        self.assertEqual(
+            b"".join(response.streaming_content), self.data[start : end + 1]
+        )
+
+    def test_without_a_range_the_whole_file_is_sent(self):
+        response = self.download()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+        self.assertEqual(b"".join(response.streaming_content), self.data)
+
+    def test_single_range(self):
+        self.assertPartial(self.download(HTTP_RANGE="bytes=2-5"), 2, 5)
+        self.assertPartial(self.download(HTTP_RANGE="bytes=10-"), 10, 11)
+        self.assertPartial(self.download(HTTP_RANGE="bytes=6-100"), 6, 11)
+
+    def test_suffix_range(self):
+        self.assertPartial(self.download(HTTP_RANGE="bytes=-4"), 8, 11)
+        self.assertPartial(self.download(HTTP_RANGE="bytes=-100"), 0, 11)
+
+    def test_unsatisfiable_ranges(self):
+        for header in ("bytes=12-", "bytes=5-2", "bytes=-0"):
+            response = self.download(HTTP_RANGE=header)
+            self.assertEqual(response.status_code, 416, header)
+            self.assertEqual(response["Content-Range"], "bytes */12")
+
+
+class AttachmentFilenameTests(AttachmentTestCase):
+    def assertDownloadsAs(self, filename, **headers):
+        response = self.download(**headers)
+        self.assertIn(f'filename="{filename}"', response["Content-Disposition"])
+
+    def test_chunked_uploads_keep_the_uploaded_name(self):
+        self.upload(filename="Blood test.pdf")
+
+        self.record.refresh_from_db()
+        self.assertNotIn("Blood test", self.record.attachments.name)
+        self.assertEqual(self.record.attachment_filename, "Blood test.pdf")
+        self.assertDownloadsAs("Blood test.pdf")
+        self.assertDownloadsAs("Blood test.pdf", HTTP_RANGE="bytes=0-1")
+
+    def test_form_uploads_keep_the_uploaded_name(self):
+        response = self.client.patch(
+            f"/api/medical-records/{self.record.id}/",
+            {"attachments": SimpleUploadedFile("x-ray scan.png", self.data)},
+            format="multipart",
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["attachment_filename"], "x-ray scan.png")
+        self.assertDownloadsAs("x-ray scan.png")
@@ -0,0 +1,114 @@
+from django.test import TestCase
+
+from api.autocomplete import HospitalAutocompleteIndex, normalize
+
+from .factories import api_client, make_hospital, make_user
+
+
+class HospitalAutocompleteIndexTests(TestCase):
+    def setUp(self):
+        # A fresh index per test, loaded from this test's rows
+        self.index = HospitalAutocompleteIndex()
+
+    def suggested(self, prefix, **options):
+        return [
+            (suggestion["id"], suggestion["matched"])
+            for suggestion in self.index.suggest(prefix, **options)
+        ]
+
+    def test_normalize_strips_accents_case_and_punctuation(self):
+        self.assertEqual(normalize("  Sté.-Marie's  HOSPITAL "), "ste marie s hospital")
+
+    def test_name_matches_rank_above_word_and_city_matches(self):
+        by_city = make_hospital(name="General Hospital", city="Apollo Bunder")
+        by_word = make_hospital(name="Indraprastha Apollo Hospital")
+        by_name = make_hospital(name="Apollo Clinic")
+
+        self.assertEqual(
+            self.suggested("apo"),
+            [(by_name.id, "name"), (by_word.id, "word"), (by_city.id, "city")],
+        )
+        self.assertEqual(self.suggested("apollo hos"), [(by_word.id, "word")])
+        self.assertEqual(self.suggested("apo", limit=2)[-1], (by_word.id, "word"))
+
+    def test_a_hospital_is_suggested_once(self):
+        hospital = make_hospital(name="Delhi Heart Institute", city="New Delhi")
+
+        self.assertEqual(self.suggested("delhi"), [(hospital.id, "name")])
+
+    def test_inactive_hospitals_are_not_loaded(self):
+        make_hospital(name="Closed Clinic", is_active=False)
+
+        self.assertEqual(self.suggested("closed"), [])
+
+    def test_sync_and_discard_update_a_loaded_index(self):
+        hospital = make_hospital(name="Fortis Hospital")
+        self.assertEqual(self.suggested("fortis"), [(hospital.id, "name")])
+
+        hospital.name = "Manipal Hospital"
+        self.index.sync(hospital)
+        self.assertEqual(self.suggested("fortis"), [])
+        self.assertEqual(self.suggested("manipal"), [(hospital.id, "name")])
+
+        hospital.is_active = False
+        self.index.sync(hospital)
+        self.assertEqual(self.suggested("manipal"), [])
+
+        hospital.is_active = True
+        self.index.sync(hospital)
+        self.index.discard(hospital.id)
+        self.assertEqual(self.suggested("manipal"), [])
+
+    def test_changes_during_a_reload_are_replayed_on_its_result(self):
+        stale = make_hospital(name="Fortis Hospital")
+        added = make_hospital(name="Narayana Health", is_active=False)
+        self.index.suggest("fortis")
+        build = self.index._build
+
+        def build_then_change():
+            # Stands in for another thread saving hospitals while the
+            # reload reads the database
+            data = build()
+            self.index.discard(stale.id)
+            added.is_active = True
+            self.index.sync(added)
+            return data
+
+        self.index._build = build_then_change
+        self.index.reload()
+
+        self.assertEqual(self.suggested("fortis"), [])
+        self.assertEqual(self.suggested("narayana"), [(added.id, "name")])
+
+    def test_invalidate_during_a_reload_leaves_the_index_stale(self):
+        self.index.suggest("any")
+        build = self.index._build
+
+        def build_then_invalidate():
+            data = build()
+            self.index.invalidate()
+            return data
+
+        self.index._build = build_then_invalidate
+        self.index.reload()
+
+        self.assertTrue(self.index._stale())
+
+
+class HospitalAutocompleteAPITests(TestCase):
+    def test_suggests_hospitals_for_a_prefix(self):
+        hospital = make_hospital(name="Zyphra Care Hospital", city="Mysuru")
+
+        response = api_client(make_user()).get(
+            "/api/hospitals/autocomplete/", {"q": "zyph"}
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["count"], 1)
+        self.assertEqual(response.data["results"][0]["id"], hospital.id)
+        self.assertEqual(response.data["results"][0]["matched"], "name")
+
+    def test_rejects_a_missing_prefix(self):
+        response = api_client(make_user()).get("/api/hospitals/autocomplete/")
+
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,57 @@
+from django.test import TestCase
+
+from db.models import EmergencyCard, Emergency, Notification
+
+from .factories import api_client, make_hospital, make_user
+
+
+class EmergencyCardAccessTests(TestCase):
+    def setUp(self):
+        self.hospital = make_hospital()
+        self.patient = make_user(medical_conditions="Diabetes")
+        self.emergency = Emergency.objects.create(
+            patient=self.patient,
+            description="Chest pain",
+            assigned_hospital=self.hospital,
+        )
+        Notification.objects.create(
+            notification_type="EMERGENCY_ALERT",
+            recipient_type="HOSPITAL",
+            title="Alert",
+            message="Patient needs help",
+            hospital=self.hospital,
+            emergency=self.emergency,
+        )
+
+    def test_hospital_endpoints_are_closed_to_other_users(self):
+        other = api_client(make_user())
+        for path in ("emergencies", "feed"):
+            with self.subTest(path=path):
+                response = other.get(f"/api/hospitals/{self.hospital.id}/{path}/")
+                self.assertEqual(response.status_code, 403)
+
+    def test_staff_see_the_patient_card(self):
+        staff = api_client(make_user(is_staff=True))
+        response = staff.get(f"/api/hospitals/{self.hospital.id}/emergencies/")
+        self.assertEqual(response.status_code, 200)
+        card = response.json()[0]["emergency_card"]
+        self.assertEqual(card["patient"]["id"], str(self.patient.id))
+
+        feed = staff.get(f"/api/hospitals/{self.hospital.id}/feed/").json()
+        self.assertIsNotNone(feed["notifications"][0]["emergency_card"])
+
+    def test_patients_do_not_see_cards_on_their_own_emergencies(self):
+        response = api_client(self.patient).get(
+            f"/api/emergencies/{self.emergency.id}/"
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("emergency_card", response.json())
+
+    def test_cards_are_built_for_patients_only(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            patient = make_user(medical_conditions="Asthma")
+            staff = make_user(is_staff=True)
+            driver = make_user(is_elderly=False)
+        self.assertTrue(EmergencyCard.objects.filter(patient=patient).exists())
+        self.assertFalse(EmergencyCard.objects.filter(patient=staff).exists())
+        self.assertFalse(EmergencyCard.objects.filter(patient=driver).exists())
@@ -0,0 +1,98 @@
+import importlib
+
+from django.apps import apps
+from django.test import TestCase
+from django.utils import timezone
+
+from api.utils import find_nearby_hospitals
+from db.models import AmbulanceLocationSegment, Hospital
+from db.models.base import to_microdegrees
+
+from .factories import make_ambulance, make_hospital
+
+backfill_migration = importlib.import_module(
+    "db.migrations.0006_microdegree_coordinates"
+)
+
+
+class MicrodegreeEncodingTests(TestCase):
+    def test_half_way_values_round_to_even(self):
+        self.assertEqual(to_microdegrees("12.3456785"), 12_345_678)
+        self.assertEqual(to_microdegrees("12.3456795"), 12_345_680)
+        self.assertEqual(to_microdegrees("-0.0000005"), 0)
+        self.assertIsNone(to_microdegrees(None))
+
+    def test_history_segments_use_the_same_encoding(self):
+        # round(float * 1e6) gives 1000001 and 1004001 for these
+        start = timezone.now()
+        points = [
+            (start, 1.0000005, 1.0020005),
+            (start + timezone.timedelta(seconds=1), 1.0040005, -77.0000015),
+        ]
+
+        segment = AmbulanceLocationSegment.from_points(None, points)
+
+        self.assertEqual(segment.last_latitude_e6, to_microdegrees(points[1][1]))
+        self.assertEqual(segment.last_longitude_e6, to_microdegrees(points[1][2]))
+        self.assertEqual(
+            [point[1:] for point in segment.get_points()],
+            [(1.0, 1.002), (1.004, -77.000002)],
+        )
+
+    def test_migration_backfills_every_coordinate_column(self):
+        hospital = make_hospital(latitude="12.34567850", longitude="77.00000050")
+        ambulance = make_ambulance(
+            hospital, current_latitude="12.97000000", current_longitude="77.59000000"
+        )
+        ambulance_no_fix = make_ambulance(hospital)
+        # As the rows were before the columns existed
+        Hospital.objects.update(latitude_e6=None, longitude_e6=None)
+        type(ambulance).objects.update(
+            current_latitude_e6=None, current_longitude_e6=None
+        )
+
+        backfill_migration.backfill_microdegrees(apps, None)
+
+        hospital.refresh_from_db()
+        ambulance.refresh_from_db()
+        ambulance_no_fix.refresh_from_db()
+        self.assertEqual(
+            (hospital.latitude_e6, hospital.longitude_e6), (12_345_678, 77_000_000)
+        )
+        self.assertEqual(
+            (ambulance.current_latitude_e6, ambulance.current_longitude_e6),
+            (12_970_000, 77_590_000),
+        )
+        self.assertIsNone(ambulance_no_fix.current_latitude_e6)
+
+
+class NearbyHospitalsBoundingBoxTests(TestCase):
+    def nearby_ids(self, latitude, longitude, radius_km):
+        return {
+            hospital.id
+            for hospital in find_nearby_hospitals(latitude, longitude, radius_km)
+        }
+
+    def test_keeps_hospitals_within_the_radius_only(self):
+        # About 5.6 km and 11.1 km north of the patient
+        near = make_hospital(latitude="13.02000000", longitude="77.59000000")
+        far = make_hospital(latitude="13.07000000", longitude="77.59000000")
+
+        self.assertEqual(self.nearby_ids(12.97, 77.59, 10), {near.id})
+        self.assertEqual(self.nearby_ids(12.97, 77.59, 12), {near.id, far.id})
+
+    def test_longitude_span_widens_with_latitude(self):
+        # 0.3 degrees of longitude is about 10 km at 72 degrees north but
+        # about 33 km at the equator
+        northern = make_hospital(latitude="72.00000000", longitude="25.30000000")
+        make_hospital(latitude="0.00000000", longitude="25.30000000")
+
+        self.assertEqual(self.nearby_ids(72.0, 25.0, 12), {northern.id})
+        self.assertEqual(self.nearby_ids(0.0, 25.0, 12), set())
+
+    def test_box_wraps_around_the_antimeridian(self):
+        east = make_hospital(latitude="-17.00000000", longitude="179.99000000")
+        west = make_hospital(latitude="-17.00000000", longitude="-179.99000000")
+
+        self.assertEqual(self.nearby_ids(-17.0, 179.995, 5), {east.id, west.id})
+        self.assertEqual(self.nearby_ids(-17.0, -179.995, 5), {east.id, west.id})
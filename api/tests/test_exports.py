@@ -0,0 +1,120 @@
+import csv
+import gzip
+import io
+import json
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from api.exports import EMERGENCY_EXPORT_COLUMNS
+from db.models import Emergency, Notification
+
+from .factories import api_client, make_hospital, make_user
+
+
+class StreamingExportTests(TestCase):
+    def setUp(self):
+        self.staff = api_client(make_user(is_staff=True))
+        self.patient = make_user(first_name="Meera")
+        hospital = make_hospital()
+        self.chest_pain = Emergency.objects.create(
+            patient=self.patient, description="Chest pain", priority="HIGH"
+        )
+        self.fall = Emergency.objects.create(
+            patient=self.patient, description="Fall at home", priority="LOW"
+        )
+        self.archived = Emergency.objects.create(
+            patient=self.patient,
+            description="Chest pain last winter",
+            priority="HIGH",
+            status="COMPLETED",
+            assigned_hospital=hospital,
+        )
+        Emergency.objects.filter(pk=self.archived.pk).update(
+            created_at=timezone.now() - timezone.timedelta(days=200)
+        )
+        self.alert = Notification.objects.create(
+            notification_type="EMERGENCY_ALERT",
+            recipient_type="HOSPITAL",
+            title="Alert",
+            message="Patient needs help",
+            hospital=hospital,
+            emergency=self.archived,
+        )
+        call_command("archive_emergencies", "--days", "90", stdout=io.StringIO())
+
+    def export(self, path="/api/emergencies/export/", client=None, **params):
+        return (client or self.staff).get(path, params)
+
+    def content(self, response):
+        return b"".join(response.streaming_content)
+
+    def ndjson_ids(self, data):
+        return [json.loads(line)["id"] for line in data.decode().splitlines()]
+
+    def test_gzipped_ndjson_is_the_default(self):
+        response = self.export()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "application/gzip")
+        self.assertIn(
+            'filename="emergencies.ndjson.gz"', response["Content-Disposition"]
+        )
+        ids = self.ndjson_ids(gzip.decompress(self.content(response)))
+        self.assertCountEqual(ids[:2], [str(self.chest_pain.id), str(self.fall.id)])
+        # Archived rows follow the live ones
+        self.assertEqual(ids[2:], [str(self.archived.id)])
+
+    def test_uncompressed_csv(self):
+        response = self.export(file_format="csv", compress="false")
+
+        self.assertEqual(response["Content-Type"], "text/csv")
+        rows = list(csv.reader(io.StringIO(self.content(response).decode())))
+        self.assertEqual(rows[0], EMERGENCY_EXPORT_COLUMNS)
+        by_id = {row[0]: dict(zip(rows[0], row)) for row in rows[1:]}
+        self.assertEqual(by_id[str(self.fall.id)]["description"], "Fall at home")
+        self.assertEqual(by_id[str(self.archived.id)]["status"], "COMPLETED")
+        self.assertEqual(len(by_id), 3)
+
+    def test_format_is_taken_by_the_renderer_override(self):
+        # DRF reads ?format= as URL_FORMAT_OVERRIDE; exports use file_format
+        self.assertEqual(self.export(format="csv").status_code, 404)
+
+    def test_list_filters_and_search_apply_to_live_and_archived_rows(self):
+        response = self.export(compress="false", priority="HIGH")
+        self.assertCountEqual(
+            self.ndjson_ids(self.content(response)),
+            [str(self.chest_pain.id), str(self.archived.id)],
+        )
+
+        response = self.export(compress="false", search="chest winter")
+        self.assertEqual(
+            self.ndjson_ids(self.content(response)), [str(self.archived.id)]
+        )
+
+    def test_period_parameters(self):
+        month = timezone.localtime(self.fall.created_at).strftime("%Y-%m")
+
+        response = self.export(compress="false", month=month)
+
+        self.assertIn(
+            f'filename="emergencies-{month}.ndjson"', response["Content-Disposition"]
+        )
+        self.assertCountEqual(
+            self.ndjson_ids(self.content(response)),
+            [str(self.chest_pain.id), str(self.fall.id)],
+        )
+        self.assertEqual(self.export(month="2026-13").status_code, 400)
+
+    def test_archived_notifications_are_exported(self):
+        response = self.export(
+            "/api/notifications/export/", compress="false", status="PENDING"
+        )
+
+        self.assertEqual(self.ndjson_ids(self.content(response)), [str(self.alert.id)])
+
+    def test_only_staff_can_export(self):
+        response = self.export(client=api_client(self.patient))
+
+        self.assertEqual(response.status_code, 403)
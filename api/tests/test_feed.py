@@ -0,0 +1,180 @@
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from django.test import TestCase
+from django.utils import timezone
+
+from api.feed import NO_ID, format_feed_cursor, parse_feed_cursor
+from db.models import Emergency, Notification
+
+from .factories import api_client, make_ambulance, make_hospital, make_user
+
+
+class HospitalFeedCursorTests(TestCase):
+    def setUp(self):
+        self.hospital = make_hospital()
+        self.client = api_client(make_user(is_staff=True))
+        patient = make_user()
+        self.emergency = Emergency.objects.create(
+            patient=patient, description="Fall", assigned_hospital=self.hospital
+        )
+        self.notifications = Notification.objects.bulk_create(
+            Notification(
+                notification_type="EMERGENCY_ALERT",
+                recipient_type="HOSPITAL",
+                title=f"Alert {number}",
+                message="Patient needs help",
+                hospital=self.hospital,
+                emergency=self.emergency,
+            )
+            for number in range(7)
+        )
+        # Everything changed in the same instant
+        self.instant = timezone.now()
+        Notification.objects.filter(hospital=self.hospital).update(
+            updated_at=self.instant
+        )
+        Emergency.objects.filter(pk=self.emergency.pk).update(updated_at=self.instant)
+
+    def get_feed(self, **params):
+        response = self.client.get(f"/api/hospitals/{self.hospital.id}/feed/", params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_pages_through_items_sharing_a_timestamp(self):
+        cursor = format_feed_cursor(
+            (self.instant - timezone.timedelta(seconds=1), NO_ID)
+        )
+        seen = set()
+        for _ in range(10):
+            page = self.get_feed(since=cursor, limit=3)
+            seen.update(item["id"] for item in page["notifications"])
+            seen.update(item["id"] for item in page["emergencies"])
+            cursor = page["cursor"]
+            if not page["has_more"]:
+                break
+
+        expected = {str(item.id) for item in self.notifications}
+        expected.add(str(self.emergency.id))
+        self.assertEqual(seen, expected)
+
+        with self.settings(HOSPITAL_FEED_OVERLAP=0):
+            page = self.get_feed(since=cursor)
+        self.assertEqual(page["notifications"], [])
+        self.assertEqual(page["emergencies"], [])
+        self.assertEqual(page["cursor"], cursor)
+
+    def test_repeats_items_changed_just_before_the_cursor(self):
+        page = self.get_feed(since=self.instant.isoformat())
+        cursor = page["cursor"]
+        # A transaction that stamped its row before the cursor was handed
+        # out but committed after it
+        late = self.notifications[0]
+        Notification.objects.filter(pk=late.pk).update(
+            status="SENT", updated_at=self.instant - timezone.timedelta(seconds=1)
+        )
+
+        page = self.get_feed(since=cursor)
+        self.assertEqual(page["cursor"], cursor)
+        repeated = {item["id"]: item for item in page["notifications"]}
+        self.assertEqual(repeated[str(late.id)]["status"], "SENT")
+
+        with self.settings(HOSPITAL_FEED_OVERLAP=0.5):
+            page = self.get_feed(since=cursor)
+        self.assertNotIn(str(late.id), [item["id"] for item in page["notifications"]])
+
+    def test_repeated_items_do_not_end_a_long_poll_early(self):
+        cursor = self.get_feed(since=self.instant.isoformat())["cursor"]
+
+        with self.settings(HOSPITAL_FEED_POLL_INTERVAL=0.05):
+            started = time.monotonic()
+            page = self.get_feed(since=cursor, wait=1)
+
+        self.assertGreaterEqual(time.monotonic() - started, 1)
+        self.assertEqual(len(page["notifications"]), 7)
+        self.assertEqual(page["cursor"], cursor)
+
+    def test_timestamp_cursor_resumes_at_its_instant(self):
+        page = self.get_feed(since=self.instant.isoformat())
+        self.assertEqual(len(page["notifications"]), 7)
+        self.assertEqual(len(page["emergencies"]), 1)
+
+    def test_parse_feed_cursor(self):
+        item_id = self.emergency.id
+        self.assertEqual(
+            parse_feed_cursor(format_feed_cursor((self.instant, item_id))),
+            (self.instant, item_id),
+        )
+        self.assertEqual(
+            parse_feed_cursor("2026-01-01T00:00:00"),
+            (datetime(2026, 1, 1, tzinfo=dt_timezone.utc), NO_ID),
+        )
+        self.assertIsNone(parse_feed_cursor("2026-01-01T00:00:00~not-an-id"))
+        self.assertIsNone(parse_feed_cursor("garbage"))
+        self.assertIsNone(parse_feed_cursor(None))
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get(
+            f"/api/hospitals/{self.hospital.id}/feed/", {"since": "garbage"}
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+class HospitalFeedBulkUpdateTests(TestCase):
+    def setUp(self):
+        self.hospital = make_hospital()
+        self.client = api_client(make_user(is_staff=True))
+        self.emergency = Emergency.objects.create(
+            patient=make_user(), description="Fall", assigned_hospital=self.hospital
+        )
+        self.notification = Notification.objects.create(
+            notification_type="EMERGENCY_ALERT",
+            recipient_type="HOSPITAL",
+            title="Alert",
+            message="Patient needs help",
+            hospital=self.hospital,
+            emergency=self.emergency,
+        )
+
+    def get_feed(self, **params):
+        response = self.client.get(f"/api/hospitals/{self.hospital.id}/feed/", params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_mark_all_read_appears_after_the_cursor(self):
+        cursor = self.get_feed()["cursor"]
+
+        response = self.client.post("/api/notifications/mark-all-read/")
+        self.assertEqual(response.status_code, 200)
+
+        page = self.get_feed(since=cursor)
+        self.assertEqual(
+            [item["id"] for item in page["notifications"]],
+            [str(self.notification.id)],
+        )
+        self.assertEqual(page["notifications"][0]["status"], "READ")
+
+    def test_recomputed_eta_appears_after_the_cursor(self):
+        self.emergency.status = "DISPATCHED"
+        self.emergency.location_latitude = "12.990000"
+        self.emergency.location_longitude = "77.610000"
+        self.emergency.save()
+        ambulance = make_ambulance(self.hospital, current_emergency=self.emergency)
+        cursor = self.get_feed()["cursor"]
+
+        response = self.client.post(
+            "/api/ambulances/bulk-location/",
+            {
+                "fixes": [
+                    [ambulance.vehicle_number, 12.95, 77.58, timezone.now().isoformat()]
+                ]
+            },
+            format="json",
+        )
+        self.assertEqual(response.json()["accepted"], 1)
+
+        page = self.get_feed(since=cursor)
+        self.assertEqual(
+            [item["id"] for item in page["emergencies"]], [str(self.emergency.id)]
+        )
+        self.assertIsNotNone(page["emergencies"][0]["estimated_arrival_time"])
@@ -0,0 +1,108 @@
+import io
+import json
+
+from django.test import TestCase
+
+from api.imports import import_hospitals
+from db.models import Hospital
+
+from .factories import api_client, make_user
+
+CSV_HEADER = (
+    b"name,registration_number,phone_number,email,address,city,state,pincode,"
+    b"latitude,longitude,specializations\n"
+)
+
+
+def csv_row(registration_number, name="City Hospital"):
+    return (
+        f"{name},{registration_number},080123456,info@example.com,1 Main Road,"
+        f"Bengaluru,Karnataka,560001,12.97,77.59,Cardiology\n"
+    ).encode()
+
+
+def ndjson_row(registration_number, **fields):
+    row = {
+        "name": "City Hospital",
+        "registration_number": registration_number,
+        "phone_number": "080123456",
+        "email": "info@example.com",
+        "address": "1 Main Road",
+        "city": "Bengaluru",
+        "state": "Karnataka",
+        "pincode": "560001",
+        "latitude": "12.97",
+        "longitude": "77.59",
+        "specializations": "Cardiology",
+    }
+    row.update(fields)
+    return json.dumps(row).encode() + b"\n"
+
+
+class HospitalImportErrorTests(TestCase):
+    def run_import(self, data, file_format="csv"):
+        return import_hospitals(io.BytesIO(data), file_format).as_dict()
+
+    def test_bad_csv_lines_are_row_errors(self):
+        report = self.run_import(
+            CSV_HEADER
+            + csv_row("IMP001")
+            + b"\xff\xfe not utf-8,line\n"
+            + b"carriage\rreturn,inside\n"
+            + csv_row("IMP002")
+        )
+        self.assertEqual(report["processed"], 4)
+        self.assertEqual(report["created"], 2)
+        self.assertEqual(report["failed"], 2)
+        messages = [
+            error["errors"]["non_field_errors"][0] for error in report["errors"]
+        ]
+        self.assertTrue(messages[0].startswith("Invalid UTF-8"), messages)
+        self.assertTrue(messages[1].startswith("Malformed CSV"), messages)
+        self.assertEqual([error["line"] for error in report["errors"]], [3, 4])
+
+    def test_bad_ndjson_lines_and_invalid_rows_are_row_errors(self):
+        report = self.run_import(
+            ndjson_row("IMP010")
+            + b"{not json\n"
+            + b"[1, 2]\n"
+            + ndjson_row("IMP011", latitude="north"),
+            "ndjson",
+        )
+        self.assertEqual(report["processed"], 4)
+        self.assertEqual(report["created"], 1)
+        self.assertEqual(report["failed"], 3)
+        self.assertEqual(report["errors"][2]["registration_number"], "IMP011")
+        self.assertIn("latitude", report["errors"][2]["errors"])
+
+    def test_duplicates_and_updates_add_up_to_processed(self):
+        self.run_import(CSV_HEADER + csv_row("IMP020"))
+        report = self.run_import(
+            CSV_HEADER
+            + csv_row("IMP020", name="Renamed")
+            + csv_row("IMP021")
+            + csv_row("IMP021", name="Later row wins")
+        )
+        self.assertEqual(
+            (report["created"], report["updated"], report["duplicates"]), (1, 1, 1)
+        )
+        self.assertEqual(
+            report["created"]
+            + report["updated"]
+            + report["duplicates"]
+            + report["failed"],
+            report["processed"],
+        )
+        self.assertEqual(
+            Hospital.objects.get(registration_number="IMP020").name, "Renamed"
+        )
+        self.assertEqual(
+            Hospital.objects.get(registration_number="IMP021").name, "Later row wins"
+        )
+
+    def test_endpoint_rejects_other_content_types(self):
+        staff = api_client(make_user(is_staff=True))
+        response = staff.post(
+            "/api/hospitals/import/", b"{}", content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 415)
@@ -0,0 +1,89 @@
+from unittest import mock
+
+from django.db.models import QuerySet
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from api.utils import coalesce_status_update
+from db.models import Emergency, Notification
+
+from .factories import make_user
+
+
+@override_settings(STATUS_UPDATE_COALESCE_WINDOW=60)
+class StatusUpdateCoalescingTests(TestCase):
+    def setUp(self):
+        self.patient = make_user()
+        self.emergency = Emergency.objects.create(
+            patient=self.patient, description="Fall"
+        )
+
+    def coalesce(self, message, **recipient):
+        recipient = recipient or {"recipient_type": "USER", "user": self.patient}
+        return coalesce_status_update(
+            self.emergency, "Emergency Status Update", message, **recipient
+        )
+
+    def status_updates(self):
+        return Notification.objects.filter(notification_type="STATUS_UPDATE")
+
+    def test_pending_updates_in_the_window_are_merged(self):
+        first = self.coalesce("Dispatched")
+        second = self.coalesce("Ambulance on the way")
+
+        self.assertEqual(second.pk, first.pk)
+        self.assertEqual(self.status_updates().count(), 1)
+        first.refresh_from_db()
+        self.assertEqual(first.message, "Ambulance on the way")
+
+    def test_updates_outside_the_window_are_not_merged(self):
+        first = self.coalesce("Dispatched")
+        Notification.objects.filter(pk=first.pk).update(
+            created_at=timezone.now() - timezone.timedelta(seconds=61)
+        )
+
+        second = self.coalesce("Ambulance on the way")
+
+        self.assertNotEqual(second.pk, first.pk)
+        first.refresh_from_db()
+        self.assertEqual(first.message, "Dispatched")
+
+    def test_sent_updates_are_not_merged(self):
+        first = self.coalesce("Dispatched")
+        Notification.objects.filter(pk=first.pk).update(status="SENT")
+
+        second = self.coalesce("Ambulance on the way")
+
+        self.assertNotEqual(second.pk, first.pk)
+        self.assertEqual(self.status_updates().filter(status="PENDING").count(), 1)
+
+    def test_each_recipient_keeps_its_own_update(self):
+        self.coalesce("Dispatched")
+        self.coalesce(
+            "Dispatched",
+            recipient_type="EMERGENCY_CONTACT",
+            emergency_contact_name="Contact",
+            emergency_contact_phone="+15550001111",
+        )
+        self.assertEqual(self.status_updates().count(), 2)
+
+    def test_update_sent_while_merging_is_not_overwritten(self):
+        first = self.coalesce("Dispatched")
+        original_first = QuerySet.first
+
+        def first_then_deliver(queryset):
+            # The delivery worker sends the row right after it is read
+            notification = original_first(queryset)
+            if notification is not None:
+                Notification.objects.filter(pk=notification.pk).update(status="SENT")
+            return notification
+
+        with mock.patch.object(QuerySet, "first", first_then_deliver):
+            second = self.coalesce("Ambulance on the way")
+
+        self.assertNotEqual(second.pk, first.pk)
+        first.refresh_from_db()
+        self.assertEqual(first.message, "Dispatched")
+        second.refresh_from_db()
+        self.assertEqual(second.status, "PENDING")
+        self.assertEqual(second.message, "Ambulance on the way")
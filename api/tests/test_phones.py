@@ -0,0 +1,100 @@
+from unittest import mock
+
+from django.core.exceptions import ValidationError
+from django.test import TestCase
+
+from db.models import EmergencyContact, User
+
+from .factories import api_client, make_user
+
+
+class PhoneUniquenessTests(TestCase):
+    def setUp(self):
+        self.owner = make_user(phone_number="+919812345678")
+        self.other = make_user()
+
+    def test_registration_rejects_another_format_of_a_taken_number(self):
+        response = self.client.post(
+            "/api/auth/register/",
+            {
+                "username": "newpatient",
+                "email": "new@example.com",
+                "password": "pass12345",
+                "password_confirm": "pass12345",
+                "first_name": "New",
+                "last_name": "Patient",
+                "phone_number": "0091 9812345678",
+                "address": "2 Test Street",
+                "emergency_contact_name": "Contact",
+                "emergency_contact_phone": "+15550002222",
+            },
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("phone_number", response.json())
+        self.assertFalse(User.objects.filter(username="newpatient").exists())
+
+    def test_profile_update_rejects_a_taken_number(self):
+        response = api_client(self.other).patch(
+            "/api/users/update-profile/",
+            {"phone_number": "+91 98123-45678"},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("phone_number", response.json())
+
+    def test_race_past_the_serializer_check_is_a_400(self):
+        # A concurrent request claimed the number after validation ran
+        with mock.patch(
+            "api.serializers.validate_unique_phone", lambda value, instance=None: value
+        ):
+            response = api_client(self.other).patch(
+                "/api/users/update-profile/",
+                {"phone_number": "0091 9812345678"},
+                format="json",
+            )
+        self.assertEqual(response.status_code, 400)
+        self.other.refresh_from_db()
+        self.assertNotEqual(self.other.phone_e164, self.owner.phone_e164)
+
+    def test_save_with_update_fields_checks_the_normalized_number(self):
+        self.other.phone_number = "09812345678"
+        with self.assertRaises(ValidationError) as raised:
+            self.other.save(update_fields=["phone_number"])
+        self.assertEqual(
+            raised.exception.message_dict,
+            {"phone_number": ["A user with this phone number already exists."]},
+        )
+
+    def test_duplicate_message_names_the_model(self):
+        EmergencyContact.objects.create(
+            patient=self.owner,
+            name="Asha",
+            relationship="SIBLING",
+            phone_number="9812300000",
+        )
+        contact = EmergencyContact(
+            patient=self.other,
+            name="Ravi",
+            relationship="CHILD",
+            phone_number="09812300000",
+        )
+        # Contacts may share numbers; check the message as if they could not
+        field = EmergencyContact._meta.get_field("phone_e164")
+        with mock.patch.object(field, "unique", True):
+            with self.assertRaises(ValidationError) as raised:
+                contact.save()
+        self.assertEqual(
+            raised.exception.message_dict,
+            {
+                "phone_number": [
+                    "An emergency contact with this phone number already exists."
+                ]
+            },
+        )
+
+    def test_saving_the_own_number_again_is_allowed(self):
+        self.owner.phone_number = "+91 98123 45678"
+        self.owner.save(update_fields=["phone_number"])
+        self.owner.refresh_from_db()
+        self.assertEqual(self.owner.phone_e164, "+919812345678")
@@ -0,0 +1,41 @@
+import io
+
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+
+from api.management.commands.check_query_plans import full_scans
+
+
+class QueryPlanTests(TestCase):
+    def test_hot_path_queries_use_indexes(self):
+        output = io.StringIO()
+        try:
+            call_command("check_query_plans", stdout=output)
+        except CommandError as error:
+            self.fail(f"{error}\n{output.getvalue()}")
+
+    def test_full_scans_are_detected(self):
+        plan = (
+            "2 0 0 SCAN db_emergency\n"
+            "5 0 0 SEARCH db_notification USING INDEX notif_user_status (user_id=?)\n"
+            "9 0 0 SCAN db_hospital USING INDEX hospital_active\n"
+            "12 0 0 SCAN CONSTANT ROW"
+        )
+        self.assertEqual(
+            full_scans(plan),
+            [
+                "2 0 0 SCAN db_emergency",
+                "9 0 0 SCAN db_hospital USING INDEX hospital_active",
+            ],
+        )
+
+    def test_ordered_index_scans_need_the_index_order(self):
+        plan = "5 0 0 SCAN db_emergency USING INDEX emergency_created"
+        self.assertEqual(full_scans(plan, ordered_scan=True), [])
+
+        sorted_plan = f"{plan}\n9 0 0 USE TEMP B-TREE FOR ORDER BY"
+        self.assertEqual(full_scans(sorted_plan, ordered_scan=True), [plan])
+        self.assertEqual(
+            full_scans("5 0 0 SCAN db_emergency", ordered_scan=True),
+            ["5 0 0 SCAN db_emergency"],
+        )
@@ -0,0 +1,121 @@
+from unittest import mock
+
+from django.test import TestCase
+
+from api.registry import AmbulanceRegistry
+from db.models import Emergency
+
+from .factories import api_client, make_ambulance, make_hospital, make_user
+
+
+class AmbulanceRegistryTests(TestCase):
+    def setUp(self):
+        self.hospital = make_hospital()
+        # A fresh registry per test, loaded from this test's rows
+        self.registry = AmbulanceRegistry(cell_size=0.05)
+
+    def place(self, latitude, longitude, **fields):
+        return make_ambulance(
+            self.hospital,
+            current_latitude=latitude,
+            current_longitude=longitude,
+            **fields,
+        )
+
+    def nearest_ids(self, latitude, longitude, **options):
+        return [
+            item["id"] for item in self.registry.nearest(latitude, longitude, **options)
+        ]
+
+    def test_nearest_are_ordered_by_distance(self):
+        far = self.place("13.500000", "77.590000")
+        near = self.place("12.980000", "77.600000")
+        middle = self.place("13.100000", "77.590000")
+
+        self.assertEqual(self.nearest_ids(12.97, 77.59), [near.id, middle.id, far.id])
+        self.assertEqual(self.nearest_ids(12.97, 77.59, count=2), [near.id, middle.id])
+        [first] = self.registry.nearest(12.97, 77.59, count=1)
+        self.assertAlmostEqual(first["distance_km"], 1.5, delta=0.1)
+
+    def test_ventilator_filter(self):
+        self.place("12.980000", "77.600000")
+        equipped = self.place("13.200000", "77.590000", has_ventilator=True)
+
+        self.assertEqual(self.nearest_ids(12.97, 77.59, ventilator=True), [equipped.id])
+
+    def test_status_changes_remove_and_reinsert_ambulances(self):
+        ambulance = self.place("12.980000", "77.600000")
+        self.assertEqual(self.nearest_ids(12.97, 77.59), [ambulance.id])
+
+        ambulance.status = "DISPATCHED"
+        self.registry.sync(ambulance)
+        self.assertEqual(self.nearest_ids(12.97, 77.59), [])
+
+        ambulance.status = "AVAILABLE"
+        self.registry.sync(ambulance)
+        self.assertEqual(self.nearest_ids(12.97, 77.59), [ambulance.id])
+
+        self.registry.discard(ambulance.id)
+        self.assertEqual(self.nearest_ids(12.97, 77.59), [])
+
+    def test_moves_update_positions(self):
+        moving = self.place("13.500000", "77.590000")
+        parked = self.place("13.000000", "77.590000")
+
+        self.registry.nearest(12.97, 77.59)
+        self.registry.move({moving.id: (12.97, 77.59)})
+
+        self.assertEqual(self.nearest_ids(12.97, 77.59), [moving.id, parked.id])
+
+    def test_ambulances_without_a_position_are_skipped(self):
+        make_ambulance(self.hospital)
+
+        self.assertEqual(self.nearest_ids(12.97, 77.59), [])
+
+
+class NearestAmbulancesAPITests(TestCase):
+    def setUp(self):
+        self.ambulance = make_ambulance(
+            make_hospital(), current_latitude="12.980000", current_longitude="77.600000"
+        )
+        self.patient = make_user()
+        self.emergency = Emergency.objects.create(
+            patient=self.patient,
+            description="Fall",
+            location_latitude="12.970000",
+            location_longitude="77.590000",
+        )
+        patcher = mock.patch("api.views.ambulance_registry", AmbulanceRegistry())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def get_nearest(self, user, **params):
+        return api_client(user).get("/api/ambulances/nearest/", params)
+
+    def test_nearest_to_a_point(self):
+        response = self.get_nearest(make_user(), latitude="12.97", longitude="77.59")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [item["id"] for item in response.json()["ambulances"]],
+            [str(self.ambulance.id)],
+        )
+
+    def test_patients_look_up_their_own_emergencies(self):
+        response = self.get_nearest(self.patient, emergency_id=self.emergency.id)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["count"], 1)
+
+    def test_other_patients_emergencies_are_not_found(self):
+        response = self.get_nearest(make_user(), emergency_id=self.emergency.id)
+        self.assertEqual(response.status_code, 404)
+
+        response = self.get_nearest(
+            make_user(is_staff=True), emergency_id=self.emergency.id
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_requires_a_point_or_emergency(self):
+        response = self.get_nearest(make_user())
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,135 @@
+import io
+import shutil
+import tempfile
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import TestCase, override_settings
+from PIL import Image
+
+from api.renditions import (
+    RENDITION_FORMATS,
+    generate_renditions,
+    rendition_name,
+    rendition_sizes,
+    rendition_urls,
+    renditions_built,
+)
+
+from .factories import api_client, make_user
+
+
+def image_bytes(size=(400, 300), image_format="PNG"):
+    buffer = io.BytesIO()
+    Image.new("RGB", size, "teal").save(buffer, image_format)
+    return buffer.getvalue()
+
+
+class RenditionTestCase(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        cache.clear()
+
+        self.user = make_user()
+
+    def set_picture(self, data, name="me.png"):
+        # Committing would queue a background build; tests build directly
+        self.user.profile_picture.save(name, ContentFile(data))
+        return self.user.profile_picture
+
+
+class GenerateRenditionsTests(RenditionTestCase):
+    def test_writes_square_renditions_in_every_size_and_format(self):
+        picture = self.set_picture(image_bytes())
+
+        self.assertTrue(generate_renditions(picture))
+
+        for size, edge in rendition_sizes().items():
+            for image_format, (pil_format, _, _) in RENDITION_FORMATS.items():
+                name = rendition_name(picture.name, size, image_format)
+                with default_storage.open(name, "rb") as file:
+                    image = Image.open(file)
+                    self.assertEqual(
+                        (image.format, image.size), (pil_format, (edge, edge))
+                    )
+
+    def test_built_renditions_are_not_decoded_again(self):
+        picture = self.set_picture(image_bytes())
+        generate_renditions(picture)
+
+        with mock.patch("api.renditions.Image.open") as image_open:
+            self.assertTrue(generate_renditions(picture))
+        image_open.assert_not_called()
+
+    def test_built_state_is_cached(self):
+        picture = self.set_picture(image_bytes())
+        self.assertFalse(renditions_built(picture.name))
+        generate_renditions(picture)
+        self.assertTrue(renditions_built(picture.name))
+
+        with mock.patch.object(default_storage, "exists") as exists:
+            self.assertTrue(renditions_built(picture.name))
+        exists.assert_not_called()
+
+    def test_urls_point_at_the_endpoint_until_built(self):
+        picture = self.set_picture(image_bytes())
+
+        with mock.patch("api.renditions.schedule_renditions") as schedule:
+            urls = rendition_urls(picture, lambda size, fmt: f"/build/{size}.{fmt}")
+        schedule.assert_called_once_with(picture)
+        self.assertEqual(urls["thumb"]["webp"], "/build/thumb.webp")
+
+        generate_renditions(picture)
+        urls = rendition_urls(picture, lambda size, fmt: f"/build/{size}.{fmt}")
+        self.assertEqual(
+            urls["thumb"]["webp"],
+            default_storage.url(rendition_name(picture.name, "thumb", "webp")),
+        )
+
+    def test_non_images_are_rejected(self):
+        picture = self.set_picture(b"%PDF-1.4 not a picture", name="me.pdf")
+
+        with self.assertLogs("api.renditions", "WARNING"):
+            self.assertFalse(generate_renditions(picture))
+        self.assertFalse(renditions_built(picture.name))
+
+
+class RenditionEndpointTests(RenditionTestCase):
+    def get(self, size, image_format):
+        return api_client(self.user).get(
+            f"/api/users/{self.user.id}/profile-picture/{size}/{image_format}/"
+        )
+
+    def test_builds_and_serves_a_rendition(self):
+        self.set_picture(image_bytes(image_format="JPEG"), name="me.jpg")
+
+        response = self.get("small", "webp")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "image/webp")
+        self.assertIn("immutable", response["Cache-Control"])
+        image = Image.open(io.BytesIO(b"".join(response.streaming_content)))
+        self.assertEqual(image.size, (160, 160))
+
+    def test_unknown_sizes_and_formats_are_not_found(self):
+        self.set_picture(image_bytes())
+
+        self.assertEqual(self.get("huge", "webp").status_code, 404)
+        self.assertEqual(self.get("small", "gif").status_code, 404)
+
+    def test_missing_or_unreadable_pictures_are_not_found(self):
+        self.assertEqual(self.get("small", "jpeg").status_code, 404)
+
+        self.set_picture(b"not a picture")
+        with self.assertLogs("api.renditions", "WARNING"):
+            response = self.get("small", "jpeg")
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(
+            response.json()["error"], "Profile picture cannot be read as an image"
+        )
@@ -0,0 +1,78 @@
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from db.models import Emergency, Hospital
+from db.routers import PrimaryReplicaRouter, replica_reads
+
+from .factories import make_user
+
+
+@override_settings(DATABASE_REPLICAS=["replica1"])
+class PrimaryReplicaRouterTests(SimpleTestCase):
+    def setUp(self):
+        self.router = PrimaryReplicaRouter()
+
+    def test_reads_use_the_primary_outside_replica_blocks(self):
+        self.assertEqual(self.router.db_for_read(Hospital), DEFAULT_DB_ALIAS)
+        with replica_reads(allowed=False):
+            self.assertEqual(self.router.db_for_read(Hospital), DEFAULT_DB_ALIAS)
+
+    def test_reads_use_a_replica_until_the_block_writes(self):
+        with replica_reads() as state:
+            self.assertEqual(self.router.db_for_read(Hospital), "replica1")
+            self.assertEqual(self.router.db_for_write(Hospital), DEFAULT_DB_ALIAS)
+            self.assertTrue(state.wrote)
+            self.assertEqual(self.router.db_for_read(Hospital), DEFAULT_DB_ALIAS)
+
+    def test_token_reads_stay_on_the_primary(self):
+        with replica_reads():
+            self.assertEqual(self.router.db_for_read(Token), DEFAULT_DB_ALIAS)
+
+
+@override_settings(DATABASE_REPLICAS=["test_replica"])
+class PrimaryReplicaRoutingTests(TransactionTestCase):
+    """Primary and replica as two databases that do not replicate"""
+
+    databases = {DEFAULT_DB_ALIAS, "test_replica"}
+
+    def setUp(self):
+        cache.clear()
+
+    def test_reads_go_to_the_replica_except_after_own_writes(self):
+        # Created after the replica was copied, so only the primary has them
+        patient = make_user(latitude=12.97, longitude=77.59)
+        token = Token.objects.create(user=patient)
+        Emergency.objects.create(patient=patient, description="Fall")
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+
+        response = client.get("/api/emergencies/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["count"], 0)
+
+        response = client.post(
+            "/api/emergencies/",
+            {"priority": "HIGH", "description": "Chest pain"},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 201)
+
+        # Pinned to the primary: the client sees its own writes
+        response = client.get("/api/emergencies/")
+        self.assertEqual(response.json()["count"], 2)
+
+        # Once the pin expires reads go back to the replica
+        cache.clear()
+        response = client.get("/api/emergencies/")
+        self.assertEqual(response.json()["count"], 0)
+
+    def test_transactions_read_from_the_primary(self):
+        patient = make_user()
+        with replica_reads(), transaction.atomic():
+            Emergency.objects.create(patient=patient, description="Fall")
+            self.assertEqual(Emergency.objects.count(), 1)
+        with replica_reads():
+            self.assertEqual(Emergency.objects.count(), 0)
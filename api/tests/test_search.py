@@ -0,0 +1,112 @@
+from unittest import mock
+
+from django.db import connection
+from django.test import TestCase
+
+from api.search import search_medical_records
+from db.models import MedicalRecord
+
+from .factories import api_client, make_user
+
+
+def make_record(patient, diagnosis, treatment="Rest", doctor_name="Dr. Rao"):
+    return MedicalRecord.objects.create(
+        patient=patient,
+        record_type="REGULAR_CHECKUP",
+        diagnosis=diagnosis,
+        treatment=treatment,
+        doctor_name=doctor_name,
+    )
+
+
+class MedicalRecordIndexTests(TestCase):
+    def setUp(self):
+        self.patient = make_user()
+
+    def matching_ids(self, text, **options):
+        return [
+            record_id for record_id, _, _ in search_medical_records(text, **options)
+        ]
+
+    def test_saves_and_deletes_keep_the_index_in_step(self):
+        record = make_record(self.patient, "Seasonal asthma")
+        self.assertEqual(self.matching_ids("asthma"), [record.id])
+
+        record.diagnosis = "Mild bronchitis"
+        record.save()
+        self.assertEqual(self.matching_ids("asthma"), [])
+        self.assertEqual(self.matching_ids("bronchitis"), [record.id])
+
+        record.delete()
+        self.assertEqual(self.matching_ids("bronchitis"), [])
+
+    def test_diagnosis_matches_rank_above_treatment_matches(self):
+        in_treatment = make_record(
+            self.patient, "Chest infection", treatment="Asthma inhaler"
+        )
+        in_diagnosis = make_record(self.patient, "Asthma")
+
+        matches = search_medical_records("asthma")
+
+        self.assertEqual(
+            [record_id for record_id, _, _ in matches],
+            [in_diagnosis.id, in_treatment.id],
+        )
+        self.assertGreater(matches[0][1], matches[1][1])
+
+    def test_snippets_mark_matched_words_and_prefixes(self):
+        make_record(self.patient, "Type 2 diabetes", treatment="Metformin daily")
+
+        [(_, _, snippet)] = search_medical_records("diabetes")
+        self.assertEqual(snippet, "Type 2 <mark>diabetes</mark>")
+
+        [(_, _, snippet)] = search_medical_records("metfor")
+        self.assertEqual(snippet, "<mark>Metformin</mark> daily")
+
+    def test_snippets_escape_record_text(self):
+        make_record(self.patient, "<script>alert(1)</script> asthma & rash")
+        escaped = "&lt;script&gt;alert(1)&lt;/script&gt; <mark>asthma</mark> &amp; rash"
+
+        [(_, _, snippet)] = search_medical_records("asthma")
+        self.assertEqual(snippet, escaped)
+
+        # Databases without a full-text index take the icontains fallback
+        with mock.patch.object(connection, "vendor", "other"):
+            [(_, _, snippet)] = search_medical_records("asthma")
+        self.assertEqual(snippet, escaped + " Rest")
+
+    def test_search_is_limited_to_a_patient(self):
+        own = make_record(self.patient, "Asthma")
+        make_record(make_user(), "Asthma")
+
+        self.assertEqual(
+            self.matching_ids("asthma", patient_id=self.patient.pk), [own.id]
+        )
+        self.assertEqual(len(self.matching_ids("asthma")), 2)
+
+
+class MedicalRecordSearchAPITests(TestCase):
+    def setUp(self):
+        self.patient = make_user()
+        self.client = api_client(self.patient)
+        self.record = make_record(self.patient, "Asthma")
+        make_record(make_user(), "Asthma")
+
+    def test_patients_search_their_own_records(self):
+        response = self.client.get("/api/medical-records/search/", {"q": "asthma"})
+
+        self.assertEqual(response.status_code, 200)
+        [result] = response.json()["results"]
+        self.assertEqual(result["id"], str(self.record.id))
+        self.assertEqual(result["snippet"], "<mark>Asthma</mark>")
+        self.assertFalse(response.json()["truncated"])
+
+    def test_search_parameter_lists_index_matches(self):
+        make_record(self.patient, "Fracture")
+
+        response = self.client.get("/api/medical-records/", {"search": "asth"})
+
+        self.assertEqual(
+            [item["id"] for item in response.json()["results"]], [str(self.record.id)]
+        )
+        self.assertFalse(response.json()["search_truncated"])
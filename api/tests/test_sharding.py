@@ -0,0 +1,271 @@
+import io
+from unittest import mock
+
+from django.contrib.auth.hashers import UNUSABLE_PASSWORD_PREFIX
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+from rest_framework.test import APIClient
+
+from api.tokens import issue_access_token
+from api.views import FannedOutRows
+from db.models import Ambulance, Emergency, Hospital, TokenUser, User
+from db.routers import RegionalShardRouter
+from db.sharding import (
+    fan_out,
+    locate_shard,
+    mirror_row,
+    region_for_location,
+    shard_for_location,
+    shard_for_state,
+    shard_locations,
+    use_shard,
+)
+
+from .factories import api_client, make_ambulance, make_hospital, make_user
+
+NORTH_REGIONS = {
+    "north": {"states": ["Punjab"], "bounds": [[28.0, 73.0, 33.0, 78.0]]},
+}
+
+
+@override_settings(
+    DATABASE_SHARDS={"north": "test_shard"}, DATABASE_SHARD_REGIONS=NORTH_REGIONS
+)
+class RegionalShardRouterTests(SimpleTestCase):
+    def setUp(self):
+        self.router = RegionalShardRouter()
+
+    def test_regions_map_locations_and_states_to_shards(self):
+        self.assertEqual(shard_for_location(30.7, 76.78), "test_shard")
+        self.assertEqual(shard_for_location(12.97, 77.59), DEFAULT_DB_ALIAS)
+        self.assertEqual(region_for_location(30.7, 76.78), "north")
+        self.assertEqual(region_for_location(12.97, 77.59), "default")
+        self.assertEqual(shard_for_state(" punjab "), "test_shard")
+        self.assertEqual(shard_for_state("Karnataka"), DEFAULT_DB_ALIAS)
+
+    def test_regional_models_follow_the_shard_block(self):
+        self.assertIsNone(self.router.db_for_read(Emergency))
+        with use_shard("test_shard"):
+            self.assertEqual(self.router.db_for_read(Emergency), "test_shard")
+            self.assertEqual(self.router.db_for_write(Hospital), "test_shard")
+            self.assertIsNone(self.router.db_for_read(User))
+
+    def test_loaded_rows_keep_their_shard(self):
+        emergency = Emergency()
+        emergency._state.db = "test_shard"
+        self.assertEqual(
+            self.router.db_for_write(Emergency, instance=emergency), "test_shard"
+        )
+
+
+@override_settings(
+    DATABASE_SHARDS={"north": "test_shard"}, DATABASE_SHARD_REGIONS=NORTH_REGIONS
+)
+class ShardTestCase(TransactionTestCase):
+    """Default and a north shard as two separate databases"""
+
+    databases = {DEFAULT_DB_ALIAS, "test_shard"}
+
+    def setUp(self):
+        shard_locations.clear()
+
+
+class OwnRowsFanOutTests(ShardTestCase):
+    def setUp(self):
+        super().setUp()
+        # Registered in Bengaluru, which belongs to the default region
+        self.patient = make_user(latitude=12.97, longitude=77.59)
+        self.client = api_client(self.patient)
+
+    def create_emergency(self, latitude, longitude):
+        response = self.client.post(
+            "/api/emergencies/",
+            {
+                "priority": "HIGH",
+                "description": "Fall",
+                "location_latitude": latitude,
+                "location_longitude": longitude,
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, 201)
+        return response.json()
+
+    def test_patient_lists_emergencies_from_every_shard(self):
+        home = self.create_emergency("12.970000", "77.590000")
+        travelling = self.create_emergency("30.700000", "76.780000")
+        self.assertEqual(home["region"], "default")
+        self.assertEqual(travelling["region"], "north")
+
+        response = self.client.get("/api/emergencies/")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["count"], 2)
+        self.assertEqual(
+            [item["id"] for item in response.json()["results"]],
+            [travelling["emergency"]["id"], home["emergency"]["id"]],
+        )
+
+    def test_pages_merge_each_shards_leading_rows(self):
+        created = [
+            self.create_emergency(*location)["emergency"]["id"]
+            for location in [("12.970000", "77.590000"), ("30.700000", "76.780000")] * 3
+        ]
+        newest_first = list(reversed(created))
+        rows = FannedOutRows(
+            Emergency.objects.filter(patient=self.patient), ["-created_at"]
+        )
+
+        self.assertEqual(rows.count(), 6)
+        self.assertEqual([str(row.id) for row in rows[2:4]], newest_first[2:4])
+        self.assertEqual(str(rows[5].id), newest_first[5])
+
+        loaded = []
+        with mock.patch("api.views.fan_out", self.recording_fan_out(loaded)):
+            rows[0:2]
+        self.assertEqual(loaded, [2, 2])
+
+    @staticmethod
+    def recording_fan_out(loaded):
+        def recording(func):
+            results = fan_out(func)
+            loaded.extend(len(rows) for rows in results.values())
+            return results
+
+        return recording
+
+    def test_requested_region_lists_only_that_shard(self):
+        self.create_emergency("12.970000", "77.590000")
+        travelling = self.create_emergency("30.700000", "76.780000")
+
+        response = self.client.get("/api/emergencies/", {"region": "north"})
+
+        self.assertEqual(
+            [item["id"] for item in response.json()["results"]],
+            [travelling["emergency"]["id"]],
+        )
+
+    def test_staff_lists_stay_on_one_shard(self):
+        self.create_emergency("30.700000", "76.780000")
+        staff = api_client(make_user(is_staff=True, latitude=12.97, longitude=77.59))
+
+        response = staff.get("/api/emergencies/")
+
+        self.assertEqual(response.json()["count"], 0)
+        self.assertEqual(Emergency.objects.using("test_shard").count(), 1)
+
+
+class ShardPlacementTests(ShardTestCase):
+    def setUp(self):
+        super().setUp()
+        self.staff = api_client(make_user(is_staff=True))
+
+    def test_hospital_lives_in_the_shard_of_its_state(self):
+        response = self.staff.post(
+            "/api/hospitals/",
+            {
+                "name": "Chandigarh General",
+                "registration_number": "REGNORTH01",
+                "phone_number": "0172123456",
+                "email": "general@example.com",
+                "address": "Sector 16",
+                "city": "Chandigarh",
+                "state": "Punjab",
+                "pincode": "160016",
+                "latitude": "30.740000",
+                "longitude": "76.780000",
+                "specializations": "Emergency Medicine",
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, 201)
+
+        hospital = Hospital.objects.using("test_shard").get()
+        self.assertEqual(hospital.home_region, "north")
+        # The default database keeps a directory copy that regional
+        # queries there skip
+        copy = Hospital.objects.using(DEFAULT_DB_ALIAS).get(pk=hospital.pk)
+        self.assertEqual(copy.home_region, "north")
+        self.assertFalse(Hospital.objects.using(DEFAULT_DB_ALIAS).regional().exists())
+        self.assertEqual(locate_shard(Hospital, hospital.pk), "test_shard")
+
+    def test_signed_tokens_pick_the_home_shard_without_loading_the_user(self):
+        operator = make_user(is_staff=True, latitude=30.7, longitude=76.78)
+        patient = make_user()
+        mirror_row(patient, "test_shard")
+        with use_shard("test_shard"):
+            Emergency.objects.create(patient=patient, description="Fall")
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {issue_access_token(operator)}")
+
+        with mock.patch.object(
+            TokenUser, "refresh_from_db", side_effect=AssertionError("user loaded")
+        ):
+            response = client.get("/api/emergencies/")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["count"], 1)
+
+    def test_detail_route_finds_the_shard_of_its_row(self):
+        patient = make_user(latitude=12.97, longitude=77.59)
+        mirror_row(patient, "test_shard")
+        with use_shard("test_shard"):
+            emergency = Emergency.objects.create(patient=patient, description="Fall")
+
+        response = self.staff.get(f"/api/emergencies/{emergency.pk}/")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["id"], str(emergency.pk))
+
+    def test_assigned_drivers_are_copied_to_the_ambulance_shard(self):
+        with use_shard("test_shard"):
+            ambulance = make_ambulance(make_hospital(state="Punjab"))
+        driver = make_user(is_elderly=False)
+
+        response = self.staff.patch(
+            f"/api/ambulances/{ambulance.pk}/", {"driver": driver.pk}, format="json"
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            Ambulance.objects.using("test_shard").get().driver_id, driver.pk
+        )
+        self.assertTrue(User.objects.using("test_shard").filter(pk=driver.pk).exists())
+
+    def test_fan_out_runs_against_every_shard(self):
+        make_hospital()
+        with use_shard("test_shard"):
+            make_hospital(state="Punjab")
+            make_hospital(state="Punjab")
+
+        counts = fan_out(lambda alias: Hospital.objects.regional().count())
+
+        self.assertEqual(counts, {DEFAULT_DB_ALIAS: 1, "test_shard": 2})
+
+
+class BackfillHomeRegionsTests(ShardTestCase):
+    def test_backfill_sets_regions_and_redacts_user_copies(self):
+        with use_shard("test_shard"):
+            hospital = make_hospital(state="Punjab")
+        # As left behind by the column's default before the backfill
+        for alias in (DEFAULT_DB_ALIAS, "test_shard"):
+            Hospital.objects.using(alias).update(home_region="default")
+        patient = make_user()
+        User.objects.using("test_shard").bulk_create([patient])
+
+        call_command("backfill_home_regions", stdout=io.StringIO())
+
+        for alias in (DEFAULT_DB_ALIAS, "test_shard"):
+            self.assertEqual(
+                Hospital.objects.using(alias).get(pk=hospital.pk).home_region,
+                "north",
+            )
+        self.assertEqual(
+            User.objects.using("test_shard").get(pk=patient.pk).password,
+            UNUSABLE_PASSWORD_PREFIX,
+        )
+        self.assertNotEqual(
+            User.objects.using(DEFAULT_DB_ALIAS).get(pk=patient.pk).password,
+            UNUSABLE_PASSWORD_PREFIX,
+        )
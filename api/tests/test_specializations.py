@@ -0,0 +1,95 @@
+import uuid
+from unittest import mock
+
+from django.test import TestCase
+
+from db.models import Specialization
+from db.models.base import SPECIALIZATION_MASK_BITS, SPECIALIZATION_OVERFLOW
+
+from .factories import api_client, make_hospital, make_user
+
+
+class NearbySpecializationFilterTests(TestCase):
+    def setUp(self):
+        # Bits are reused once a test's vocabulary rolls back
+        patcher = mock.patch.object(Specialization, "_names_by_bit", {})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = api_client(make_user())
+        self.staff = api_client(make_user(is_staff=True))
+        self.cardiac = make_hospital(specializations="Cardiology, Emergency Medicine")
+        self.neuro = make_hospital(specializations="Neurology, emergency medicine")
+        self.both = make_hospital(specializations="Cardiology, Neurology")
+
+    def nearby(self, specializations):
+        return self.client.post(
+            "/api/hospitals/nearby/",
+            {
+                "latitude": "12.970000",
+                "longitude": "77.590000",
+                "available_ambulance_only": False,
+                "emergency_services_only": False,
+                "specializations": specializations,
+            },
+            format="json",
+        )
+
+    def nearby_ids(self, specializations):
+        response = self.nearby(specializations)
+        self.assertEqual(response.status_code, 200)
+        return {uuid.UUID(hospital["id"]) for hospital in response.json()["hospitals"]}
+
+    def test_single_specialization(self):
+        self.assertEqual(
+            self.nearby_ids(["cardiology"]), {self.cardiac.id, self.both.id}
+        )
+        self.assertEqual(
+            self.nearby_ids([" EMERGENCY medicine "]),
+            {self.cardiac.id, self.neuro.id},
+        )
+
+    def test_every_specialization_must_be_offered(self):
+        self.assertEqual(self.nearby_ids(["Cardiology", "Neurology"]), {self.both.id})
+        self.assertEqual(self.nearby_ids(["Cardiology", "Dermatology"]), set())
+
+    def test_a_string_is_rejected(self):
+        response = self.nearby("Cardiology")
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("specializations", response.json())
+
+    def test_list_follows_saved_changes(self):
+        response = self.staff.patch(
+            f"/api/hospitals/{self.cardiac.id}/",
+            {"specializations": "Oncology, Neurology"},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.get(f"/api/hospitals/{self.cardiac.id}/")
+        self.assertEqual(
+            response.json()["specializations_list"], ["Neurology", "Oncology"]
+        )
+        self.assertEqual(self.nearby_ids(["Cardiology"]), {self.both.id})
+        self.assertEqual(self.nearby_ids(["Oncology", "Neurology"]), {self.cardiac.id})
+
+    def test_entries_past_the_mask_match_through_the_links(self):
+        last = Specialization.objects.order_by("-bit").first().bit
+        Specialization.objects.bulk_create(
+            [
+                Specialization(name=f"Filler {bit}", key=f"filler {bit}", bit=bit)
+                for bit in range(last + 1, SPECIALIZATION_MASK_BITS)
+            ]
+        )
+        rare = make_hospital(specializations="Cardiology, Hyperbaric Medicine")
+
+        self.assertTrue(rare.specialization_mask & SPECIALIZATION_OVERFLOW)
+        self.assertEqual(self.nearby_ids(["Hyperbaric Medicine"]), {rare.id})
+        self.assertEqual(
+            self.nearby_ids(["cardiology", "hyperbaric medicine"]), {rare.id}
+        )
+        response = self.client.get(f"/api/hospitals/{rare.id}/")
+        self.assertEqual(
+            response.json()["specializations_list"],
+            ["Cardiology", "Hyperbaric Medicine"],
+        )
@@ -0,0 +1,110 @@
+import os
+import shutil
+import tempfile
+from datetime import datetime, timezone
+
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.db import transaction
+from django.test import TestCase, override_settings
+
+from db.models import MedicalRecord, StoredBlob
+from db.storage import blob_digest, content_storage
+
+from .factories import make_hospital, make_user
+
+
+class BlobReferenceCountTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        patient = make_user()
+        hospital = make_hospital()
+        self.records = [
+            MedicalRecord.objects.create(
+                patient=patient,
+                hospital=hospital,
+                record_type="LAB_REPORT",
+                diagnosis="Anaemia",
+                treatment="Iron",
+                doctor_name="Dr Rao",
+            )
+            for _ in range(3)
+        ]
+        self.data = os.urandom(4096)
+
+    def attach(self, record, name, data=None):
+        with self.captureOnCommitCallbacks(execute=True):
+            record.attachments.save(name, ContentFile(data or self.data))
+
+    def blob(self, name):
+        return StoredBlob.objects.get(digest=blob_digest(name))
+
+    def test_same_bytes_are_stored_once_whatever_the_extension(self):
+        first, second = self.records[:2]
+        self.attach(first, "report.pdf")
+        self.attach(second, "scan.bin")
+        self.assertEqual(first.attachments.name, second.attachments.name)
+        self.assertTrue(first.attachments.name.endswith(".pdf"))
+        self.assertEqual(self.blob(first.attachments.name).refcount, 2)
+        directory = os.path.dirname(content_storage.path(first.attachments.name))
+        self.assertEqual(len(os.listdir(directory)), 1)
+
+    def test_replacing_and_deleting_move_the_counts(self):
+        first, second = self.records[:2]
+        self.attach(first, "report.pdf")
+        self.attach(second, "report.pdf")
+        name = first.attachments.name
+
+        record = MedicalRecord.objects.get(pk=second.pk)
+        self.attach(record, "other.pdf", b"other bytes")
+        self.assertEqual(self.blob(name).refcount, 1)
+        self.assertEqual(self.blob(record.attachments.name).refcount, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            MedicalRecord.objects.get(pk=first.pk).delete()
+        self.assertEqual(self.blob(name).refcount, 0)
+
+    def test_rolled_back_save_keeps_the_count(self):
+        first, second = self.records[:2]
+        self.attach(first, "report.pdf")
+        name = first.attachments.name
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            try:
+                with transaction.atomic():
+                    second.attachments.save("report.pdf", ContentFile(self.data))
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        self.assertEqual(callbacks, [])
+        self.assertEqual(self.blob(name).refcount, 1)
+
+    def test_collect_blobs_removes_unreferenced_blobs(self):
+        first = self.records[0]
+        self.attach(first, "report.pdf")
+        name = first.attachments.name
+        path = content_storage.path(name)
+        with self.captureOnCommitCallbacks(execute=True):
+            MedicalRecord.objects.get(pk=first.pk).delete()
+
+        # Past the grace period
+        long_ago = datetime(2000, 1, 1, tzinfo=timezone.utc)
+        StoredBlob.objects.filter(digest=blob_digest(name)).update(
+            last_saved_at=long_ago
+        )
+        os.utime(path, (long_ago.timestamp(), long_ago.timestamp()))
+        call_command("collect_blobs", grace=0, stdout=open(os.devnull, "w"))
+        self.assertFalse(StoredBlob.objects.filter(digest=blob_digest(name)).exists())
+        self.assertFalse(os.path.exists(path))
+
+    def test_recount_rebuilds_counts_from_the_tables(self):
+        first = self.records[0]
+        self.attach(first, "report.pdf")
+        name = first.attachments.name
+        StoredBlob.objects.filter(digest=blob_digest(name)).update(refcount=7)
+        call_command("collect_blobs", recount=True, stdout=open(os.devnull, "w"))
+        self.assertEqual(self.blob(name).refcount, 1)
@@ -0,0 +1,61 @@
+import time
+from unittest import mock
+
+from django.test import TestCase
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.authentication import CachedTokenAuthentication, token_cache
+
+from .factories import make_user
+
+
+class CachedTokenAuthenticationTests(TestCase):
+    def setUp(self):
+        token_cache.clear()
+        self.addCleanup(token_cache.clear)
+        self.user = make_user()
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+        self.authentication = CachedTokenAuthentication()
+
+    def test_cached_tokens_skip_the_database(self):
+        with self.assertNumQueries(1):
+            self.authentication.authenticate_credentials(self.token.key)
+        with self.assertNumQueries(0):
+            user, token = self.authentication.authenticate_credentials(self.token.key)
+        self.assertEqual(user.pk, self.user.pk)
+        self.assertIs(token.user, user)
+
+    def test_logout_evicts_the_cached_token(self):
+        self.assertEqual(self.client.get("/api/emergencies/").status_code, 200)
+
+        response = self.client.post("/api/auth/logout/")
+        self.assertEqual(response.status_code, 200)
+
+        self.assertIsNone(token_cache.get(self.token.key))
+        self.assertEqual(self.client.get("/api/emergencies/").status_code, 401)
+
+    def test_deactivation_evicts_the_cached_token(self):
+        self.assertEqual(self.client.get("/api/emergencies/").status_code, 200)
+
+        self.user.is_active = False
+        self.user.save()
+
+        self.assertIsNone(token_cache.get(self.token.key))
+        self.assertEqual(self.client.get("/api/emergencies/").status_code, 401)
+
+    def test_expired_entries_are_looked_up_again(self):
+        self.authentication.authenticate_credentials(self.token.key)
+        # Deactivated by another process: no signal reaches this cache
+        type(self.user).objects.filter(pk=self.user.pk).update(is_active=False)
+
+        with self.assertNumQueries(0):
+            self.authentication.authenticate_credentials(self.token.key)
+
+        later = time.monotonic() + token_cache.ttl + 1
+        with mock.patch("api.authentication.time.monotonic", return_value=later):
+            with self.assertNumQueries(1), self.assertRaises(AuthenticationFailed):
+                self.authentication.authenticate_credentials(self.token.key)
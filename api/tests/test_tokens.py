@@ -0,0 +1,100 @@
+import time
+from unittest import mock
+
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from api.tokens import issue_access_token, verify_access_token
+from db.models import RefreshToken
+
+from .factories import make_user
+
+
+class SignedTokenTests(TestCase):
+    def setUp(self):
+        self.user = make_user(is_staff=True)
+        self.client = APIClient()
+
+    def login(self):
+        response = self.client.post(
+            "/api/auth/login/",
+            {"username": self.user.username, "password": "pass12345"},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def refresh(self, refresh_token):
+        return self.client.post(
+            "/api/auth/refresh/", {"refresh_token": refresh_token}, format="json"
+        )
+
+    def get_with(self, access_token):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {access_token}")
+        return client.get("/api/emergencies/")
+
+    def test_login_issues_a_token_pair(self):
+        tokens = self.login()
+
+        self.assertEqual(tokens["expires_in"], 300)
+        self.assertEqual(self.get_with(tokens["access_token"]).status_code, 200)
+        stored = RefreshToken.objects.get(user=self.user)
+        self.assertNotEqual(stored.token_hash, tokens["refresh_token"])
+
+    def test_access_token_restores_the_user_without_a_query(self):
+        with self.assertNumQueries(0):
+            user = verify_access_token(issue_access_token(self.user))
+        self.assertEqual(user.pk, self.user.pk)
+        self.assertTrue(user.is_staff)
+
+    def test_access_token_carries_the_home_region(self):
+        self.user.latitude, self.user.longitude = 30.7, 76.78
+        self.user.save()
+        regions = {"north": {"bounds": [[28.0, 73.0, 33.0, 78.0]]}}
+        with self.settings(DATABASE_SHARD_REGIONS=regions):
+            token = issue_access_token(self.user)
+
+        with self.assertNumQueries(0):
+            user = verify_access_token(token)
+            self.assertEqual(user.get_home_region(), "north")
+
+    def test_expired_and_tampered_access_tokens_are_rejected(self):
+        token = issue_access_token(self.user)
+        later = time.time() + 301
+        with mock.patch("django.core.signing.time.time", return_value=later):
+            self.assertIsNone(verify_access_token(token))
+            self.assertEqual(self.get_with(token).status_code, 401)
+        tampered = token[:-1] + ("A" if token[-1] != "A" else "B")
+        self.assertIsNone(verify_access_token(tampered))
+
+    def test_refresh_rotates_and_rejects_reuse(self):
+        tokens = self.login()
+
+        response = self.refresh(tokens["refresh_token"])
+        self.assertEqual(response.status_code, 200)
+        rotated = response.json()
+        self.assertNotEqual(rotated["refresh_token"], tokens["refresh_token"])
+        self.assertEqual(self.get_with(rotated["access_token"]).status_code, 200)
+
+        self.assertEqual(self.refresh(tokens["refresh_token"]).status_code, 401)
+        self.assertEqual(self.refresh(rotated["refresh_token"]).status_code, 200)
+
+    def test_refresh_is_refused_for_inactive_users(self):
+        tokens = self.login()
+        self.user.is_active = False
+        self.user.save()
+
+        self.assertEqual(self.refresh(tokens["refresh_token"]).status_code, 401)
+
+    def test_logout_revokes_refresh_tokens(self):
+        tokens = self.login()
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens['access_token']}")
+
+        self.assertEqual(client.post("/api/auth/logout/").status_code, 200)
+
+        self.assertEqual(self.refresh(tokens["refresh_token"]).status_code, 401)
+        self.assertFalse(
+            RefreshToken.objects.filter(user=self.user, revoked_at=None).exists()
+        )
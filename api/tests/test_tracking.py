@@ -0,0 +1,184 @@
+from unittest import mock
+
+from django.test import TestCase
+from django.utils import timezone
+
+from api import tracking
+from db.models import Ambulance
+
+from .factories import api_client, make_ambulance, make_hospital, make_user
+
+
+class BulkLocationTests(TestCase):
+    def setUp(self):
+        self.hospital = make_hospital()
+        self.ambulance = make_ambulance(self.hospital)
+        self.staff = api_client(make_user(is_staff=True))
+
+    def post_fixes(self, client, *fixes):
+        return client.post(
+            "/api/ambulances/bulk-location/", {"fixes": list(fixes)}, format="json"
+        )
+
+    def fix(self, seconds_ago=0, latitude=12.97):
+        timestamp = timezone.now() - timezone.timedelta(seconds=seconds_ago)
+        return [self.ambulance.vehicle_number, latitude, 77.59, timestamp.isoformat()]
+
+    def test_patients_cannot_move_ambulances(self):
+        response = self.post_fixes(api_client(make_user()), self.fix())
+
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(
+            response.json()["vehicle_numbers"], [self.ambulance.vehicle_number]
+        )
+        self.ambulance.refresh_from_db()
+        self.assertIsNone(self.ambulance.current_latitude)
+
+    def test_driver_can_report_own_ambulance(self):
+        driver = make_user(is_elderly=False)
+        self.ambulance.driver = driver
+        self.ambulance.save()
+
+        response = self.post_fixes(api_client(driver), self.fix())
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"accepted": 1, "dropped": 0})
+
+    def test_a_matching_phone_number_is_not_a_driver(self):
+        # Phone numbers are self-registered and never verified
+        impostor = make_user(phone_number=self.ambulance.driver_phone)
+
+        response = self.post_fixes(api_client(impostor), self.fix())
+
+        self.assertEqual(response.status_code, 403)
+        self.ambulance.refresh_from_db()
+        self.assertIsNone(self.ambulance.current_latitude)
+
+    def test_fix_overtaken_by_a_concurrent_batch_is_not_accepted(self):
+        update_locations = tracking._update_locations
+
+        def newer_fix_first(items):
+            # Another batch stores a newer fix between the check and the UPDATE
+            Ambulance.objects.filter(pk=self.ambulance.pk).update(
+                location_updated_at=timezone.now()
+            )
+            return update_locations(items)
+
+        with mock.patch.object(tracking, "_update_locations", newer_fix_first):
+            response = self.post_fixes(self.staff, self.fix(seconds_ago=10))
+
+        self.assertEqual(response.json(), {"accepted": 0, "dropped": 1})
+        self.ambulance.refresh_from_db()
+        self.assertIsNone(self.ambulance.current_latitude)
+
+
+class UpdateLocationTests(TestCase):
+    def setUp(self):
+        self.hospital = make_hospital()
+        self.ambulance = make_ambulance(self.hospital)
+        self.staff = api_client(make_user(is_staff=True))
+        self.url = f"/api/ambulances/{self.ambulance.id}/update-location/"
+
+    def test_stores_the_device_timestamp(self):
+        timestamp = timezone.now() - timezone.timedelta(seconds=20)
+
+        response = self.staff.post(
+            self.url,
+            {"latitude": "12.97", "longitude": "77.59", "timestamp": timestamp},
+            format="json",
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.ambulance.refresh_from_db()
+        self.assertEqual(self.ambulance.location_updated_at, timestamp)
+        self.assertEqual(self.ambulance.current_latitude_e6, 12_970_000)
+
+    def test_rejects_a_fix_older_than_the_stored_one(self):
+        Ambulance.objects.filter(pk=self.ambulance.pk).update(
+            location_updated_at=timezone.now()
+        )
+        timestamp = timezone.now() - timezone.timedelta(seconds=20)
+
+        response = self.staff.post(
+            self.url,
+            {"latitude": "12.97", "longitude": "77.59", "timestamp": timestamp},
+            format="json",
+        )
+
+        self.assertEqual(response.status_code, 409)
+
+    def test_patients_cannot_move_ambulances(self):
+        response = api_client(make_user()).post(
+            self.url, {"latitude": "12.97", "longitude": "77.59"}, format="json"
+        )
+        self.assertEqual(response.status_code, 403)
+
+    def test_a_matching_phone_number_is_not_a_driver(self):
+        impostor = make_user(phone_number=self.ambulance.driver_phone)
+
+        response = api_client(impostor).post(
+            self.url, {"latitude": "12.97", "longitude": "77.59"}, format="json"
+        )
+
+        self.assertEqual(response.status_code, 403)
+
+    def test_only_staff_assign_drivers(self):
+        user = make_user(is_elderly=False)
+        url = f"/api/ambulances/{self.ambulance.id}/"
+
+        response = api_client(user).patch(url, {"driver": user.pk}, format="json")
+        self.assertEqual(response.status_code, 400)
+
+        response = self.staff.patch(url, {"driver": user.pk}, format="json")
+        self.assertEqual(response.status_code, 200)
+        response = api_client(user).post(
+            self.url, {"latitude": "12.97", "longitude": "77.59"}, format="json"
+        )
+        self.assertEqual(response.status_code, 200)
+
+
+class LocationHistoryTests(TestCase):
+    def setUp(self):
+        self.ambulance = make_ambulance(make_hospital())
+
+    def test_batches_append_to_the_open_segment(self):
+        start = timezone.now() - timezone.timedelta(minutes=5)
+        points = [
+            (start + timezone.timedelta(seconds=second), 12.97, 77.59 + second / 1e4)
+            for second in range(0, 60, 5)
+        ]
+
+        tracking.record_location_history({self.ambulance.id: points[:6]})
+        tracking.record_location_history({self.ambulance.id: points[6:]})
+
+        segments = self.ambulance.location_segments.all()
+        self.assertEqual(len(segments), 1)
+        self.assertEqual(segments[0].point_count, len(points))
+        history = tracking.get_location_history(
+            self.ambulance, start, start + timezone.timedelta(minutes=1)
+        )
+        self.assertEqual([point[0] for point in history], [p[0] for p in points])
+
+    def test_history_endpoint_thins_to_a_positive_resolution(self):
+        start = timezone.now() - timezone.timedelta(minutes=5)
+        points = [
+            (start + timezone.timedelta(seconds=second), 12.97, 77.59)
+            for second in range(0, 60, 5)
+        ]
+        tracking.record_location_history({self.ambulance.id: points})
+        client = api_client(make_user(is_staff=True))
+        url = f"/api/ambulances/{self.ambulance.id}/history/"
+        params = {"start": start.isoformat(), "end": timezone.now().isoformat()}
+
+        response = client.get(url, {**params, "resolution": 20})
+        self.assertEqual(response.status_code, 200)
+        self.assertLess(response.json()["count"], len(points))
+        self.assertGreaterEqual(response.json()["count"], 3)
+
+        for resolution in (0, -5, "fast"):
+            response = client.get(url, {**params, "resolution": resolution})
+            self.assertEqual(response.status_code, 400)
+
+    def test_downsampling_rejects_a_non_positive_resolution(self):
+        with self.assertRaises(ValueError):
+            tracking.downsample_location_history(timezone.timedelta(days=1), 0)
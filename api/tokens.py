@@ -0,0 +1,159 @@
+"""
+Signed access tokens and database-backed refresh tokens
+"""
+
+import hashlib
+import secrets
+import uuid
+
+from django.conf import settings
+from django.core import signing
+from django.utils import timezone
+
+from db.models import RefreshToken, TokenUser
+
+ACCESS_TOKEN_SALT = "api.access-token"
+
+
+def _hash_refresh_token(token):
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def issue_access_token(user):
+    """
+    Issue a short-lived HMAC-signed access token
+
+    The token carries the user id, staff flag and home region and is
+    verified with the SECRET_KEY alone, so checking it needs no database
+    access.
+
+    Args:
+        user: User instance
+
+    Returns:
+        Access token string
+    """
+    return signing.dumps(
+        {
+            "uid": str(user.id),
+            "staff": user.is_staff,
+            "region": user.get_home_region(),
+        },
+        salt=ACCESS_TOKEN_SALT,
+    )
+
+
+def verify_access_token(token):
+    """
+    Verify an access token and restore its user
+
+    Args:
+        token: Access token string
+
+    Returns:
+        TokenUser with id, is_staff and is_active loaded and token_region
+        set, or None if the token is invalid or expired
+    """
+    try:
+        payload = signing.loads(
+            token,
+            salt=ACCESS_TOKEN_SALT,
+            max_age=getattr(settings, "ACCESS_TOKEN_LIFETIME", 300),
+        )
+        user_id = uuid.UUID(payload["uid"])
+    except (signing.BadSignature, KeyError, TypeError, ValueError):
+        return None
+    loaded = {"id": user_id, "is_staff": bool(payload.get("staff")), "is_active": True}
+    # from_db expects the values in model field order
+    names = [
+        field.attname
+        for field in TokenUser._meta.concrete_fields
+        if field.attname in loaded
+    ]
+    user = TokenUser.from_db(None, names, [loaded[name] for name in names])
+    user.token_region = payload.get("region")
+    return user
+
+
+def issue_refresh_token(user):
+    """
+    Create a refresh token for a user
+
+    Args:
+        user: User instance
+
+    Returns:
+        Refresh token string; only its hash is stored
+    """
+    token = secrets.token_urlsafe(32)
+    RefreshToken.objects.create(
+        user=user,
+        token_hash=_hash_refresh_token(token),
+        expires_at=timezone.now()
+        + timezone.timedelta(
+            seconds=getattr(settings, "REFRESH_TOKEN_LIFETIME", 30 * 24 * 3600)
+        ),
+    )
+    return token
+
+
+def issue_token_pair(user):
+    """
+    Issue an access token and a refresh token
+
+    Args:
+        user: User instance
+
+    Returns:
+        Dict with access_token, refresh_token and expires_in
+    """
+    return {
+        "access_token": issue_access_token(user),
+        "refresh_token": issue_refresh_token(user),
+        "expires_in": getattr(settings, "ACCESS_TOKEN_LIFETIME", 300),
+    }
+
+
+def rotate_refresh_token(token):
+    """
+    Exchange a refresh token for a new token pair
+
+    The presented refresh token is revoked, so each one can be used once.
+
+    Args:
+        token: Refresh token string
+
+    Returns:
+        Token pair dict, or None if the token is unknown, expired, revoked
+        or its user is inactive
+    """
+    refresh = (
+        RefreshToken.objects.select_related("user")
+        .filter(token_hash=_hash_refresh_token(token))
+        .first()
+    )
+    if refresh is None or not refresh.is_valid() or not refresh.user.is_active:
+        return None
+
+    revoked = RefreshToken.objects.filter(
+        id=refresh.id, revoked_at__isnull=True
+    ).update(revoked_at=timezone.now())
+    if not revoked:
+        # Lost a race with a concurrent refresh or logout
+        return None
+    return issue_token_pair(refresh.user)
+
+
+def revoke_refresh_tokens(user):
+    """
+    Revoke every active refresh token of a user
+
+    Args:
+        user: User instance
+
+    Returns:
+        Number of tokens revoked
+    """
+    return RefreshToken.objects.filter(user=user, revoked_at__isnull=True).update(
+        revoked_at=timezone.now()
+    )
@@ -0,0 +1,426 @@
+"""
+Ambulance location tracking for the elderly healthcare system API
+"""
+
+import logging
+from datetime import datetime
+from datetime import timezone as dt_timezone
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import (
+    Case,
+    DateTimeField,
+    DecimalField,
+    F,
+    IntegerField,
+    Q,
+    Value,
+    When,
+)
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from db.models import Ambulance, AmbulanceLocationSegment
+from db.models.base import to_microdegrees
+
+from .eta import recompute_emergency_etas
+from .registry import ambulance_registry
+
+logger = logging.getLogger(__name__)
+
+COORDINATE_QUANTUM = Decimal("0.00000001")
+
+# Largest gap between consecutive fixes that fits the int32 millisecond delta
+MAX_SEGMENT_GAP = timezone.timedelta(days=24)
+
+
+def parse_fix(fix):
+    """
+    Parse a raw (vehicle_number, latitude, longitude, timestamp) fix
+
+    Args:
+        fix: Sequence of four values; timestamp is epoch seconds or ISO 8601
+
+    Returns:
+        Tuple of (vehicle_number, Decimal latitude, Decimal longitude,
+        aware datetime), or None if the fix is malformed
+    """
+    try:
+        vehicle_number, latitude, longitude, timestamp = fix
+        latitude = Decimal(str(latitude))
+        longitude = Decimal(str(longitude))
+        if isinstance(timestamp, (int, float)):
+            timestamp = datetime.fromtimestamp(timestamp, tz=dt_timezone.utc)
+        else:
+            timestamp = parse_datetime(timestamp)
+        if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+            return None
+    except (TypeError, ValueError, InvalidOperation, OverflowError, OSError):
+        return None
+
+    if not vehicle_number or timestamp is None:
+        return None
+    if timezone.is_naive(timestamp):
+        timestamp = timezone.make_aware(timestamp, dt_timezone.utc)
+    return str(vehicle_number), latitude, longitude, timestamp
+
+
+def group_fixes(fixes, now=None):
+    """
+    Group a batch of GPS fixes into time-ordered tracks per ambulance
+
+    Args:
+        fixes: Iterable of (vehicle_number, latitude, longitude, timestamp)
+        now: Reference time for the staleness check (defaults to now)
+
+    Returns:
+        Dict mapping vehicle_number to a list of (timestamp, latitude,
+        longitude) sorted by timestamp, with stale fixes removed
+    """
+    now = now or timezone.now()
+    max_age = timezone.timedelta(
+        seconds=getattr(settings, "AMBULANCE_FIX_MAX_AGE", 300)
+    )
+    max_skew = timezone.timedelta(
+        seconds=getattr(settings, "AMBULANCE_FIX_MAX_CLOCK_SKEW", 30)
+    )
+
+    tracks = {}
+    for vehicle_number, latitude, longitude, timestamp in fixes:
+        if timestamp < now - max_age or timestamp > now + max_skew:
+            continue
+        tracks.setdefault(vehicle_number, []).append((timestamp, latitude, longitude))
+    for track in tracks.values():
+        track.sort(key=lambda point: point[0])
+    return tracks
+
+
+def ingest_ambulance_locations(fixes):
+    """
+    Store the latest position per ambulance from a batch of GPS fixes
+
+    Stale and out-of-order fixes are dropped and the remaining positions
+    are written with a single set-based UPDATE per chunk that only touches
+    the location columns. Every usable fix is also appended to the
+    ambulance's location history.
+
+    Args:
+        fixes: Iterable of (vehicle_number, latitude, longitude, timestamp)
+
+    Returns:
+        Dict mapping vehicle_number to the (latitude, longitude, timestamp)
+        that was written
+    """
+    tracks = group_fixes(fixes)
+    if not tracks:
+        return {}
+
+    # Drop fixes older than what is already stored
+    stored = Ambulance.objects.filter(vehicle_number__in=tracks).values_list(
+        "id", "vehicle_number", "location_updated_at"
+    )
+    accepted = {}
+    ambulance_ids = {}
+    history = {}
+    for ambulance_id, vehicle_number, updated_at in stored:
+        timestamp, latitude, longitude = tracks[vehicle_number][-1]
+        if updated_at is None or timestamp > updated_at:
+            accepted[vehicle_number] = (latitude, longitude, timestamp)
+            ambulance_ids[vehicle_number] = ambulance_id
+        history[ambulance_id] = tracks[vehicle_number]
+
+    chunk_size = getattr(settings, "AMBULANCE_LOCATION_BATCH_SIZE", 500)
+    items = list(accepted.items())
+    written = 0
+    for start in range(0, len(items), chunk_size):
+        written += _update_locations(items[start : start + chunk_size])
+
+    if written < len(accepted):
+        # A concurrent batch stored a newer fix after the check above; only
+        # report the positions this batch actually wrote
+        current = dict(
+            Ambulance.objects.filter(vehicle_number__in=accepted).values_list(
+                "vehicle_number", "location_updated_at"
+            )
+        )
+        accepted = {
+            vehicle_number: fix
+            for vehicle_number, fix in accepted.items()
+            if current.get(vehicle_number) == fix[2]
+        }
+    positions = {
+        ambulance_ids[vehicle_number]: (latitude, longitude)
+        for vehicle_number, (latitude, longitude, _) in accepted.items()
+    }
+
+    ambulance_registry.move(positions)
+    recompute_emergency_etas(positions)
+
+    if getattr(settings, "AMBULANCE_LOCATION_HISTORY", True):
+        record_location_history(history)
+
+    logger.debug(f"Ingested {len(accepted)} ambulance locations")
+    return accepted
+
+
+def _update_locations(items):
+    """
+    Write one chunk of accepted fixes with a single UPDATE statement
+
+    Returns:
+        Number of ambulances whose stored fix was older and got replaced
+    """
+    matched = Q()
+    latitude_cases = []
+    longitude_cases = []
+    latitude_e6_cases = []
+    longitude_e6_cases = []
+    timestamp_cases = []
+    for vehicle_number, (latitude, longitude, timestamp) in items:
+        # Re-check ordering in the UPDATE itself so a concurrent batch
+        # carrying a newer fix is never overwritten
+        condition = Q(vehicle_number=vehicle_number) & (
+            Q(location_updated_at__isnull=True) | Q(location_updated_at__lt=timestamp)
+        )
+        latitude = latitude.quantize(COORDINATE_QUANTUM)
+        longitude = longitude.quantize(COORDINATE_QUANTUM)
+        latitude_cases.append(When(condition, then=Value(latitude)))
+        longitude_cases.append(When(condition, then=Value(longitude)))
+        latitude_e6_cases.append(When(condition, then=Value(to_microdegrees(latitude))))
+        longitude_e6_cases.append(
+            When(condition, then=Value(to_microdegrees(longitude)))
+        )
+        timestamp_cases.append(When(condition, then=Value(timestamp)))
+        matched |= condition
+
+    return Ambulance.objects.filter(matched).update(
+        current_latitude=Case(
+            *latitude_cases,
+            default=F("current_latitude"),
+            output_field=DecimalField(max_digits=10, decimal_places=8),
+        ),
+        current_longitude=Case(
+            *longitude_cases,
+            default=F("current_longitude"),
+            output_field=DecimalField(max_digits=11, decimal_places=8),
+        ),
+        current_latitude_e6=Case(
+            *latitude_e6_cases,
+            default=F("current_latitude_e6"),
+            output_field=IntegerField(),
+        ),
+        current_longitude_e6=Case(
+            *longitude_e6_cases,
+            default=F("current_longitude_e6"),
+            output_field=IntegerField(),
+        ),
+        location_updated_at=Case(
+            *timestamp_cases,
+            default=F("location_updated_at"),
+            output_field=DateTimeField(),
+        ),
+    )
+
+
+def _build_segments(ambulance_id, points, resolution, max_points, max_gap):
+    """Split time-ordered points into new unsaved history segments"""
+    segments = []
+    run = []
+    for point in points:
+        if run and (len(run) >= max_points or point[0] - run[-1][0] > max_gap):
+            segments.append(
+                AmbulanceLocationSegment.from_points(ambulance_id, run, resolution)
+            )
+            run = []
+        run.append(point)
+    if run:
+        segments.append(
+            AmbulanceLocationSegment.from_points(ambulance_id, run, resolution)
+        )
+    return segments
+
+
+def record_location_history(tracks):
+    """
+    Append GPS fixes to the ambulances' compact location history
+
+    Fixes are appended to each ambulance's open raw segment, which is
+    rewritten on every append and so is capped at
+    AMBULANCE_HISTORY_OPEN_SEGMENT_POINTS. A new segment is started when
+    the open one is full or the track has a gap; full segments are never
+    rewritten again until downsample_location_history merges them.
+
+    Args:
+        tracks: Dict mapping ambulance id to a list of (timestamp, latitude,
+            longitude) sorted by timestamp
+    """
+    tracks = {ambulance_id: points for ambulance_id, points in tracks.items() if points}
+    if not tracks:
+        return
+
+    max_points = getattr(settings, "AMBULANCE_HISTORY_OPEN_SEGMENT_POINTS", 120)
+    max_gap = timezone.timedelta(
+        seconds=getattr(settings, "AMBULANCE_HISTORY_MAX_GAP", 3600)
+    )
+
+    with transaction.atomic():
+        _append_location_history(tracks, max_points, max_gap)
+
+
+def _append_location_history(tracks, max_points, max_gap):
+    """Append tracks to the open segments, which are locked until commit"""
+    open_segments = {}
+    earliest = min(points[0][0] for points in tracks.values() if points)
+    # Lock the open segments so a concurrent batch for the same ambulance
+    # waits instead of rewriting the delta blob from a stale copy
+    recent = (
+        AmbulanceLocationSegment.objects.filter(
+            ambulance_id__in=tracks,
+            resolution=0,
+            ended_at__gte=earliest - max_gap,
+        )
+        .select_for_update()
+        .order_by("ambulance_id", "started_at")
+    )
+    for segment in recent:
+        current = open_segments.get(segment.ambulance_id)
+        if current is None or segment.started_at > current.started_at:
+            open_segments[segment.ambulance_id] = segment
+
+    created = []
+    updated = []
+    for ambulance_id, points in tracks.items():
+        segment = open_segments.get(ambulance_id)
+        if segment is not None:
+            points = [point for point in points if point[0] > segment.ended_at]
+            room = max_points - segment.point_count
+            head = []
+            while points and len(head) < room:
+                previous = head[-1][0] if head else segment.ended_at
+                if points[0][0] - previous > max_gap:
+                    break
+                head.append(points.pop(0))
+            if head:
+                segment.append_points(head)
+                updated.append(segment)
+        created.extend(_build_segments(ambulance_id, points, 0, max_points, max_gap))
+
+    if updated:
+        AmbulanceLocationSegment.objects.bulk_update(
+            updated,
+            [
+                "ended_at",
+                "point_count",
+                "last_latitude_e6",
+                "last_longitude_e6",
+                "data",
+                "updated_at",
+            ],
+        )
+    if created:
+        AmbulanceLocationSegment.objects.bulk_create(created)
+
+
+def _check_resolution(resolution):
+    if isinstance(resolution, bool) or not isinstance(resolution, int):
+        raise ValueError(
+            f"Resolution must be a whole number of seconds: {resolution!r}"
+        )
+    if resolution <= 0:
+        raise ValueError(f"Resolution must be positive: {resolution!r}")
+
+
+def _thin_points(points, resolution):
+    """Keep the first of the time-ordered points in each resolution bucket"""
+    last_bucket = None
+    for point in points:
+        bucket = int(point[0].timestamp()) // resolution
+        if bucket != last_bucket:
+            last_bucket = bucket
+            yield point
+
+
+def get_location_history(ambulance, start, end, resolution=None):
+    """
+    Get an ambulance's recorded positions within a time range
+
+    Args:
+        ambulance: Ambulance instance
+        start: Aware datetime range start
+        end: Aware datetime range end
+        resolution: Seconds between returned fixes, or None for every fix
+
+    Returns:
+        List of (timestamp, latitude, longitude) sorted by timestamp
+
+    Raises:
+        ValueError: If resolution is not a positive whole number
+    """
+    if resolution is not None:
+        _check_resolution(resolution)
+    segments = AmbulanceLocationSegment.objects.filter(
+        ambulance=ambulance, started_at__lte=end, ended_at__gte=start
+    ).order_by("started_at")
+    points = (
+        point
+        for segment in segments
+        for point in segment.get_points()
+        if start <= point[0] <= end
+    )
+    if resolution is not None:
+        points = _thin_points(points, resolution)
+    return list(points)
+
+
+def downsample_location_history(age, resolution, now=None):
+    """
+    Re-encode history older than an age at a coarser resolution
+
+    All segments of an ambulance that ended before the cutoff and are finer
+    than the target resolution are decoded, thinned to one fix per
+    resolution bucket and rewritten as merged segments.
+
+    Args:
+        age: Timedelta; only history older than this is downsampled
+        resolution: Target interval between kept fixes in seconds
+        now: Reference time (defaults to now)
+
+    Returns:
+        Tuple of (points before, points after)
+
+    Raises:
+        ValueError: If resolution is not a positive whole number
+    """
+    _check_resolution(resolution)
+    cutoff = (now or timezone.now()) - age
+    max_points = getattr(settings, "AMBULANCE_HISTORY_SEGMENT_POINTS", 3600)
+    candidates = AmbulanceLocationSegment.objects.filter(
+        ended_at__lt=cutoff, resolution__lt=resolution
+    )
+
+    before = after = 0
+    ambulance_ids = candidates.values_list("ambulance_id", flat=True).distinct()
+    for ambulance_id in list(ambulance_ids):
+        with transaction.atomic():
+            segments = list(
+                candidates.filter(ambulance_id=ambulance_id)
+                .select_for_update()
+                .order_by("started_at")
+            )
+            decoded = [point for segment in segments for point in segment.get_points()]
+            before += len(decoded)
+            points = list(_thin_points(decoded, resolution))
+
+            AmbulanceLocationSegment.objects.filter(
+                id__in=[segment.id for segment in segments]
+            ).delete()
+            AmbulanceLocationSegment.objects.bulk_create(
+                _build_segments(
+                    ambulance_id, points, resolution, max_points, MAX_SEGMENT_GAP
+                )
+            )
+            after += len(points)
+
+    return before, after
@@ -52,8 +52,11 @@ API Endpoints Overview:
 Authentication:
 - POST /api/auth/register/          - User registration
 - POST /api/auth/login/             - User login  
+- POST /api/auth/refresh/           - Exchange a refresh token for new signed tokens
 - POST /api/auth/logout/            - User logout
 - POST /api/token-auth/             - Get auth token
+Authenticated requests send "Authorization: Token <token>" or
+"Authorization: Bearer <access_token>".
 
 Users:
 - GET /api/users/                   - List users
@@ -63,6 +66,9 @@ Users:
 - DELETE /api/users/{id}/           - Delete user
 - GET /api/users/profile/           - Get current user profile
 - PATCH /api/users/update-profile/  - Update current user profile
+- GET /api/users/lookup-by-phone/   - Resolve a caller's phone to patients (staff, ?phone=)
+- GET /api/users/{id}/profile-picture/{size}/{webp|jpeg}/ - Resized profile picture
+  (size is thumb, small or medium; built on first request if missing)
 - GET /api/users/{id}/emergency-history/ - Get user's emergency history
 - GET /api/users/{id}/medical-records/   - Get user's medical records
 
@@ -73,8 +79,14 @@ Hospitals:
 - PUT /api/hospitals/{id}/          - Update hospital
 - DELETE /api/hospitals/{id}/       - Delete hospital
 - POST /api/hospitals/nearby/       - Find nearby hospitals
+- POST /api/hospitals/import/       - Upsert hospitals on registration_number (staff;
+  streamed text/csv or application/x-ndjson body)
+- GET /api/hospitals/autocomplete/  - Suggest hospitals by name or city prefix (?q=)
 - GET /api/hospitals/{id}/ambulances/ - Get hospital's ambulances
-- GET /api/hospitals/{id}/emergencies/ - Get hospital's emergencies
+- GET /api/hospitals/{id}/emergencies/ - Get hospital's emergencies (staff)
+- GET /api/hospitals/{id}/feed/     - Get hospital feed changes (staff;
+  ?since=<cursor>&wait=<seconds>; items changed just before the cursor are
+  repeated, so de-duplicate by id)
 - POST /api/hospitals/{id}/respond-emergency/ - Respond to emergency
 
 Emergencies:
@@ -86,6 +98,10 @@ Emergencies:
 - POST /api/emergencies/{id}/update-status/ - Update emergency status
 - POST /api/emergencies/{id}/complete/      - Mark emergency as completed
 - GET /api/emergencies/{id}/notifications/  - Get emergency notifications
+- GET /api/emergencies/export/      - Stream filtered emergencies (staff; ?file_format=ndjson|csv,
+  ?compress=, ?month=YYYY-MM, ?created_after=, ?created_before=, list filters;
+  archived emergencies follow the live ones). The format parameter is file_format:
+  DRF reads ?format= as a renderer override, so ?format=csv is a 404
 
 Notifications:
 - GET /api/notifications/           - List notifications
@@ -96,13 +112,24 @@ Notifications:
 - POST /api/notifications/{id}/mark-read/ - Mark notification as read
 - GET /api/notifications/unread/    - Get unread notifications
 - POST /api/notifications/mark-all-read/ - Mark all notifications as read
+- GET /api/notifications/export/    - Stream filtered notifications (staff; same parameters
+  as /api/emergencies/export/)
 
 Medical Records:
-- GET /api/medical-records/         - List medical records
+- GET /api/medical-records/         - List medical records (?search= lists the best
+  MEDICAL_RECORD_SEARCH_LIMIT matches; search_truncated tells whether more matched)
 - POST /api/medical-records/        - Create medical record
 - GET /api/medical-records/{id}/    - Get medical record details
 - PUT /api/medical-records/{id}/    - Update medical record
 - DELETE /api/medical-records/{id}/ - Delete medical record
+- GET /api/medical-records/search/  - Ranked full-text search with snippets (truncated
+  when more than ?limit= records matched)
+- POST /api/medical-records/{id}/attachment-uploads/ - Start a chunked attachment upload
+- GET /api/medical-records/{id}/attachment-uploads/{upload_id}/ - Get upload progress
+- PUT /api/medical-records/{id}/attachment-uploads/{upload_id}/ - Send the next chunk
+  (raw body; Upload-Offset and Upload-Checksum (SHA-256 hex) headers)
+- DELETE /api/medical-records/{id}/attachment-uploads/{upload_id}/ - Cancel an upload
+- GET /api/medical-records/{id}/attachment/ - Download the attachment (supports Range)
 
 Ambulances:
 - GET /api/ambulances/              - List ambulances
@@ -111,7 +138,10 @@ Ambulances:
 - PUT /api/ambulances/{id}/         - Update ambulance
 - DELETE /api/ambulances/{id}/      - Delete ambulance
 - POST /api/ambulances/{id}/update-location/ - Update ambulance location
+- POST /api/ambulances/bulk-location/ - Ingest batched GPS fixes
+- GET /api/ambulances/{id}/history/ - Get location history (?start=&end=&resolution=<seconds>)
 - GET /api/ambulances/available/    - Get available ambulances
+- GET /api/ambulances/nearest/      - Nearest available ambulances (?latitude=&longitude= or ?emergency_id=)
 
 Emergency Contacts:
 - GET /api/emergency-contacts/      - List emergency contacts
@@ -3,11 +3,31 @@ Utility functions for the elderly healthcare system API
 """
 
 import logging
+import math
 
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import F, Q, Value
 from django.utils import timezone
 from geopy.distance import geodesic
 
-from db.models import Hospital, Notification
+from db.models import (
+    Hospital,
+    HospitalSpecialization,
+    Notification,
+    Specialization,
+    User,
+)
+from db.models.base import (
+    MICRODEGREES,
+    SPECIALIZATION_MASK_BITS,
+    SPECIALIZATION_OVERFLOW,
+    normalize_specialization,
+    to_microdegrees,
+)
+
+from .feed import notify_hospital_feed
+from .registry import KM_PER_DEGREE, ambulance_registry
 
 logger = logging.getLogger(__name__)
 
@@ -18,6 +38,7 @@ def find_nearby_hospitals(
     radius_km=10,
     emergency_services_only=True,
     available_ambulance_only=True,
+    specializations=None,
 ):
     """
     Find nearby hospitals based on location and criteria
@@ -28,12 +49,13 @@ def find_nearby_hospitals(
         radius_km: Search radius in kilometers
         emergency_services_only: Filter for emergency services
         available_ambulance_only: Filter for available ambulances
+        specializations: Names of specializations a hospital must all offer
 
     Returns:
         QuerySet of hospitals with distance annotations
     """
-    # Base queryset
-    hospitals = Hospital.objects.filter(is_active=True)
+    # Base queryset; directory copies of other shards' hospitals are skipped
+    hospitals = Hospital.objects.regional().filter(is_active=True)
 
     # Apply filters
     if emergency_services_only:
@@ -42,9 +64,39 @@ def find_nearby_hospitals(
     if available_ambulance_only:
         hospitals = hospitals.filter(has_ambulance=True, available_ambulances__gt=0)
 
+    if specializations:
+        hospitals = require_specializations(hospitals, specializations)
+
+    # Bounding-box prefilter on the integer coordinate columns so only
+    # hospitals that can be within the radius are loaded
+    patient_location = (float(latitude), float(longitude))
+    # 1% margin covers the difference between the sphere and the WGS-84
+    # ellipsoid used for the exact distance below
+    latitude_span = radius_km * 1.01 / KM_PER_DEGREE
+    latitude_e6 = to_microdegrees(latitude)
+    hospitals = hospitals.filter(
+        latitude_e6__range=(
+            latitude_e6 - round(latitude_span * MICRODEGREES),
+            latitude_e6 + round(latitude_span * MICRODEGREES),
+        )
+    )
+    edge = min(abs(patient_location[0]) + latitude_span, 90)
+    if edge < 89:
+        longitude_span = latitude_span / math.cos(math.radians(edge))
+        if longitude_span < 180:
+            longitude_e6 = to_microdegrees(longitude)
+            low = longitude_e6 - round(longitude_span * MICRODEGREES)
+            high = longitude_e6 + round(longitude_span * MICRODEGREES)
+            bounds = Q(longitude_e6__range=(low, high))
+            # Wrap around the antimeridian
+            if low < -180 * MICRODEGREES:
+                bounds |= Q(longitude_e6__gte=low + 360 * MICRODEGREES)
+            if high > 180 * MICRODEGREES:
+                bounds |= Q(longitude_e6__lte=high - 360 * MICRODEGREES)
+            hospitals = hospitals.filter(bounds)
+
     # Calculate distances and filter by radius
     nearby_hospitals = []
-    patient_location = (float(latitude), float(longitude))
 
     for hospital in hospitals:
         hospital_location = hospital.get_location()
@@ -149,6 +201,61 @@ def create_emergency_notifications(emergency):
     return notifications
 
 
+def coalesce_status_update(emergency, title, message, **recipient):
+    """
+    Create a status update notification, or merge it into a pending one
+
+    Status updates for the same emergency and recipient that have not been
+    sent yet within the coalescing window are collapsed into a single
+    notification carrying the latest message.
+
+    Args:
+        emergency: Emergency instance
+        title: Notification title
+        message: Status update message
+        **recipient: Recipient fields (user or emergency contact name/phone)
+
+    Returns:
+        Notification instance
+    """
+    window = getattr(settings, "STATUS_UPDATE_COALESCE_WINDOW", 60)
+    pending = (
+        Notification.objects.filter(
+            notification_type="STATUS_UPDATE",
+            status="PENDING",
+            emergency=emergency,
+            created_at__gte=timezone.now() - timezone.timedelta(seconds=window),
+            **recipient,
+        )
+        .order_by("-created_at")
+        .first()
+    )
+
+    if pending:
+        # Only rewrite the row while it is still pending: if the delivery
+        # worker sent it since it was read, the update goes out as a new
+        # notification instead of overwriting one already delivered
+        now = timezone.now()
+        merged = Notification.objects.filter(pk=pending.pk, status="PENDING").update(
+            title=title, message=message, updated_at=now
+        )
+        if merged:
+            pending.title = title
+            pending.message = message
+            pending.updated_at = now
+            notify_hospital_feed(pending.hospital_id)
+            return pending
+
+    return Notification.objects.create(
+        notification_type="STATUS_UPDATE",
+        status="PENDING",
+        title=title,
+        message=message,
+        emergency=emergency,
+        **recipient,
+    )
+
+
 def send_status_update_notifications(emergency, status_message):
     """
     Send status update notifications to patient and emergency contacts
@@ -160,14 +267,12 @@ def send_status_update_notifications(emergency, status_message):
     notifications = []
 
     # Notify patient
-    notification = Notification.objects.create(
-        notification_type="STATUS_UPDATE",
+    notification = coalesce_status_update(
+        emergency,
+        "Emergency Status Update",
+        status_message,
         recipient_type="USER",
-        status="PENDING",
-        title="Emergency Status Update",
-        message=status_message,
         user=emergency.patient,
-        emergency=emergency,
     )
     notifications.append(notification)
 
@@ -176,15 +281,13 @@ def send_status_update_notifications(emergency, status_message):
         emergency.patient.emergency_contact_name
         and emergency.patient.emergency_contact_phone
     ):
-        notification = Notification.objects.create(
-            notification_type="STATUS_UPDATE",
+        notification = coalesce_status_update(
+            emergency,
+            f"Emergency Update - {emergency.patient.first_name} {emergency.patient.last_name}",
+            status_message,
             recipient_type="EMERGENCY_CONTACT",
-            status="PENDING",
-            title=f"Emergency Update - {emergency.patient.first_name} {emergency.patient.last_name}",
-            message=status_message,
             emergency_contact_name=emergency.patient.emergency_contact_name,
             emergency_contact_phone=emergency.patient.emergency_contact_phone,
-            emergency=emergency,
         )
         notifications.append(notification)
 
@@ -224,8 +327,24 @@ def dispatch_ambulance(emergency, hospital, estimated_arrival_minutes=None):
         hospital.available_ambulances -= 1
         hospital.save()
 
-        # Assign ambulance if available
-        available_ambulance = hospital.ambulances.filter(status="AVAILABLE").first()
+        # Assign the nearest available ambulance, falling back to any
+        # available one when positions are unknown
+        available_ambulance = None
+        emergency_location = emergency.get_emergency_location()
+        if emergency_location:
+            for candidate in ambulance_registry.nearest(
+                emergency_location[0],
+                emergency_location[1],
+                count=3,
+                hospital_id=hospital.id,
+            ):
+                available_ambulance = hospital.ambulances.filter(
+                    id=candidate["id"], status="AVAILABLE"
+                ).first()
+                if available_ambulance:
+                    break
+        if available_ambulance is None:
+            available_ambulance = hospital.ambulances.filter(status="AVAILABLE").first()
         if available_ambulance:
             available_ambulance.status = "DISPATCHED"
             available_ambulance.current_emergency = emergency
@@ -283,6 +402,48 @@ def get_emergency_priority_score(priority):
     return priority_scores.get(priority, 1)
 
 
+def _lookup_specializations(names):
+    """Get the known vocabulary entries and the count of requested names"""
+    keys = {normalize_specialization(name) for name in names} - {""}
+    return list(
+        Specialization.objects.using(DEFAULT_DB_ALIAS).filter(key__in=keys)
+    ), len(keys)
+
+
+def require_specializations(hospitals, names):
+    """
+    Filter a hospital QuerySet to hospitals offering every named specialization
+
+    Vocabulary entries inside the mask are matched with one bitwise AND on
+    Hospital.specialization_mask; any past it fall back to the relation.
+
+    Args:
+        hospitals: Hospital QuerySet
+        names: Specialization names
+
+    Returns:
+        Filtered QuerySet
+    """
+    specializations, requested = _lookup_specializations(names)
+    if len(specializations) < requested:
+        # No hospital offers a specialization missing from the vocabulary
+        return hospitals.none()
+
+    mask = Specialization.mask_for(
+        [s for s in specializations if s.bit < SPECIALIZATION_MASK_BITS]
+    )
+    if mask:
+        hospitals = hospitals.alias(
+            required_specializations=F("specialization_mask").bitand(mask)
+        ).filter(required_specializations=mask)
+    for specialization in specializations:
+        if specialization.bit >= SPECIALIZATION_MASK_BITS:
+            hospitals = hospitals.filter(
+                specialization_links__specialization=specialization
+            )
+    return hospitals
+
+
 def filter_hospitals_by_specialization(hospitals, required_specializations):
     """
     Filter hospitals by required specializations
@@ -292,22 +453,79 @@ def filter_hospitals_by_specialization(hospitals, required_specializations):
         required_specializations: List of required specializations
 
     Returns:
-        Filtered hospitals
+        Filtered hospitals offering any of the required specializations
     """
     if not required_specializations:
         return hospitals
 
-    filtered_hospitals = []
-    for hospital in hospitals:
-        hospital_specs = [
-            spec.strip().lower() for spec in hospital.specializations.split(",")
-        ]
-        if any(
-            req_spec.lower() in hospital_specs for req_spec in required_specializations
-        ):
-            filtered_hospitals.append(hospital)
+    specializations, _ = _lookup_specializations(required_specializations)
+    mask = Specialization.mask_for(
+        [s for s in specializations if s.bit < SPECIALIZATION_MASK_BITS]
+    )
+    overflow = [s for s in specializations if s.bit >= SPECIALIZATION_MASK_BITS]
+    linked = set()
+    if overflow:
+        linked = set(
+            HospitalSpecialization.objects.filter(
+                specialization__in=overflow
+            ).values_list("hospital_id", flat=True)
+        )
+
+    return [
+        hospital
+        for hospital in hospitals
+        if hospital.specialization_mask & mask
+        or (
+            hospital.specialization_mask & SPECIALIZATION_OVERFLOW
+            and hospital.id in linked
+        )
+    ]
 
-    return filtered_hospitals
+
+PHONE_MATCH_ORDER = ["patient", "emergency_contact", "additional_contact"]
+
+
+def phone_lookup_queryset(phone):
+    """
+    Build the query finding the users a phone number belongs to
+
+    The patient's own number, their emergency contact number and their
+    additional contacts' numbers are each matched through an index, as the
+    branches of a single UNION query. Each user carries a matched_as
+    annotation.
+
+    Args:
+        phone: E.164 phone number
+
+    Returns:
+        User QuerySet
+    """
+    branches = [
+        User.objects.filter(phone_e164=phone).annotate(matched_as=Value("patient")),
+        User.objects.filter(emergency_contact_phone_e164=phone).annotate(
+            matched_as=Value("emergency_contact")
+        ),
+        User.objects.filter(additional_emergency_contacts__phone_e164=phone).annotate(
+            matched_as=Value("additional_contact")
+        ),
+    ]
+    return branches[0].union(*branches[1:], all=True)
+
+
+def lookup_users_by_phone(phone):
+    """
+    Find the users a phone number belongs to
+
+    Args:
+        phone: E.164 phone number
+
+    Returns:
+        List of (user, matched_as) with patient matches first
+    """
+    return sorted(
+        ((user, user.matched_as) for user in phone_lookup_queryset(phone)),
+        key=lambda match: PHONE_MATCH_ORDER.index(match[1]),
+    )
 
 
 def mark_emergency_completed(emergency, completion_notes=None):
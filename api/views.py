@@ -2,20 +2,31 @@
 API Views for Elderly Healthcare System
 """
 
+from django.conf import settings
 from django.contrib.auth import login, logout
+from django.core.files.storage import default_storage
+from django.db import DEFAULT_DB_ALIAS
 from django.db.models import Q
+from django.http import FileResponse, Http404, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
 from django.utils import timezone
+from django.utils.http import content_disposition_header
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import status, viewsets
 from rest_framework.authtoken.models import Token
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.filters import OrderingFilter, SearchFilter
-from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 from rest_framework.views import APIView
 
 from db.models import (
     Ambulance,
+    ArchivedEmergency,
+    ArchivedNotification,
+    AttachmentUpload,
     Emergency,
     EmergencyContact,
     Hospital,
@@ -23,30 +34,302 @@ from db.models import (
     Notification,
     User,
 )
+from db.sharding import (
+    fan_out,
+    forget_shard_location,
+    locate_shard,
+    mirror_row,
+    region_for_shard,
+    shard_for_location,
+    shard_for_region,
+    shard_for_state,
+    use_shard,
+)
 
+from .archive import get_emergency_history
+from .attachments import (
+    UploadError,
+    attachment_response,
+    complete_upload,
+    create_upload,
+    discard_upload,
+    write_chunk,
+)
+from .autocomplete import hospital_autocomplete
+from .exports import (
+    EXPORT_CONTENT_TYPES,
+    archived_export_queryset,
+    export_filename,
+    filter_export_period,
+    stream_export,
+)
+from .feed import format_feed_cursor, notify_hospital_feed, poll_hospital_feed
+from .imports import IMPORT_CONTENT_TYPES, import_hospitals
+from .permissions import (
+    CanReportLocation,
+    IsHospitalOperator,
+    can_report_location,
+    is_hospital_operator,
+)
+from .registry import ambulance_registry
+from .renditions import (
+    RENDITION_FORMATS,
+    generate_renditions,
+    rendition_name,
+    rendition_sizes,
+)
+from .search import MedicalRecordSearchFilter, search_medical_records
 from .serializers import (
+    AmbulanceHistorySerializer,
+    AmbulanceLocationBatchSerializer,
     AmbulanceSerializer,
+    AttachmentUploadSerializer,
     EmergencyContactSerializer,
     EmergencyCreateSerializer,
     EmergencyResponseSerializer,
     EmergencySerializer,
     EmergencyStatusUpdateSerializer,
+    ExportSerializer,
+    HospitalAutocompleteSerializer,
+    HospitalEmergencySerializer,
+    HospitalFeedSerializer,
+    HospitalNotificationSerializer,
     HospitalSerializer,
     LoginSerializer,
+    MedicalRecordSearchSerializer,
     MedicalRecordSerializer,
     NearbyHospitalsSerializer,
+    NearestAmbulancesSerializer,
     NotificationSerializer,
+    PhoneLookupSerializer,
+    RefreshTokenSerializer,
     UserRegistrationSerializer,
     UserSerializer,
 )
+from .tokens import issue_token_pair, revoke_refresh_tokens, rotate_refresh_token
+from .tracking import get_location_history, ingest_ambulance_locations, parse_fix
 from .utils import (
     create_emergency_notifications,
     dispatch_ambulance,
     find_nearby_hospitals,
+    lookup_users_by_phone,
     mark_emergency_completed,
     send_status_update_notifications,
 )
 
+ACTIVE_EMERGENCY_STATUSES = ["PENDING", "ACKNOWLEDGED", "DISPATCHED", "IN_PROGRESS"]
+UNREAD_NOTIFICATION_STATUSES = ["PENDING", "SENT", "DELIVERED"]
+
+
+class FannedOutRows:
+    """
+    A queryset's rows merged from every shard, read one slice at a time
+
+    Pagination counts the rows and slices out one page. Each shard returns
+    at most the first `stop` rows of the slice in the queryset's order, and
+    those are merged and sliced in Python. A page therefore costs
+    shards x (offset + page size) rows, not every matching row.
+    """
+
+    def __init__(self, queryset, ordering):
+        self.queryset = queryset
+        self.ordering = ordering
+
+    def count(self):
+        return sum(fan_out(lambda alias: self.queryset.count()).values())
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index : index + 1][0]
+
+        def load(alias):
+            return list(self.queryset.all()[: index.stop])
+
+        rows = [row for rows in fan_out(load).values() for row in rows]
+        for field in reversed(self.ordering):
+            name = field.lstrip("-")
+            rows.sort(
+                key=lambda row: (getattr(row, name) is not None, getattr(row, name)),
+                reverse=field.startswith("-"),
+            )
+        return rows[index]
+
+
+class RegionalShardMixin:
+    """
+    Run a viewset request against the regional shard holding its data
+
+    The shard comes from the X-Region header or ?region= parameter, else
+    the shard holding the object of a detail route (cached per process,
+    see db.sharding.locate_shard), else the shard of the user's registered
+    location. Actions that create regional data pick the
+    shard from the data itself by setting self.shard_scope.alias.
+
+    A patient's own rows follow where each emergency happened, so lists of
+    viewsets with fan_out_own_rows read every shard for non-staff users
+    unless a region is requested, merging one page at a time
+    (FannedOutRows).
+    """
+
+    # Whether non-staff list requests merge their rows from every shard
+    fan_out_own_rows = False
+    # Whether the request named its region explicitly
+    region_requested = False
+
+    def dispatch(self, request, *args, **kwargs):
+        with use_shard() as scope:
+            self.shard_scope = scope
+            return super().dispatch(request, *args, **kwargs)
+
+    # Whether the shard was found from the detail route's primary key
+    shard_located = False
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if getattr(settings, "DATABASE_SHARDS", {}):
+            self.shard_scope.alias = self.resolve_shard(request)
+
+    def get_object(self):
+        try:
+            return super().get_object()
+        except Http404:
+            # The row may have moved since its shard was cached
+            pk = self.kwargs.get(self.lookup_url_kwarg or self.lookup_field)
+            model = self.queryset.model
+            if not self.shard_located or not forget_shard_location(model, pk):
+                raise
+            alias = locate_shard(model, pk)
+            if alias is None or alias == self.shard_scope.alias:
+                raise
+            self.shard_scope.alias = alias
+            return super().get_object()
+
+    def resolve_shard(self, request):
+        """Pick the database alias for this request"""
+        region = request.headers.get("X-Region") or request.query_params.get("region")
+        if region:
+            alias = shard_for_region(region)
+            if alias is None:
+                raise ValidationError({"region": [f"Unknown region {region!r}"]})
+            self.region_requested = True
+            return alias
+
+        pk = self.kwargs.get(self.lookup_url_kwarg or self.lookup_field)
+        if pk is not None:
+            alias = locate_shard(self.queryset.model, pk)
+            if alias is not None:
+                self.shard_located = True
+                return alias
+
+        if request.user.is_authenticated:
+            # Read from the claims of a signed access token
+            return shard_for_region(request.user.get_home_region()) or DEFAULT_DB_ALIAS
+        return DEFAULT_DB_ALIAS
+
+    def list(self, request, *args, **kwargs):
+        if (
+            not self.fan_out_own_rows
+            or request.user.is_staff
+            or self.region_requested
+            or not getattr(settings, "DATABASE_SHARDS", {})
+        ):
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        ordering = OrderingFilter().get_ordering(request, queryset, self)
+        rows = FannedOutRows(queryset, ordering or queryset.model._meta.ordering)
+
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+        return Response(self.get_serializer(rows[:], many=True).data)
+
+
+class StreamingExportMixin:
+    """
+    Stream the viewset's filtered list as NDJSON or CSV (staff only)
+
+    The export reads every shard unless a region is requested, and takes
+    the viewset's filter, search and ordering parameters plus those of
+    ExportSerializer; the output format is ?file_format=, as ?format= is
+    DRF's renderer override. Archived rows matching the filters and search
+    follow each shard's live rows.
+    """
+
+    # Key of api.exports.EXPORT_DATASETS
+    export_dataset = None
+
+    @action(
+        detail=False,
+        methods=["get"],
+        url_path="export",
+        permission_classes=[IsAdminUser],
+    )
+    def export(self, request):
+        """Stream the filtered list as compressed NDJSON or CSV"""
+        serializer = ExportSerializer(data=request.query_params)
+
+        if serializer.is_valid():
+            options = serializer.validated_data
+            queryset = filter_export_period(
+                self.filter_queryset(self.get_queryset()),
+                month=options.get("month"),
+                created_after=options.get("created_after"),
+                created_before=options.get("created_before"),
+            )
+            archived = filter_export_period(
+                archived_export_queryset(
+                    self.export_dataset,
+                    {
+                        field: request.query_params[field]
+                        for field in self.filterset_fields
+                        if field in request.query_params
+                    },
+                    self.search_fields,
+                    request.query_params.get(api_settings.SEARCH_PARAM, ""),
+                ),
+                month=options.get("month"),
+                created_after=options.get("created_after"),
+                created_before=options.get("created_before"),
+            )
+            region = request.headers.get("X-Region") or request.query_params.get(
+                "region"
+            )
+            aliases = (
+                [self.shard_scope.alias] if region and self.shard_scope.alias else None
+            )
+            response = StreamingHttpResponse(
+                stream_export(
+                    self.export_dataset,
+                    queryset,
+                    options["file_format"],
+                    compress=options["compress"],
+                    aliases=aliases,
+                    archived=archived,
+                ),
+                content_type=(
+                    "application/gzip"
+                    if options["compress"]
+                    else EXPORT_CONTENT_TYPES[options["file_format"]]
+                ),
+            )
+            response["Content-Disposition"] = content_disposition_header(
+                True,
+                export_filename(
+                    self.export_dataset,
+                    options["file_format"],
+                    options["compress"],
+                    options.get("month"),
+                ),
+            )
+            return response
+
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
 
 class AuthViewSet(viewsets.GenericViewSet):
     """Authentication ViewSet"""
@@ -82,12 +365,27 @@ class AuthViewSet(viewsets.GenericViewSet):
                 {
                     "user": UserSerializer(user).data,
                     "token": token.key,
+                    **issue_token_pair(user),
                     "message": "Login successful",
                 },
                 status=status.HTTP_200_OK,
             )
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @action(detail=False, methods=["post"], url_path="refresh")
+    def refresh_token(self, request):
+        """Exchange a refresh token for a new access and refresh token"""
+        serializer = RefreshTokenSerializer(data=request.data)
+        if serializer.is_valid():
+            tokens = rotate_refresh_token(serializer.validated_data["refresh_token"])
+            if tokens is None:
+                return Response(
+                    {"error": "Invalid or expired refresh token"},
+                    status=status.HTTP_401_UNAUTHORIZED,
+                )
+            return Response(tokens)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
     @action(detail=False, methods=["post"], url_path="logout")
     def logout_user(self, request):
         """User logout"""
@@ -97,6 +395,7 @@ class AuthViewSet(viewsets.GenericViewSet):
                 token.delete()
             except Token.DoesNotExist:
                 pass
+            revoke_refresh_tokens(request.user)
             logout(request)
         return Response({"message": "Logout successful"}, status=status.HTTP_200_OK)
 
@@ -124,6 +423,32 @@ class UserViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(request.user)
         return Response(serializer.data)
 
+    @action(
+        detail=False,
+        methods=["get"],
+        url_path="lookup-by-phone",
+        permission_classes=[IsAdminUser],
+    )
+    def lookup_by_phone(self, request):
+        """Resolve a caller's phone number to patients"""
+        serializer = PhoneLookupSerializer(data=request.query_params)
+
+        if serializer.is_valid():
+            phone = serializer.validated_data["phone"]
+            matches = lookup_users_by_phone(phone)
+            return Response(
+                {
+                    "phone": phone,
+                    "matches": [
+                        {"matched_as": matched_as, "user": UserSerializer(user).data}
+                        for user, matched_as in matches
+                    ],
+                    "count": len(matches),
+                }
+            )
+
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
     @action(detail=False, methods=["patch"], url_path="update-profile")
     def update_profile(self, request):
         """Update current user profile"""
@@ -133,13 +458,40 @@ class UserViewSet(viewsets.ModelViewSet):
             return Response(serializer.data)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @action(
+        detail=True,
+        methods=["get"],
+        url_path=r"profile-picture/(?P<size>[a-z]+)/(?P<image_format>webp|jpeg)",
+        url_name="profile-picture-rendition",
+    )
+    def profile_picture_rendition(self, request, pk=None, size=None, image_format=None):
+        """Serve a resized profile picture, building it on first request"""
+        user = self.get_object()
+        if not user.profile_picture or size not in rendition_sizes():
+            return Response(
+                {"error": "No such profile picture rendition"},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+        if not generate_renditions(user.profile_picture):
+            return Response(
+                {"error": "Profile picture cannot be read as an image"},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+
+        name = rendition_name(user.profile_picture.name, size, image_format)
+        response = FileResponse(
+            default_storage.open(name, "rb"),
+            content_type=RENDITION_FORMATS[image_format][1],
+        )
+        # Rendition URLs carry the picture's key, so a new picture gets new URLs
+        response["Cache-Control"] = "private, max-age=31536000, immutable"
+        return response
+
     @action(detail=True, methods=["get"], url_path="emergency-history")
     def emergency_history(self, request, pk=None):
         """Get user's emergency history"""
         user = self.get_object()
-        emergencies = user.emergencies.all()
-        serializer = EmergencySerializer(emergencies, many=True)
-        return Response(serializer.data)
+        return Response(get_emergency_history(user))
 
     @action(detail=True, methods=["get"], url_path="medical-records")
     def medical_records(self, request, pk=None):
@@ -150,7 +502,7 @@ class UserViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
 
-class HospitalViewSet(viewsets.ModelViewSet):
+class HospitalViewSet(RegionalShardMixin, viewsets.ModelViewSet):
     """Hospital management ViewSet"""
 
     queryset = Hospital.objects.filter(is_active=True)
@@ -167,11 +519,61 @@ class HospitalViewSet(viewsets.ModelViewSet):
         "operates_24x7",
     ]
 
+    def get_queryset(self):
+        """Hospitals of the request's region, without other shards' copies"""
+        return super().get_queryset().regional()
+
+    def perform_create(self, serializer):
+        """Create the hospital in the shard of its state"""
+        self.shard_scope.alias = shard_for_state(serializer.validated_data["state"])
+        serializer.save()
+
+    @action(detail=False, methods=["get"])
+    def autocomplete(self, request):
+        """Suggest hospitals by name or city prefix from the in-memory index"""
+        serializer = HospitalAutocompleteSerializer(data=request.query_params)
+
+        if serializer.is_valid():
+            suggestions = hospital_autocomplete.suggest(
+                serializer.validated_data["q"],
+                limit=serializer.validated_data["limit"],
+            )
+            return Response({"results": suggestions, "count": len(suggestions)})
+
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    @action(
+        detail=False,
+        methods=["post"],
+        url_path="import",
+        permission_classes=[IsAdminUser],
+    )
+    def import_directory(self, request):
+        """Upsert hospitals from a streamed CSV or NDJSON request body"""
+        content_type = request.content_type.split(";")[0].strip().lower()
+        file_format = IMPORT_CONTENT_TYPES.get(content_type)
+        if file_format is None:
+            return Response(
+                {"error": "Send text/csv or application/x-ndjson"},
+                status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            )
+        if request.stream is None:
+            return Response(
+                {"error": "Request body is empty"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        report = import_hospitals(request.stream, file_format)
+        return Response(report.as_dict())
+
     @action(detail=False, methods=["post"], url_path="nearby")
     def nearby_hospitals(self, request):
         """Find nearby hospitals"""
         serializer = NearbyHospitalsSerializer(data=request.data)
         if serializer.is_valid():
+            self.shard_scope.alias = shard_for_location(
+                serializer.validated_data["latitude"],
+                serializer.validated_data["longitude"],
+            )
             hospitals = find_nearby_hospitals(
                 latitude=serializer.validated_data["latitude"],
                 longitude=serializer.validated_data["longitude"],
@@ -182,6 +584,7 @@ class HospitalViewSet(viewsets.ModelViewSet):
                 available_ambulance_only=serializer.validated_data.get(
                     "available_ambulance_only", True
                 ),
+                specializations=serializer.validated_data.get("specializations"),
             )
             hospital_serializer = HospitalSerializer(hospitals, many=True)
             return Response(
@@ -197,14 +600,56 @@ class HospitalViewSet(viewsets.ModelViewSet):
         serializer = AmbulanceSerializer(ambulances, many=True)
         return Response(serializer.data)
 
-    @action(detail=True, methods=["get"], url_path="emergencies")
+    @action(
+        detail=True,
+        methods=["get"],
+        url_path="emergencies",
+        permission_classes=[IsAuthenticated, IsHospitalOperator],
+    )
     def hospital_emergencies(self, request, pk=None):
         """Get hospital's emergency requests"""
         hospital = self.get_object()
         emergencies = hospital.emergencies.all()
-        serializer = EmergencySerializer(emergencies, many=True)
+        serializer = HospitalEmergencySerializer(emergencies, many=True)
         return Response(serializer.data)
 
+    @action(
+        detail=True,
+        methods=["get"],
+        url_path="feed",
+        permission_classes=[IsAuthenticated, IsHospitalOperator],
+    )
+    def hospital_feed(self, request, pk=None):
+        """Get hospital's notifications and emergencies changed since a cursor"""
+        hospital = self.get_object()
+        serializer = HospitalFeedSerializer(data=request.query_params)
+
+        if serializer.is_valid():
+            wait = min(
+                serializer.validated_data["wait"],
+                getattr(settings, "HOSPITAL_FEED_MAX_WAIT", 30),
+            )
+            notifications, emergencies, cursor, has_more = poll_hospital_feed(
+                hospital,
+                since=serializer.validated_data.get("since"),
+                limit=serializer.validated_data["limit"],
+                wait=wait,
+            )
+            return Response(
+                {
+                    "notifications": HospitalNotificationSerializer(
+                        notifications, many=True
+                    ).data,
+                    "emergencies": HospitalEmergencySerializer(
+                        emergencies, many=True
+                    ).data,
+                    "cursor": format_feed_cursor(cursor),
+                    "has_more": has_more,
+                }
+            )
+
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
     @action(detail=True, methods=["post"], url_path="respond-emergency")
     def respond_to_emergency(self, request, pk=None):
         """Hospital responds to emergency request"""
@@ -232,10 +677,16 @@ class HospitalViewSet(viewsets.ModelViewSet):
                         ]
                         emergency.save()
 
+                    # Only the hospital's operators see the patient's card
+                    emergency_serializer = (
+                        HospitalEmergencySerializer
+                        if is_hospital_operator(request.user, hospital)
+                        else EmergencySerializer
+                    )
                     return Response(
                         {
                             "message": message,
-                            "emergency": EmergencySerializer(emergency).data,
+                            "emergency": emergency_serializer(emergency).data,
                         }
                     )
                 else:
@@ -252,9 +703,12 @@ class HospitalViewSet(viewsets.ModelViewSet):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
-class EmergencyViewSet(viewsets.ModelViewSet):
+class EmergencyViewSet(RegionalShardMixin, StreamingExportMixin, viewsets.ModelViewSet):
     """Emergency management ViewSet"""
 
+    fan_out_own_rows = True
+    export_dataset = "emergencies"
+
     queryset = Emergency.objects.all()
     serializer_class = EmergencySerializer
     permission_classes = [IsAuthenticated]
@@ -274,6 +728,8 @@ class EmergencyViewSet(viewsets.ModelViewSet):
         """Return appropriate serializer based on action"""
         if self.action == "create":
             return EmergencyCreateSerializer
+        if self.request.user.is_staff:
+            return HospitalEmergencySerializer
         return EmergencySerializer
 
     def create(self, request, *args, **kwargs):
@@ -282,6 +738,20 @@ class EmergencyViewSet(viewsets.ModelViewSet):
             data=request.data, context={"request": request}
         )
         if serializer.is_valid():
+            # The emergency lives in the shard of where it happens
+            location = request.user.get_location()
+            if (
+                serializer.validated_data.get("location_latitude") is not None
+                and serializer.validated_data.get("location_longitude") is not None
+            ):
+                location = (
+                    serializer.validated_data["location_latitude"],
+                    serializer.validated_data["location_longitude"],
+                )
+            alias = shard_for_location(*location) if location else DEFAULT_DB_ALIAS
+            self.shard_scope.alias = alias
+            mirror_row(request.user, alias)
+
             emergency = serializer.save()
 
             # Create notifications for nearby hospitals and emergency contacts
@@ -290,6 +760,7 @@ class EmergencyViewSet(viewsets.ModelViewSet):
             return Response(
                 {
                     "emergency": EmergencySerializer(emergency).data,
+                    "region": region_for_shard(alias),
                     "notifications_sent": len(notifications),
                     "message": f"Emergency request created. {len(notifications)} notifications sent.",
                 },
@@ -358,13 +829,21 @@ class EmergencyViewSet(viewsets.ModelViewSet):
         """Get notifications for this emergency"""
         emergency = self.get_object()
         notifications = emergency.notifications.all()
-        serializer = NotificationSerializer(notifications, many=True)
+        if request.user.is_staff:
+            serializer = HospitalNotificationSerializer(notifications, many=True)
+        else:
+            serializer = NotificationSerializer(notifications, many=True)
         return Response(serializer.data)
 
 
-class NotificationViewSet(viewsets.ModelViewSet):
+class NotificationViewSet(
+    RegionalShardMixin, StreamingExportMixin, viewsets.ModelViewSet
+):
     """Notification management ViewSet"""
 
+    fan_out_own_rows = True
+    export_dataset = "notifications"
+
     queryset = Notification.objects.all()
     serializer_class = NotificationSerializer
     permission_classes = [IsAuthenticated]
@@ -386,6 +865,12 @@ class NotificationViewSet(viewsets.ModelViewSet):
             else Q(user=user)
         )
 
+    def get_serializer_class(self):
+        """Staff see the emergency card on hospital notifications"""
+        if self.request.user.is_staff:
+            return HospitalNotificationSerializer
+        return NotificationSerializer
+
     @action(detail=True, methods=["post"], url_path="mark-read")
     def mark_as_read(self, request, pk=None):
         """Mark notification as read"""
@@ -403,11 +888,15 @@ class NotificationViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=["post"], url_path="mark-all-read")
     def mark_all_read(self, request):
         """Mark all notifications as read"""
-        updated = (
-            self.get_queryset()
-            .exclude(status="READ")
-            .update(status="READ", read_at=timezone.now())
+        unread = self.get_queryset().exclude(status="READ")
+        hospital_ids = set(
+            unread.exclude(hospital=None).values_list("hospital_id", flat=True)
         )
+        # Bump updated_at so hospital feed cursors see the change
+        now = timezone.now()
+        updated = unread.update(status="READ", read_at=now, updated_at=now)
+        for hospital_id in hospital_ids:
+            notify_hospital_feed(hospital_id)
         return Response({"message": f"{updated} notifications marked as read"})
 
 
@@ -417,8 +906,7 @@ class MedicalRecordViewSet(viewsets.ModelViewSet):
     queryset = MedicalRecord.objects.all()
     serializer_class = MedicalRecordSerializer
     permission_classes = [IsAuthenticated]
-    filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
-    search_fields = ["diagnosis", "treatment", "doctor_name"]
+    filter_backends = [DjangoFilterBackend, MedicalRecordSearchFilter, OrderingFilter]
     ordering_fields = ["visit_date", "created_at"]
     filterset_fields = ["record_type", "hospital", "patient"]
 
@@ -429,8 +917,126 @@ class MedicalRecordViewSet(viewsets.ModelViewSet):
             return MedicalRecord.objects.all()
         return MedicalRecord.objects.filter(patient=user)
 
+    def list(self, request, *args, **kwargs):
+        """List medical records, flagging a ?search= cut at its match limit"""
+        response = super().list(request, *args, **kwargs)
+        truncated = getattr(request, "search_truncated", None)
+        if truncated is not None and isinstance(response.data, dict):
+            response.data["search_truncated"] = truncated
+        return response
+
+    @action(detail=True, methods=["post"], url_path="attachment-uploads")
+    def start_attachment_upload(self, request, pk=None):
+        """Start a chunked, resumable upload of the record's attachment"""
+        record = self.get_object()
+        serializer = AttachmentUploadSerializer(data=request.data)
+
+        if serializer.is_valid():
+            upload = create_upload(record, request.user, **serializer.validated_data)
+            return Response(
+                AttachmentUploadSerializer(upload).data,
+                status=status.HTTP_201_CREATED,
+            )
+
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    @action(
+        detail=True,
+        methods=["get", "put", "delete"],
+        url_path=r"attachment-uploads/(?P<upload_id>[0-9a-f-]+)",
+    )
+    def attachment_upload(self, request, pk=None, upload_id=None):
+        """Get upload progress, send the next chunk, or cancel an upload"""
+        record = self.get_object()
+        upload = get_object_or_404(record.attachment_uploads, id=upload_id)
+
+        if request.method == "DELETE":
+            discard_upload(upload)
+            return Response(status=status.HTTP_204_NO_CONTENT)
+
+        if request.method == "PUT":
+            try:
+                offset = int(request.headers.get("Upload-Offset", ""))
+                length = int(request.headers.get("Content-Length", ""))
+            except ValueError:
+                return Response(
+                    {"error": "Upload-Offset and Content-Length are required"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            try:
+                upload = write_chunk(
+                    upload,
+                    offset,
+                    request.stream,
+                    length,
+                    request.headers.get("Upload-Checksum", ""),
+                )
+                if upload.received == upload.size:
+                    record = complete_upload(upload)
+                    return Response(
+                        {
+                            "complete": True,
+                            "record": MedicalRecordSerializer(record).data,
+                        }
+                    )
+            except UploadError as error:
+                upload = AttachmentUpload.objects.filter(id=upload.id).first()
+                return Response(
+                    {
+                        "error": str(error),
+                        "received": upload.received if upload else None,
+                    },
+                    status=error.status,
+                )
+
+        return Response({"complete": False, **AttachmentUploadSerializer(upload).data})
+
+    @action(detail=True, methods=["get"], url_path="attachment")
+    def download_attachment(self, request, pk=None):
+        """Stream the record's attachment, supporting HTTP Range requests"""
+        record = self.get_object()
+        if not record.attachments:
+            return Response(
+                {"error": "Record has no attachment"},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+        return attachment_response(record, request.headers.get("Range"))
+
+    @action(detail=False, methods=["get"])
+    def search(self, request):
+        """Rank medical records by full-text relevance with highlighted snippets"""
+        serializer = MedicalRecordSearchSerializer(data=request.query_params)
+
+        if serializer.is_valid():
+            if request.user.is_staff:
+                patient_id = serializer.validated_data.get("patient")
+            else:
+                patient_id = request.user.pk
+            limit = serializer.validated_data["limit"]
+            matches = search_medical_records(
+                serializer.validated_data["q"], patient_id=patient_id, limit=limit + 1
+            )
+            truncated = len(matches) > limit
+            matches = matches[:limit]
+            records = self.get_queryset().in_bulk(
+                [record_id for record_id, _, _ in matches]
+            )
+            matches = [match for match in matches if match[0] in records]
+            data = MedicalRecordSerializer(
+                [records[record_id] for record_id, _, _ in matches], many=True
+            ).data
+            results = [
+                {**record, "rank": rank, "snippet": snippet}
+                for record, (_, rank, snippet) in zip(data, matches)
+            ]
+            return Response(
+                {"results": results, "count": len(results), "truncated": truncated}
+            )
+
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-class AmbulanceViewSet(viewsets.ModelViewSet):
+
+class AmbulanceViewSet(RegionalShardMixin, viewsets.ModelViewSet):
     """Ambulance management ViewSet"""
 
     queryset = Ambulance.objects.all()
@@ -441,7 +1047,26 @@ class AmbulanceViewSet(viewsets.ModelViewSet):
     ordering_fields = ["vehicle_number", "status", "created_at"]
     filterset_fields = ["status", "hospital", "has_ventilator", "has_defibrillator"]
 
-    @action(detail=True, methods=["post"], url_path="update-location")
+    def perform_create(self, serializer):
+        """Copy the driver's account to the ambulance's shard before saving"""
+        driver = serializer.validated_data.get("driver")
+        if driver is not None:
+            mirror_row(driver, self.shard_scope.alias or DEFAULT_DB_ALIAS)
+        serializer.save()
+
+    def perform_update(self, serializer):
+        """Copy a newly assigned driver's account to the ambulance's shard"""
+        driver = serializer.validated_data.get("driver")
+        if driver is not None:
+            mirror_row(driver, serializer.instance._state.db)
+        serializer.save()
+
+    @action(
+        detail=True,
+        methods=["post"],
+        url_path="update-location",
+        permission_classes=[IsAuthenticated, CanReportLocation],
+    )
     def update_location(self, request, pk=None):
         """Update ambulance current location"""
         ambulance = self.get_object()
@@ -449,10 +1074,28 @@ class AmbulanceViewSet(viewsets.ModelViewSet):
         longitude = request.data.get("longitude")
 
         if latitude and longitude:
-            ambulance.current_latitude = latitude
-            ambulance.current_longitude = longitude
-            ambulance.save()
+            # Fixes carry device time like the bulk path; clients that do
+            # not send one are stamped with the time of receipt
+            fix = parse_fix(
+                (
+                    ambulance.vehicle_number,
+                    latitude,
+                    longitude,
+                    request.data.get("timestamp") or timezone.now().isoformat(),
+                )
+            )
+            if fix is None:
+                return Response(
+                    {"error": "Invalid latitude, longitude or timestamp"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            if not ingest_ambulance_locations([fix]):
+                return Response(
+                    {"error": "Location is stale or older than the stored one"},
+                    status=status.HTTP_409_CONFLICT,
+                )
 
+            ambulance.refresh_from_db()
             return Response(
                 {
                     "message": "Location updated successfully",
@@ -465,6 +1108,104 @@ class AmbulanceViewSet(viewsets.ModelViewSet):
             status=status.HTTP_400_BAD_REQUEST,
         )
 
+    @action(detail=False, methods=["post"], url_path="bulk-location")
+    def bulk_location(self, request):
+        """Ingest a batch of ambulance GPS fixes"""
+        serializer = AmbulanceLocationBatchSerializer(data=request.data)
+
+        if serializer.is_valid():
+            fixes = serializer.validated_data["fixes"]
+            if not request.user.is_staff:
+                ambulances = Ambulance.objects.filter(
+                    vehicle_number__in={fix[0] for fix in fixes}
+                )
+                denied = sorted(
+                    ambulance.vehicle_number
+                    for ambulance in ambulances
+                    if not can_report_location(request.user, ambulance)
+                )
+                if denied:
+                    return Response(
+                        {
+                            "error": "Not allowed to report these ambulances",
+                            "vehicle_numbers": denied,
+                        },
+                        status=status.HTTP_403_FORBIDDEN,
+                    )
+            accepted = ingest_ambulance_locations(fixes)
+            return Response(
+                {"accepted": len(accepted), "dropped": len(fixes) - len(accepted)}
+            )
+
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    @action(detail=True, methods=["get"], url_path="history")
+    def location_history(self, request, pk=None):
+        """Get ambulance location history for a time range"""
+        ambulance = self.get_object()
+        serializer = AmbulanceHistorySerializer(data=request.query_params)
+
+        if serializer.is_valid():
+            points = get_location_history(
+                ambulance,
+                serializer.validated_data["start"],
+                serializer.validated_data["end"],
+                resolution=serializer.validated_data.get("resolution"),
+            )
+            return Response(
+                {
+                    "points": [
+                        [timestamp.isoformat(), latitude, longitude]
+                        for timestamp, latitude, longitude in points
+                    ],
+                    "count": len(points),
+                }
+            )
+
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    @action(detail=False, methods=["get"], url_path="nearest")
+    def nearest_ambulances(self, request):
+        """Find the nearest available ambulances to a point or emergency"""
+        serializer = NearestAmbulancesSerializer(data=request.query_params)
+
+        if serializer.is_valid():
+            if "latitude" in serializer.validated_data:
+                location = (
+                    serializer.validated_data["latitude"],
+                    serializer.validated_data["longitude"],
+                )
+            else:
+                # Scoped like EmergencyViewSet.get_queryset
+                emergencies = Emergency.objects.all()
+                if not request.user.is_staff:
+                    emergencies = emergencies.filter(patient=request.user)
+                try:
+                    emergency = emergencies.get(
+                        id=serializer.validated_data["emergency_id"]
+                    )
+                except Emergency.DoesNotExist:
+                    return Response(
+                        {"error": "Emergency not found"},
+                        status=status.HTTP_404_NOT_FOUND,
+                    )
+                location = emergency.get_emergency_location()
+                if not location:
+                    return Response(
+                        {"error": "Emergency has no location"},
+                        status=status.HTTP_400_BAD_REQUEST,
+                    )
+
+            ambulances = ambulance_registry.nearest(
+                location[0],
+                location[1],
+                count=serializer.validated_data["count"],
+                ventilator=serializer.validated_data["ventilator"],
+            )
+            return Response({"ambulances": ambulances, "count": len(ambulances)})
+
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
     @action(detail=False, methods=["get"], url_path="available")
     def available_ambulances(self, request):
         """Get available ambulances"""
@@ -506,39 +1247,65 @@ class DashboardAPIView(APIView):
         user = request.user
 
         if user.is_staff:
-            # Admin dashboard
+            # Admin dashboard; regional counts fan out across the shards
+            def regional_counts(alias):
+                # Totals include emergencies and notifications moved to the
+                # archive, counted by the status they were archived with
+                return {
+                    "total_emergencies": Emergency.objects.count()
+                    + ArchivedEmergency.objects.count(),
+                    "active_emergencies": Emergency.objects.filter(
+                        status__in=ACTIVE_EMERGENCY_STATUSES
+                    ).count(),
+                    "completed_emergencies": Emergency.objects.filter(
+                        status="COMPLETED"
+                    ).count()
+                    + ArchivedEmergency.objects.filter(status="COMPLETED").count(),
+                    "available_ambulances": Ambulance.objects.filter(
+                        status="AVAILABLE"
+                    ).count(),
+                    "pending_notifications": Notification.objects.filter(
+                        status="PENDING"
+                    ).count()
+                    + ArchivedNotification.objects.filter(
+                        data__status="PENDING"
+                    ).count(),
+                }
+
             data = {
                 "total_users": User.objects.count(),
+                # The default database holds a directory copy of every hospital
                 "total_hospitals": Hospital.objects.count(),
-                "total_emergencies": Emergency.objects.count(),
-                "active_emergencies": Emergency.objects.filter(
-                    status__in=["PENDING", "ACKNOWLEDGED", "DISPATCHED", "IN_PROGRESS"]
-                ).count(),
-                "completed_emergencies": Emergency.objects.filter(
-                    status="COMPLETED"
-                ).count(),
-                "available_ambulances": Ambulance.objects.filter(
-                    status="AVAILABLE"
-                ).count(),
-                "pending_notifications": Notification.objects.filter(
-                    status="PENDING"
-                ).count(),
             }
         else:
             # User dashboard
+            def regional_counts(alias):
+                emergencies = Emergency.objects.filter(patient=user)
+                archived = ArchivedEmergency.objects.filter(patient=user)
+                return {
+                    "my_emergencies": emergencies.count() + archived.count(),
+                    "active_emergencies": emergencies.filter(
+                        status__in=ACTIVE_EMERGENCY_STATUSES
+                    ).count(),
+                    "completed_emergencies": emergencies.filter(
+                        status="COMPLETED"
+                    ).count()
+                    + archived.filter(status="COMPLETED").count(),
+                    "unread_notifications": Notification.objects.filter(
+                        user=user, status__in=UNREAD_NOTIFICATION_STATUSES
+                    ).count()
+                    + ArchivedNotification.objects.filter(
+                        user_id=user.pk, data__status__in=UNREAD_NOTIFICATION_STATUSES
+                    ).count(),
+                }
+
             data = {
-                "my_emergencies": user.emergencies.count(),
-                "active_emergencies": user.emergencies.filter(
-                    status__in=["PENDING", "ACKNOWLEDGED", "DISPATCHED", "IN_PROGRESS"]
-                ).count(),
-                "completed_emergencies": user.emergencies.filter(
-                    status="COMPLETED"
-                ).count(),
                 "my_medical_records": user.medical_records.count(),
                 "emergency_contacts": user.additional_emergency_contacts.count(),
-                "unread_notifications": Notification.objects.filter(
-                    user=user, status__in=["PENDING", "SENT", "DELIVERED"]
-                ).count(),
             }
 
+        for counts in fan_out(regional_counts).values():
+            for key, value in counts.items():
+                data[key] = data.get(key, 0) + value
+
         return Response(data)
@@ -10,8 +10,13 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import json
+import os
+import sys
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -55,6 +60,7 @@ MIDDLEWARE = [
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "api.middleware.ReplicaRoutingMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -81,13 +87,127 @@ WSGI_APPLICATION = "config.wsgi.application"
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
-
-DATABASES = {
-    "default": {
-        "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
+#
+# DATABASE_PROFILE selects the backend:
+# - "sqlite" (default): WAL journal with tuned pragmas applied on connect
+# - "postgres": persistent connections with health checks, or a psycopg
+#   connection pool when POSTGRES_POOL=1 (requires psycopg[pool])
+#
+# Read replicas are added as "replica1", "replica2", ... from
+# SQLITE_REPLICA_PATHS or POSTGRES_REPLICA_HOSTS (comma-separated), with the
+# same options as the primary. Safe requests to the API viewsets read from
+# them; see db/routers.py and api/middleware.py.
+#
+# Regional shards are added as "shard_<region>" from SQLITE_SHARD_PATHS or
+# POSTGRES_SHARD_HOSTS ("north=/data/north.sqlite3,south=..."), and
+# DATABASE_SHARD_REGIONS (JSON) lists the states and lat/lon bounding boxes
+# of each region, e.g. {"north": {"states": ["Punjab"],
+# "bounds": [[28.0, 73.0, 33.0, 78.0]]}}. See db/sharding.py.
+
+DATABASE_PROFILE = os.environ.get("DATABASE_PROFILE", "sqlite")
+
+if DATABASE_PROFILE == "postgres":
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.postgresql",
+            "NAME": os.environ.get("POSTGRES_DB", "patient_management"),
+            "USER": os.environ.get("POSTGRES_USER", "postgres"),
+            "PASSWORD": os.environ.get("POSTGRES_PASSWORD", ""),
+            "HOST": os.environ.get("POSTGRES_HOST", "localhost"),
+            "PORT": os.environ.get("POSTGRES_PORT", "5432"),
+            "CONN_MAX_AGE": int(os.environ.get("POSTGRES_CONN_MAX_AGE", "600")),
+            "CONN_HEALTH_CHECKS": True,
+            "OPTIONS": {},
+        }
     }
-}
+    if os.environ.get("POSTGRES_POOL") == "1":
+        # Pooling and persistent connections are mutually exclusive
+        DATABASES["default"]["CONN_MAX_AGE"] = 0
+        DATABASES["default"]["OPTIONS"]["pool"] = {
+            "min_size": int(os.environ.get("POSTGRES_POOL_MIN_SIZE", "2")),
+            "max_size": int(os.environ.get("POSTGRES_POOL_MAX_SIZE", "20")),
+        }
+elif DATABASE_PROFILE == "sqlite":
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": os.environ.get("SQLITE_PATH", BASE_DIR / "db.sqlite3"),
+            "OPTIONS": {
+                # Seconds to wait for a write lock before "database is locked"
+                "timeout": 20,
+                # Take the write lock up front so readers never need upgrading
+                "transaction_mode": "IMMEDIATE",
+                "init_command": (
+                    "PRAGMA journal_mode=WAL;"
+                    "PRAGMA synchronous=NORMAL;"
+                    "PRAGMA mmap_size=268435456;"  # 256 MiB
+                    "PRAGMA cache_size=-65536;"  # 64 MiB
+                    "PRAGMA temp_store=MEMORY;"
+                    "PRAGMA busy_timeout=20000;"
+                ),
+            },
+        }
+    }
+else:
+    raise ImproperlyConfigured(f"Unknown DATABASE_PROFILE {DATABASE_PROFILE!r}")
+
+# Extra databases copy the primary's settings with a different HOST or NAME
+if DATABASE_PROFILE == "postgres":
+    _location_key = "HOST"
+    _replica_setting, _shard_setting = "POSTGRES_REPLICA_HOSTS", "POSTGRES_SHARD_HOSTS"
+else:
+    _location_key = "NAME"
+    _replica_setting, _shard_setting = "SQLITE_REPLICA_PATHS", "SQLITE_SHARD_PATHS"
+
+DATABASE_REPLICAS = []
+for _index, _value in enumerate(
+    filter(None, os.environ.get(_replica_setting, "").split(",")), start=1
+):
+    DATABASES[f"replica{_index}"] = {
+        **DATABASES["default"],
+        "OPTIONS": dict(DATABASES["default"]["OPTIONS"]),
+        _location_key: _value.strip(),
+        "TEST": {"MIRROR": "default"},
+    }
+    DATABASE_REPLICAS.append(f"replica{_index}")
+
+DATABASE_SHARD_REGIONS = json.loads(os.environ.get("DATABASE_SHARD_REGIONS", "{}"))
+DATABASE_SHARDS = {}  # region name -> database alias
+for _value in filter(None, os.environ.get(_shard_setting, "").split(",")):
+    _region, _, _value = _value.partition("=")
+    _region = _region.strip()
+    if _region not in DATABASE_SHARD_REGIONS:
+        raise ImproperlyConfigured(
+            f"Shard region {_region!r} is missing from DATABASE_SHARD_REGIONS"
+        )
+    DATABASES[f"shard_{_region}"] = {
+        **DATABASES["default"],
+        "OPTIONS": dict(DATABASES["default"]["OPTIONS"]),
+        _location_key: _value.strip(),
+    }
+    DATABASE_SHARDS[_region] = f"shard_{_region}"
+
+# Spare aliases for the shard and replica routing tests, which enable them
+# with override_settings. The test runner only creates databases for the
+# aliases a test case lists in `databases`.
+if sys.argv[1:2] == ["test"]:
+    for _alias in ("test_shard", "test_replica"):
+        DATABASES[_alias] = {
+            **DATABASES["default"],
+            "OPTIONS": dict(DATABASES["default"]["OPTIONS"]),
+        }
+        if DATABASE_PROFILE == "postgres":
+            _name = DATABASES["default"]["NAME"]
+            DATABASES[_alias]["TEST"] = {"NAME": f"test_{_name}_{_alias}"}
+
+DATABASE_ROUTERS = [
+    "db.routers.RegionalShardRouter",
+    "db.routers.PrimaryReplicaRouter",
+]
+# Seconds a client reads from the primary after its own write
+DATABASE_REPLICA_PIN_SECONDS = int(os.environ.get("DATABASE_REPLICA_PIN_SECONDS", "5"))
+# Primary keys of regional rows whose shard is cached per process
+SHARD_LOCATION_CACHE_SIZE = 100000
 
 
 # Password validation
@@ -137,7 +257,8 @@ AUTH_USER_MODEL = "db.User"
 # Django REST Framework settings
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": [
-        "rest_framework.authentication.TokenAuthentication",
+        "api.authentication.CachedTokenAuthentication",
+        "api.authentication.SignedTokenAuthentication",
         "rest_framework.authentication.SessionAuthentication",
     ],
     "DEFAULT_PERMISSION_CLASSES": [
@@ -174,3 +295,92 @@ SPECTACULAR_SETTINGS = {
 # Media files settings
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
+
+# Hospital feed long-poll settings. A waiting feed request holds a worker
+# thread for up to HOSPITAL_FEED_MAX_WAIT seconds, so each idle hospital
+# console occupies one worker; size the server's thread pool to match.
+HOSPITAL_FEED_MAX_WAIT = 30  # seconds a feed request may block
+HOSPITAL_FEED_POLL_INTERVAL = 2  # seconds between database re-checks
+# Items changed this many seconds before a feed cursor are sent again, so
+# rows whose transactions commit out of timestamp order are not skipped
+HOSPITAL_FEED_OVERLAP = 5
+
+# Pending STATUS_UPDATE notifications for the same emergency and recipient
+# created within this many seconds are merged instead of duplicated
+STATUS_UPDATE_COALESCE_WINDOW = 60
+
+# Ambulance GPS ingestion settings
+AMBULANCE_FIX_MAX_AGE = 300  # seconds; older fixes are dropped as stale
+AMBULANCE_FIX_MAX_CLOCK_SKEW = 30  # seconds a fix may be ahead of server time
+AMBULANCE_LOCATION_BATCH_SIZE = 500  # ambulances written per UPDATE statement
+
+# Ambulance location history settings
+AMBULANCE_LOCATION_HISTORY = True
+AMBULANCE_HISTORY_OPEN_SEGMENT_POINTS = 120  # raw fixes per appended segment
+AMBULANCE_HISTORY_SEGMENT_POINTS = 3600  # fixes per downsampled segment
+AMBULANCE_HISTORY_MAX_GAP = 3600  # seconds; a longer gap starts a new segment
+# (age in seconds, resolution in seconds) applied by downsample_location_history
+AMBULANCE_HISTORY_DOWNSAMPLE_TIERS = [
+    (86400, 30),  # older than 1 day: one fix per 30 seconds
+    (30 * 86400, 300),  # older than 30 days: one fix per 5 minutes
+]
+
+# Live ambulance registry settings
+AMBULANCE_REGISTRY_CELL_SIZE = 0.05  # grid cell size in degrees (~5.5 km)
+AMBULANCE_REGISTRY_REFRESH = 30  # seconds between reloads from the database
+
+# ETA speed model for dispatched ambulances
+AMBULANCE_ETA_SPEED_KMH = 40  # average urban ambulance speed
+AMBULANCE_ETA_ROAD_FACTOR = 1.3  # road distance / straight-line distance
+AMBULANCE_ETA_MIN_SECONDS = 60
+
+# Emergency archive (manage.py archive_emergencies)
+EMERGENCY_ARCHIVE_AFTER_DAYS = 90  # closed emergencies older than this move
+EMERGENCY_ARCHIVE_BATCH_SIZE = 500  # emergencies moved per transaction
+
+# Token authentication cache (api.authentication.CachedTokenAuthentication)
+TOKEN_AUTH_CACHE_SIZE = 10000  # tokens kept per process
+TOKEN_AUTH_CACHE_TTL = 60  # seconds before a token is re-checked in the database
+
+# Signed access tokens (api.authentication.SignedTokenAuthentication).
+# Access tokens are verified without the database and carry the staff flag,
+# so a user who is deactivated or loses staff status keeps the access of
+# their current token until it expires; keep the lifetime short. Refreshing
+# is refused for inactive users and re-reads the staff flag.
+ACCESS_TOKEN_LIFETIME = 300  # seconds an access token is accepted
+REFRESH_TOKEN_LIFETIME = 30 * 24 * 3600  # seconds a refresh token stays valid
+
+# Medical record full-text search (api.search)
+MEDICAL_RECORD_SEARCH_LIMIT = 500  # matches listed for ?search= (more are flagged)
+
+# Hospital autocomplete index (api.autocomplete)
+HOSPITAL_AUTOCOMPLETE_REFRESH = 60  # seconds between reloads from the database
+
+# Phone number normalization (db.models.base.to_e164)
+PHONE_DEFAULT_COUNTRY_CODE = "91"  # country code for numbers typed without one
+
+# Chunked medical record attachment uploads (api.attachments)
+ATTACHMENT_UPLOAD_DIR = BASE_DIR / "uploads"  # part files of unfinished uploads
+ATTACHMENT_MAX_SIZE = 512 * 1024 * 1024  # bytes per attachment
+ATTACHMENT_MAX_CHUNK_SIZE = 8 * 1024 * 1024  # bytes per chunk request
+ATTACHMENT_UPLOAD_EXPIRY = 24 * 3600  # seconds before an idle upload is purged
+
+# Content-addressed file storage (db.storage, manage.py collect_blobs)
+BLOB_COLLECT_GRACE = 3600  # seconds a newly saved blob is kept unreferenced
+
+# Profile picture renditions (api.renditions)
+PROFILE_PICTURE_RENDITIONS = {"thumb": 64, "small": 160, "medium": 320}  # px squares
+RENDITION_WORKERS = 2  # background threads building renditions per process
+RENDITION_BUILT_CACHE_SECONDS = 3600  # seconds built renditions are remembered
+
+# Patient emergency cards (api.cards)
+EMERGENCY_CARD_RECORDS = 5  # latest medical records on a card
+EMERGENCY_CARD_CONTACTS = 5  # emergency contacts on a card
+EMERGENCY_CARD_TEXT_LIMIT = 300  # characters kept of each record text field
+
+# Bulk hospital directory import (api.imports, manage.py import_hospitals)
+HOSPITAL_IMPORT_BATCH_SIZE = 1000  # rows validated and upserted together
+HOSPITAL_IMPORT_MAX_ERRORS = 1000  # row errors kept in the import report
+
+# Streaming exports (api.exports, manage.py export_emergency_data)
+EXPORT_CHUNK_SIZE = 2000  # rows fetched per database round trip
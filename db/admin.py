@@ -3,11 +3,19 @@ from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 
 from .models import (
     Ambulance,
+    AmbulanceLocationSegment,
+    ArchivedEmergency,
+    ArchivedNotification,
+    AttachmentUpload,
     Emergency,
+    EmergencyCard,
     EmergencyContact,
     Hospital,
     MedicalRecord,
     Notification,
+    RefreshToken,
+    Specialization,
+    StoredBlob,
     User,
 )
 
@@ -91,6 +99,15 @@ class HospitalAdmin(admin.ModelAdmin):
     readonly_fields = ("created_at", "updated_at")
 
 
+@admin.register(Specialization)
+class SpecializationAdmin(admin.ModelAdmin):
+    """Admin configuration for Specialization model"""
+
+    list_display = ("name", "key", "bit")
+    search_fields = ("name", "key")
+    readonly_fields = ("key", "bit", "created_at", "updated_at")
+
+
 @admin.register(Emergency)
 class EmergencyAdmin(admin.ModelAdmin):
     """Admin configuration for Emergency model"""
@@ -135,6 +152,25 @@ class MedicalRecordAdmin(admin.ModelAdmin):
     raw_id_fields = ("patient", "hospital")
 
 
+@admin.register(StoredBlob)
+class StoredBlobAdmin(admin.ModelAdmin):
+    """Admin configuration for StoredBlob model"""
+
+    list_display = ("digest", "name", "size", "refcount", "last_saved_at")
+    list_filter = ("refcount",)
+    search_fields = ("digest", "name")
+    readonly_fields = ("digest", "name", "size", "created_at", "last_saved_at")
+
+
+@admin.register(AttachmentUpload)
+class AttachmentUploadAdmin(admin.ModelAdmin):
+    """Admin configuration for AttachmentUpload model"""
+
+    list_display = ("filename", "medical_record", "size", "received", "created_at")
+    readonly_fields = ("received", "created_at", "updated_at")
+    raw_id_fields = ("medical_record", "uploaded_by")
+
+
 @admin.register(Ambulance)
 class AmbulanceAdmin(admin.ModelAdmin):
     """Admin configuration for Ambulance model"""
@@ -152,6 +188,18 @@ class AmbulanceAdmin(admin.ModelAdmin):
     raw_id_fields = ("hospital", "current_emergency")
 
 
+@admin.register(AmbulanceLocationSegment)
+class AmbulanceLocationSegmentAdmin(admin.ModelAdmin):
+    """Admin configuration for AmbulanceLocationSegment model"""
+
+    list_display = ("ambulance", "started_at", "ended_at", "resolution", "point_count")
+    list_filter = ("resolution",)
+    search_fields = ("ambulance__vehicle_number",)
+    readonly_fields = ("created_at", "updated_at")
+    exclude = ("data",)
+    raw_id_fields = ("ambulance",)
+
+
 @admin.register(EmergencyContact)
 class EmergencyContactAdmin(admin.ModelAdmin):
     """Admin configuration for EmergencyContact model"""
@@ -166,3 +214,42 @@ class EmergencyContactAdmin(admin.ModelAdmin):
     )
     readonly_fields = ("created_at", "updated_at")
     raw_id_fields = ("patient",)
+
+
+@admin.register(EmergencyCard)
+class EmergencyCardAdmin(admin.ModelAdmin):
+    """Admin configuration for EmergencyCard model"""
+
+    list_display = ("patient", "updated_at")
+    search_fields = ("patient__first_name", "patient__last_name", "patient__username")
+    readonly_fields = ("patient", "card", "updated_at")
+
+
+@admin.register(ArchivedEmergency)
+class ArchivedEmergencyAdmin(admin.ModelAdmin):
+    """Admin configuration for ArchivedEmergency model"""
+
+    list_display = ("id", "patient", "priority", "status", "created_at", "archived_at")
+    list_filter = ("status", "priority")
+    search_fields = ("patient__first_name", "patient__last_name")
+    readonly_fields = ("archived_at",)
+    raw_id_fields = ("patient",)
+
+
+@admin.register(ArchivedNotification)
+class ArchivedNotificationAdmin(admin.ModelAdmin):
+    """Admin configuration for ArchivedNotification model"""
+
+    list_display = ("id", "notification_type", "emergency", "created_at")
+    list_filter = ("notification_type",)
+    raw_id_fields = ("emergency",)
+
+
+@admin.register(RefreshToken)
+class RefreshTokenAdmin(admin.ModelAdmin):
+    """Admin configuration for RefreshToken model"""
+
+    list_display = ("user", "created_at", "expires_at", "revoked_at")
+    search_fields = ("user__username",)
+    readonly_fields = ("token_hash", "created_at", "updated_at")
+    raw_id_fields = ("user",)
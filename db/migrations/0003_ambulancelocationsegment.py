@@ -0,0 +1,36 @@
+# Generated by Django 5.2.6 on 2026-10-19 10:41
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('db', '0002_ambulance_location_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AmbulanceLocationSegment',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('is_active', models.BooleanField(default=True)),
+                ('started_at', models.DateTimeField()),
+                ('ended_at', models.DateTimeField()),
+                ('resolution', models.PositiveIntegerField(default=0, help_text='Downsampling interval in seconds (0 = raw fixes)')),
+                ('point_count', models.PositiveIntegerField(default=0)),
+                ('last_latitude_e6', models.IntegerField()),
+                ('last_longitude_e6', models.IntegerField()),
+                ('data', models.BinaryField()),
+                ('ambulance', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='location_segments', to='db.ambulance')),
+            ],
+            options={
+                'ordering': ['ambulance', 'started_at'],
+                'indexes': [models.Index(fields=['ambulance', 'started_at'], name='db_ambulanc_ambulan_921af5_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.6 on 2026-10-19 10:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('db', '0003_ambulancelocationsegment'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ambulance',
+            index=models.Index(fields=['hospital', 'status'], name='db_ambulanc_hospita_8ac50c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ambulance',
+            index=models.Index(fields=['status'], name='db_ambulanc_status_446b38_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='emergency',
+            index=models.Index(fields=['status', 'created_at'], name='db_emergenc_status_78f544_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='emergency',
+            index=models.Index(fields=['patient', 'status'], name='db_emergenc_patient_344b0f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='emergency',
+            index=models.Index(fields=['created_at'], name='db_emergenc_created_36f502_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='hospital',
+            index=models.Index(condition=models.Q(('has_emergency_services', True), ('is_active', True)), fields=['available_ambulances'], name='hospital_emergency_ready_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='hospital',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['name'], name='hospital_active_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['user', 'status'], name='db_notifica_user_id_e5ff85_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['hospital', 'status', 'created_at'], name='db_notifica_hospita_567b74_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['status', 'created_at'], name='db_notifica_status_89f2ad_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['created_at'], name='db_notifica_created_0c828e_idx'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.6 on 2026-10-19 10:52
+
+import db.models.base
+from django.db import migrations, models
+
+MODELS = [
+    "ambulance",
+    "ambulancelocationsegment",
+    "emergency",
+    "emergencycontact",
+    "hospital",
+    "medicalrecord",
+    "notification",
+    "user",
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('db', '0004_hot_path_indexes'),
+    ]
+
+    # The new default is applied in Python only; existing uuid4 keys stay
+    # valid and no table needs to be rebuilt.
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name=model_name,
+                    name='id',
+                    field=models.UUIDField(default=db.models.base.uuid7, editable=False, primary_key=True, serialize=False),
+                )
+                for model_name in MODELS
+            ],
+        ),
+    ]
@@ -0,0 +1,98 @@
+# Generated by Django 5.2.6 on 2026-10-19 10:55
+
+from decimal import ROUND_HALF_EVEN
+
+from django.db import migrations, models
+
+COORDINATE_FIELDS = {
+    "user": [("latitude", "latitude_e6"), ("longitude", "longitude_e6")],
+    "hospital": [("latitude", "latitude_e6"), ("longitude", "longitude_e6")],
+    "emergency": [
+        ("location_latitude", "location_latitude_e6"),
+        ("location_longitude", "location_longitude_e6"),
+    ],
+    "ambulance": [
+        ("current_latitude", "current_latitude_e6"),
+        ("current_longitude", "current_longitude_e6"),
+    ],
+}
+
+BATCH_SIZE = 2000
+
+
+def backfill_microdegrees(apps, schema_editor):
+    for model_name, pairs in COORDINATE_FIELDS.items():
+        model = apps.get_model("db", model_name)
+        fields = [field for field, _ in pairs]
+        batch = []
+        for instance in model.objects.only("pk", *fields).iterator(
+            chunk_size=BATCH_SIZE
+        ):
+            for field, field_e6 in pairs:
+                value = getattr(instance, field)
+                if value is not None:
+                    value = int(
+                        (value * 1_000_000).to_integral_value(ROUND_HALF_EVEN)
+                    )
+                setattr(instance, field_e6, value)
+            batch.append(instance)
+            if len(batch) >= BATCH_SIZE:
+                model.objects.bulk_update(batch, [e6 for _, e6 in pairs])
+                batch = []
+        if batch:
+            model.objects.bulk_update(batch, [e6 for _, e6 in pairs])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('db', '0005_uuid7_primary_keys'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ambulance',
+            name='current_latitude_e6',
+            field=models.IntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='ambulance',
+            name='current_longitude_e6',
+            field=models.IntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='emergency',
+            name='location_latitude_e6',
+            field=models.IntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='emergency',
+            name='location_longitude_e6',
+            field=models.IntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='hospital',
+            name='latitude_e6',
+            field=models.IntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='hospital',
+            name='longitude_e6',
+            field=models.IntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='latitude_e6',
+            field=models.IntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='longitude_e6',
+            field=models.IntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(backfill_microdegrees, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='hospital',
+            index=models.Index(fields=['latitude_e6', 'longitude_e6'], name='hospital_coordinates_idx'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.6 on 2026-10-19 11:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('db', '0006_microdegree_coordinates'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='hospital',
+            name='home_region',
+            field=models.CharField(default='default', editable=False, max_length=50),
+        ),
+        migrations.RemoveIndex(
+            model_name='hospital',
+            name='hospital_active_name_idx',
+        ),
+        migrations.AddIndex(
+            model_name='hospital',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['home_region', 'name'], name='hospital_region_name_idx'),
+        ),
+    ]
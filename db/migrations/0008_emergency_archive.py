@@ -0,0 +1,56 @@
+# Generated by Django 5.2.6 on 2026-10-19 11:03
+
+import django.core.serializers.json
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('db', '0007_hospital_home_region'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedEmergency',
+            fields=[
+                ('id', models.UUIDField(editable=False, primary_key=True, serialize=False)),
+                ('assigned_hospital_id', models.UUIDField(blank=True, null=True)),
+                ('priority', models.CharField(choices=[('LOW', 'Low'), ('MEDIUM', 'Medium'), ('HIGH', 'High'), ('CRITICAL', 'Critical')], max_length=10)),
+                ('status', models.CharField(choices=[('PENDING', 'Pending'), ('ACKNOWLEDGED', 'Acknowledged'), ('DISPATCHED', 'Ambulance Dispatched'), ('IN_PROGRESS', 'In Progress'), ('COMPLETED', 'Completed'), ('CANCELLED', 'Cancelled')], max_length=15)),
+                ('created_at', models.DateTimeField()),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('data', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('patient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_emergencies', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedNotification',
+            fields=[
+                ('id', models.UUIDField(editable=False, primary_key=True, serialize=False)),
+                ('hospital_id', models.UUIDField(blank=True, null=True)),
+                ('user_id', models.UUIDField(blank=True, null=True)),
+                ('notification_type', models.CharField(choices=[('EMERGENCY_ALERT', 'Emergency Alert'), ('AMBULANCE_REQUEST', 'Ambulance Request'), ('STATUS_UPDATE', 'Status Update'), ('EMERGENCY_CONTACT_ALERT', 'Emergency Contact Alert')], max_length=25)),
+                ('created_at', models.DateTimeField()),
+                ('data', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('emergency', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notifications', to='db.archivedemergency')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='archivedemergency',
+            index=models.Index(fields=['patient', 'created_at'], name='db_archived_patient_acba5e_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedemergency',
+            index=models.Index(fields=['status'], name='db_archived_status_017db4_idx'),
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.2.6 on 2026-10-19 12:10
+
+from django.db import migrations
+
+FTS_TABLE = "medical_record_fts"
+RECORD_TABLE = "db_medicalrecord"
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+            f"record_id UNINDEXED, patient_id UNINDEXED, "
+            f"diagnosis, treatment, doctor_name, "
+            f"tokenize='porter unicode61')"
+        )
+        schema_editor.execute(
+            f"INSERT INTO {FTS_TABLE} "
+            f"(record_id, patient_id, diagnosis, treatment, doctor_name) "
+            f"SELECT id, patient_id, diagnosis, treatment, doctor_name "
+            f"FROM {RECORD_TABLE}"
+        )
+    elif vendor == "postgresql":
+        schema_editor.execute(
+            f"ALTER TABLE {RECORD_TABLE} ADD COLUMN search_vector tsvector "
+            f"GENERATED ALWAYS AS ("
+            f"setweight(to_tsvector('english', coalesce(diagnosis, '')), 'A') || "
+            f"setweight(to_tsvector('english', coalesce(treatment, '')), 'B') || "
+            f"setweight(to_tsvector('english', coalesce(doctor_name, '')), 'C')"
+            f") STORED"
+        )
+        schema_editor.execute(
+            f"CREATE INDEX medical_record_search_idx ON {RECORD_TABLE} "
+            f"USING GIN (search_vector)"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        schema_editor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+    elif vendor == "postgresql":
+        schema_editor.execute("DROP INDEX IF EXISTS medical_record_search_idx")
+        schema_editor.execute(
+            f"ALTER TABLE {RECORD_TABLE} DROP COLUMN IF EXISTS search_vector"
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('db', '0009_signed_access_tokens'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,110 @@
+# Generated by Django 5.2.6 on 2026-10-19 11:16
+
+import db.models.base
+import django.db.models.deletion
+from django.db import DEFAULT_DB_ALIAS, migrations, models
+
+MASK_BITS = 62
+OVERFLOW = 1 << MASK_BITS
+
+
+def split_specializations(text):
+    names = {}
+    for name in (text or "").split(","):
+        name = " ".join(name.split())
+        if name:
+            names.setdefault(name.casefold(), name)
+    return names
+
+
+def backfill_specializations(apps, schema_editor):
+    """Build the vocabulary, links and masks of existing hospitals"""
+    Hospital = apps.get_model("db", "Hospital")
+    Specialization = apps.get_model("db", "Specialization")
+    HospitalSpecialization = apps.get_model("db", "HospitalSpecialization")
+    using = schema_editor.connection.alias
+
+    hospitals = list(Hospital.objects.using(using).only("pk", "specializations"))
+    names = {}
+    for hospital in hospitals:
+        for key, name in split_specializations(hospital.specializations).items():
+            names.setdefault(key, name)
+
+    # The vocabulary and its bits are shared, so they always come from the
+    # default database (migrate it before the shards)
+    vocabulary = {
+        specialization.key: specialization
+        for specialization in Specialization.objects.using(DEFAULT_DB_ALIAS)
+    }
+    next_bit = max((entry.bit for entry in vocabulary.values()), default=-1) + 1
+    for key in sorted(set(names) - set(vocabulary)):
+        vocabulary[key] = Specialization.objects.using(DEFAULT_DB_ALIAS).create(
+            name=names[key], key=key, bit=next_bit
+        )
+        next_bit += 1
+    if using != DEFAULT_DB_ALIAS:
+        Specialization.objects.using(using).bulk_create(
+            [vocabulary[key] for key in names], ignore_conflicts=True
+        )
+
+    links = []
+    for hospital in hospitals:
+        mask = 0
+        for key in split_specializations(hospital.specializations):
+            specialization = vocabulary[key]
+            mask |= 1 << specialization.bit if specialization.bit < MASK_BITS else OVERFLOW
+            links.append(
+                HospitalSpecialization(
+                    hospital_id=hospital.pk, specialization_id=specialization.pk
+                )
+            )
+        hospital.specialization_mask = mask
+    Hospital.objects.using(using).bulk_update(
+        hospitals, ["specialization_mask"], batch_size=1000
+    )
+    HospitalSpecialization.objects.using(using).bulk_create(
+        links, batch_size=1000, ignore_conflicts=True
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('db', '0010_medical_record_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Specialization',
+            fields=[
+                ('id', models.UUIDField(default=db.models.base.uuid7, editable=False, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('is_active', models.BooleanField(default=True)),
+                ('name', models.CharField(max_length=100)),
+                ('key', models.CharField(max_length=100, unique=True)),
+                ('bit', models.PositiveSmallIntegerField(unique=True)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.AddField(
+            model_name='hospital',
+            name='specialization_mask',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.CreateModel(
+            name='HospitalSpecialization',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hospital', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='specialization_links', to='db.hospital')),
+                ('specialization', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='hospital_links', to='db.specialization')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['specialization', 'hospital'], name='db_hospital_special_3d5447_idx')],
+                'constraints': [models.UniqueConstraint(fields=('hospital', 'specialization'), name='unique_hospital_specialization')],
+            },
+        ),
+        migrations.RunPython(backfill_specializations, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,110 @@
+# Generated by Django 5.2.6 on 2026-10-19 11:18
+
+import re
+
+from django.conf import settings
+from django.db import migrations, models
+
+BATCH_SIZE = 2000
+
+
+def to_e164(value):
+    if not value:
+        return None
+    value = value.strip()
+    digits = re.sub(r"\D", "", value)
+    if value.startswith("+"):
+        pass
+    elif digits.startswith("00"):
+        digits = digits[2:]
+    else:
+        if digits.startswith("0"):
+            digits = digits[1:]
+        digits = getattr(settings, "PHONE_DEFAULT_COUNTRY_CODE", "91") + digits
+    if not 8 <= len(digits) <= 15 or digits.startswith("0"):
+        return None
+    return f"+{digits}"
+
+
+def raise_phone_collisions(User):
+    """Fail with a list of users whose phone numbers normalize alike"""
+    owners = {}
+    for username, phone_number in User.objects.values_list(
+        "username", "phone_number"
+    ).iterator(chunk_size=BATCH_SIZE):
+        phone = to_e164(phone_number)
+        if phone:
+            owners.setdefault(phone, []).append(f"{username} ({phone_number})")
+    collisions = {
+        phone: users for phone, users in owners.items() if len(users) > 1
+    }
+    if collisions:
+        lines = "\n".join(
+            f"  {phone}: {', '.join(users)}"
+            for phone, users in sorted(collisions.items())
+        )
+        raise RuntimeError(
+            f"{len(collisions)} phone numbers belong to several users once "
+            f"normalized to E.164. Merge the accounts or correct their "
+            f"phone_number, then migrate again:\n{lines}"
+        )
+
+
+def backfill_phone_numbers(apps, schema_editor):
+    User = apps.get_model("db", "User")
+    EmergencyContact = apps.get_model("db", "EmergencyContact")
+
+    # phone_e164 is unique: users whose numbers normalize to the same one
+    # must be merged or corrected before the column can be filled
+    raise_phone_collisions(User)
+
+    batch = []
+    for user in User.objects.only(
+        "pk", "phone_number", "emergency_contact_phone"
+    ).iterator(chunk_size=BATCH_SIZE):
+        user.phone_e164 = to_e164(user.phone_number)
+        user.emergency_contact_phone_e164 = to_e164(user.emergency_contact_phone)
+        batch.append(user)
+        if len(batch) >= BATCH_SIZE:
+            User.objects.bulk_update(
+                batch, ["phone_e164", "emergency_contact_phone_e164"]
+            )
+            batch = []
+    User.objects.bulk_update(batch, ["phone_e164", "emergency_contact_phone_e164"])
+
+    batch = []
+    for contact in EmergencyContact.objects.only("pk", "phone_number").iterator(
+        chunk_size=BATCH_SIZE
+    ):
+        contact.phone_e164 = to_e164(contact.phone_number)
+        batch.append(contact)
+        if len(batch) >= BATCH_SIZE:
+            EmergencyContact.objects.bulk_update(batch, ["phone_e164"])
+            batch = []
+    EmergencyContact.objects.bulk_update(batch, ["phone_e164"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('db', '0011_hospital_specializations'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='emergencycontact',
+            name='phone_e164',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=16, null=True),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='emergency_contact_phone_e164',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=16, null=True),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='phone_e164',
+            field=models.CharField(blank=True, editable=False, max_length=16, null=True, unique=True),
+        ),
+        migrations.RunPython(backfill_phone_numbers, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.2.6 on 2026-10-19 11:24
+
+import os
+
+import db.storage
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def backfill_attachment_filenames(apps, schema_editor):
+    # Files stored so far still carry the name they were uploaded with
+    MedicalRecord = apps.get_model("db", "MedicalRecord")
+    records = MedicalRecord.objects.exclude(attachments="").exclude(attachments=None)
+    for record in records.only("pk", "attachments").iterator():
+        record.attachment_filename = os.path.basename(record.attachments.name)
+        record.save(update_fields=["attachment_filename"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('db', '0013_attachment_uploads'),
+    ]
+
+    operations = [
+        # Storage only matters in Python; no column changes, so SQLite
+        # must not rebuild the tables
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name='medicalrecord',
+                    name='attachments',
+                    field=models.FileField(blank=True, null=True, storage=db.storage.get_content_storage, upload_to='medical_records/'),
+                ),
+                migrations.AlterField(
+                    model_name='user',
+                    name='profile_picture',
+                    field=models.ImageField(blank=True, null=True, storage=db.storage.get_content_storage, upload_to='profiles/'),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name='medicalrecord',
+            name='attachment_filename',
+            field=models.CharField(blank=True, editable=False, max_length=255),
+        ),
+        migrations.RunPython(backfill_attachment_filenames, migrations.RunPython.noop),
+        migrations.CreateModel(
+            name='StoredBlob',
+            fields=[
+                ('digest', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=255)),
+                ('size', models.BigIntegerField()),
+                ('refcount', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_saved_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['refcount', 'last_saved_at'], name='db_storedbl_refcoun_ac06ce_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.6 on 2026-10-19 11:32
+
+import db.models.base
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('db', '0014_content_addressed_storage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmergencyCard',
+            fields=[
+                ('patient', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='emergency_card', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('card', models.JSONField(default=dict, encoder=db.models.base.CompactJSONEncoder)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='medicalrecord',
+            index=models.Index(fields=['patient', '-visit_date'], name='db_medicalr_patient_67f779_idx'),
+        ),
+    ]
@@ -1,21 +1,41 @@
 from .base import (
     Ambulance,
+    AmbulanceLocationSegment,
+    ArchivedEmergency,
+    ArchivedNotification,
+    AttachmentUpload,
     BaseModel,
     Emergency,
+    EmergencyCard,
     EmergencyContact,
     Hospital,
+    HospitalSpecialization,
     MedicalRecord,
     Notification,
+    RefreshToken,
+    Specialization,
+    StoredBlob,
+    TokenUser,
     User,
 )
 
 __all__ = [
     "BaseModel",
     "User",
+    "TokenUser",
+    "RefreshToken",
     "Hospital",
+    "Specialization",
+    "HospitalSpecialization",
     "Emergency",
     "Notification",
     "MedicalRecord",
+    "AttachmentUpload",
+    "StoredBlob",
     "Ambulance",
+    "AmbulanceLocationSegment",
     "EmergencyContact",
+    "EmergencyCard",
+    "ArchivedEmergency",
+    "ArchivedNotification",
 ]
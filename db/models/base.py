@@ -1,17 +1,237 @@
+import re
+import secrets
+import sys
+import threading
+import time
 import uuid
+from array import array
+from datetime import timedelta
+from decimal import ROUND_HALF_EVEN, Decimal
+from pathlib import Path
 
+from django.conf import settings
+from django.contrib.auth.hashers import UNUSABLE_PASSWORD_PREFIX
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, models, router, transaction
 from django.utils import timezone
 from geopy.distance import geodesic
 
+from db.sharding import DEFAULT_REGION, region_for_location, region_for_shard
+from db.storage import get_content_storage
+
+_uuid7_lock = threading.Lock()
+_uuid7_last_ms = 0
+_uuid7_counter = 0
+
+
+def uuid7():
+    """
+    Generate a time-ordered UUID version 7 (RFC 9562)
+
+    The first 48 bits are the Unix time in milliseconds and the next 12 bits
+    a counter that keeps IDs generated within the same millisecond in
+    order, so new rows append to the end of the primary key index.
+    """
+    global _uuid7_last_ms, _uuid7_counter
+
+    with _uuid7_lock:
+        now_ms = time.time_ns() // 1_000_000
+        if now_ms > _uuid7_last_ms:
+            _uuid7_last_ms = now_ms
+            # Random start with headroom so the counter rarely overflows
+            _uuid7_counter = secrets.randbits(11)
+        else:
+            _uuid7_counter += 1
+            if _uuid7_counter > 0xFFF:
+                _uuid7_last_ms += 1
+                _uuid7_counter = secrets.randbits(11)
+        timestamp_ms = _uuid7_last_ms
+        counter = _uuid7_counter
+
+    value = (
+        (timestamp_ms & 0xFFFFFFFFFFFF) << 80
+        | 0x7 << 76
+        | counter << 64
+        | 0b10 << 62
+        | secrets.randbits(62)
+    )
+    return uuid.UUID(int=value)
+
+
+MICRODEGREES = 1_000_000
+
+
+def to_microdegrees(value):
+    """
+    Convert a coordinate in degrees to integer microdegrees
+
+    Args:
+        value: Coordinate as Decimal, float, string or None
+
+    Returns:
+        Integer microdegrees, or None if value is None or empty
+    """
+    if value is None or value == "":
+        return None
+    return int((Decimal(str(value)) * MICRODEGREES).to_integral_value(ROUND_HALF_EVEN))
+
+
+# Vocabulary bits 0-61 go into Hospital.specialization_mask; bit 62 flags a
+# hospital with specializations past the mask, which are only in the relation
+SPECIALIZATION_MASK_BITS = 62
+SPECIALIZATION_OVERFLOW = 1 << SPECIALIZATION_MASK_BITS
+
+
+def normalize_specialization(name):
+    """Normalize a specialization name to its vocabulary key"""
+    return " ".join(name.split()).casefold()
+
+
+def split_specializations(text):
+    """
+    Split a comma-separated specializations text
+
+    Args:
+        text: Comma-separated specialization names
+
+    Returns:
+        Dict of vocabulary key -> display name in text order
+    """
+    names = {}
+    for name in (text or "").split(","):
+        name = " ".join(name.split())
+        if name:
+            names.setdefault(normalize_specialization(name), name)
+    return names
+
+
+class MicrodegreeCoordinatesMixin:
+    """
+    Keep integer microdegree copies of a model's Decimal coordinates
+
+    The Decimal fields remain the source of truth for the API. The integer
+    columns are filled on save and back the float location accessors and
+    bounding-box filters, which avoids Decimal arithmetic on hot paths.
+    Code that writes coordinates with QuerySet.update() must set both.
+    """
+
+    # Pairs of (Decimal field, microdegree field)
+    coordinate_fields = ()
+
+    def save(self, *args, **kwargs):
+        for field, field_e6 in self.coordinate_fields:
+            setattr(self, field_e6, to_microdegrees(getattr(self, field)))
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            update_fields = set(update_fields)
+            for field, field_e6 in self.coordinate_fields:
+                if field in update_fields:
+                    update_fields.add(field_e6)
+            kwargs["update_fields"] = update_fields
+        super().save(*args, **kwargs)
+
+
+def to_e164(value):
+    """
+    Normalize a phone number to E.164 ("+" and up to 15 digits)
+
+    Numbers without a "+" or "00" international prefix are treated as
+    national numbers of PHONE_DEFAULT_COUNTRY_CODE, dropping one trunk "0".
+
+    Args:
+        value: Phone number as typed
+
+    Returns:
+        E.164 string, or None if the value cannot be a phone number
+    """
+    if not value:
+        return None
+    value = value.strip()
+    digits = re.sub(r"\D", "", value)
+    if value.startswith("+"):
+        pass
+    elif digits.startswith("00"):
+        digits = digits[2:]
+    else:
+        if digits.startswith("0"):
+            digits = digits[1:]
+        digits = getattr(settings, "PHONE_DEFAULT_COUNTRY_CODE", "91") + digits
+    if not 8 <= len(digits) <= 15 or digits.startswith("0"):
+        return None
+    return f"+{digits}"
+
+
+class PhoneNumberMixin:
+    """
+    Keep E.164 copies of a model's free-form phone number fields
+
+    The typed value stays in the original field for display. The
+    normalized column is filled on save and backs exact, indexed phone
+    lookups. Code that writes phone numbers with QuerySet.update() must set
+    both.
+
+    A unique E.164 field is checked before it is written, so a number
+    another row already claims raises ValidationError instead of failing
+    the save with an IntegrityError.
+    """
+
+    # Pairs of (phone field, E.164 field)
+    phone_fields = ()
+    # Error for a number another row of the model already claims
+    duplicate_phone_message = "This phone number is already in use."
+
+    def validate_unique_phones(self, fields=None, using=None):
+        """
+        Check that no other row claims this row's unique E.164 numbers
+
+        Args:
+            fields: Phone fields being written (defaults to all of them)
+            using: Database alias to check
+
+        Raises:
+            ValidationError: keyed by the phone field whose number is taken
+        """
+        errors = {}
+        for field, field_e164 in self.phone_fields:
+            if fields is not None and field not in fields:
+                continue
+            phone = getattr(self, field_e164)
+            if not phone or not self._meta.get_field(field_e164).unique:
+                continue
+            claimed = (
+                type(self)
+                ._base_manager.using(using or self._state.db or DEFAULT_DB_ALIAS)
+                .filter(**{field_e164: phone})
+                .exclude(pk=self.pk)
+                .exists()
+            )
+            if claimed:
+                errors[field] = [self.duplicate_phone_message]
+        if errors:
+            raise ValidationError(errors)
+
+    def save(self, *args, **kwargs):
+        for field, field_e164 in self.phone_fields:
+            setattr(self, field_e164, to_e164(getattr(self, field)))
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            update_fields = set(update_fields)
+            for field, field_e164 in self.phone_fields:
+                if field in update_fields:
+                    update_fields.add(field_e164)
+            kwargs["update_fields"] = update_fields
+        self.validate_unique_phones(update_fields, kwargs.get("using"))
+        super().save(*args, **kwargs)
+
 
 class BaseModel(models.Model):
     """
     Base model with common fields for all models
     """
 
-    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     is_active = models.BooleanField(default=True)
@@ -20,15 +240,18 @@ class BaseModel(models.Model):
         abstract = True
 
 
-class User(AbstractUser):
+class User(PhoneNumberMixin, MicrodegreeCoordinatesMixin, AbstractUser):
     """
     Extended User model for elderly patients
     """
 
-    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
 
     # Personal Information
     phone_number = models.CharField(max_length=15, unique=True)
+    phone_e164 = models.CharField(
+        max_length=16, unique=True, null=True, blank=True, editable=False
+    )
     date_of_birth = models.DateField(null=True, blank=True)
     address = models.TextField()
 
@@ -39,10 +262,15 @@ class User(AbstractUser):
     longitude = models.DecimalField(
         max_digits=11, decimal_places=8, null=True, blank=True
     )
+    latitude_e6 = models.IntegerField(null=True, blank=True, editable=False)
+    longitude_e6 = models.IntegerField(null=True, blank=True, editable=False)
 
     # Emergency Contact
     emergency_contact_name = models.CharField(max_length=100)
     emergency_contact_phone = models.CharField(max_length=15)
+    emergency_contact_phone_e164 = models.CharField(
+        max_length=16, null=True, blank=True, editable=False, db_index=True
+    )
     emergency_contact_relationship = models.CharField(max_length=50)
     emergency_contact_address = models.TextField(blank=True)
 
@@ -55,7 +283,9 @@ class User(AbstractUser):
     medical_notes = models.TextField(blank=True)
 
     # Profile
-    profile_picture = models.ImageField(upload_to="profiles/", null=True, blank=True)
+    profile_picture = models.ImageField(
+        upload_to="profiles/", storage=get_content_storage, null=True, blank=True
+    )
     is_elderly = models.BooleanField(default=True)
 
     # Timestamps
@@ -65,21 +295,198 @@ class User(AbstractUser):
     def __str__(self):
         return f"{self.first_name} {self.last_name} ({self.username})"
 
+    coordinate_fields = (("latitude", "latitude_e6"), ("longitude", "longitude_e6"))
+    phone_fields = (
+        ("phone_number", "phone_e164"),
+        ("emergency_contact_phone", "emergency_contact_phone_e164"),
+    )
+    duplicate_phone_message = "A user with this phone number already exists."
+    # Values written instead of secrets when a user is copied to a shard
+    mirror_redacted_fields = {"password": UNUSABLE_PASSWORD_PREFIX}
+
     def get_location(self):
         """Return user's location as tuple (latitude, longitude)"""
-        if self.latitude and self.longitude:
-            return (float(self.latitude), float(self.longitude))
+        if self.latitude_e6 is not None and self.longitude_e6 is not None:
+            return (
+                self.latitude_e6 / MICRODEGREES,
+                self.longitude_e6 / MICRODEGREES,
+            )
         return None
 
+    def get_home_region(self):
+        """Return the region whose shard holds the user's regional rows"""
+        location = self.get_location()
+        if location:
+            return region_for_location(*location)
+        return DEFAULT_REGION
+
     class Meta:
         db_table = "users"
 
 
-class Hospital(BaseModel):
+class TokenUser(User):
+    """
+    User restored from a signed access token without a database query
+
+    Only the fields carried by the token are loaded. The first access to
+    any other field loads all of them in a single query. The token also
+    carries the user's home region, so picking a shard needs no query.
+    """
+
+    # Home region claim of the token, None if it carried none
+    token_region = None
+
+    class Meta:
+        proxy = True
+
+    def get_home_region(self):
+        if self.token_region is not None:
+            return self.token_region
+        return super().get_home_region()
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        deferred = self.get_deferred_fields()
+        if fields is not None and deferred and set(fields) <= deferred:
+            fields = list(deferred)
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+
+
+class RefreshToken(BaseModel):
+    """
+    Long-lived token exchanged for new signed access tokens
+
+    Only a SHA-256 hash of the token is stored. Tokens are rotated on use
+    and revoked on logout.
+    """
+
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="refresh_tokens"
+    )
+    token_hash = models.CharField(max_length=64, unique=True)
+    expires_at = models.DateTimeField()
+    revoked_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Refresh token for {self.user.username}"
+
+    def is_valid(self):
+        """Check if the token is neither expired nor revoked"""
+        return self.revoked_at is None and self.expires_at > timezone.now()
+
+    class Meta:
+        indexes = [models.Index(fields=["user", "revoked_at"])]
+
+
+class Specialization(BaseModel):
+    """
+    Normalized medical specialization vocabulary
+
+    Each entry owns a fixed bit used in Hospital.specialization_mask. The
+    vocabulary lives in the default database and is copied to a regional
+    shard when a hospital there uses an entry.
+    """
+
+    name = models.CharField(max_length=100)
+    key = models.CharField(max_length=100, unique=True)
+    bit = models.PositiveSmallIntegerField(unique=True)
+
+    # Process-wide bit -> name map for decoding masks
+    _names_by_bit = {}
+
+    def __str__(self):
+        return self.name
+
+    @classmethod
+    def resolve(cls, text):
+        """
+        Get the vocabulary entries of a specializations text, adding new ones
+
+        Args:
+            text: Comma-separated specialization names
+
+        Returns:
+            List of Specialization instances in text order
+        """
+        names = split_specializations(text)
+        for _ in range(5):
+            known = {
+                specialization.key: specialization
+                for specialization in cls.objects.using(DEFAULT_DB_ALIAS).filter(
+                    key__in=names
+                )
+            }
+            missing = [key for key in names if key not in known]
+            if not missing:
+                return [known[key] for key in names]
+            try:
+                with transaction.atomic(using=DEFAULT_DB_ALIAS):
+                    last = cls.objects.using(DEFAULT_DB_ALIAS).aggregate(
+                        models.Max("bit")
+                    )["bit__max"]
+                    next_bit = -1 if last is None else last
+                    cls.objects.using(DEFAULT_DB_ALIAS).bulk_create(
+                        [
+                            cls(name=names[key], key=key, bit=next_bit + offset)
+                            for offset, key in enumerate(missing, start=1)
+                        ]
+                    )
+            except IntegrityError:
+                # Another writer took the same bits or keys; look up again
+                continue
+        raise IntegrityError("Could not allocate specialization bits")
+
+    @staticmethod
+    def mask_for(specializations):
+        """Build the specialization_mask value of vocabulary entries"""
+        mask = 0
+        for specialization in specializations:
+            if specialization.bit < SPECIALIZATION_MASK_BITS:
+                mask |= 1 << specialization.bit
+            else:
+                mask |= SPECIALIZATION_OVERFLOW
+        return mask
+
+    @classmethod
+    def names_for_mask(cls, mask):
+        """
+        Decode a specialization_mask into names without a query per row
+
+        Args:
+            mask: Hospital.specialization_mask value
+
+        Returns:
+            List of specialization names in vocabulary order
+        """
+        bits = [bit for bit in range(SPECIALIZATION_MASK_BITS) if mask >> bit & 1]
+        if any(bit not in cls._names_by_bit for bit in bits):
+            cls._names_by_bit = dict(
+                cls.objects.using(DEFAULT_DB_ALIAS).values_list("bit", "name")
+            )
+        return [cls._names_by_bit[bit] for bit in bits if bit in cls._names_by_bit]
+
+
+class HospitalQuerySet(models.QuerySet):
+    """Queryset of hospitals"""
+
+    def regional(self):
+        """
+        Exclude directory copies of hospitals that live in another shard
+
+        The default database mirrors every shard's hospitals, so regional
+        queries there (nearby hospitals, dispatch) must skip the copies.
+        """
+        return self.filter(home_region=region_for_shard(self.db))
+
+
+class Hospital(MicrodegreeCoordinatesMixin, BaseModel):
     """
     Hospital model with location and ambulance services
     """
 
+    # Region of the shard holding the hospital; directory copies in the
+    # default database keep the region of their shard
+    home_region = models.CharField(max_length=50, default="default", editable=False)
+
     name = models.CharField(max_length=200)
     registration_number = models.CharField(max_length=50, unique=True)
 
@@ -97,6 +504,8 @@ class Hospital(BaseModel):
     # Location coordinates
     latitude = models.DecimalField(max_digits=10, decimal_places=8)
     longitude = models.DecimalField(max_digits=11, decimal_places=8)
+    latitude_e6 = models.IntegerField(null=True, blank=True, editable=False)
+    longitude_e6 = models.IntegerField(null=True, blank=True, editable=False)
 
     # Services
     has_emergency_services = models.BooleanField(default=True)
@@ -108,6 +517,8 @@ class Hospital(BaseModel):
     specializations = models.TextField(
         help_text="Comma-separated list of medical specializations"
     )
+    # Bits of the hospital's Specialization entries, kept in step on save
+    specialization_mask = models.BigIntegerField(default=0, editable=False)
 
     # Operating hours
     operates_24x7 = models.BooleanField(default=True)
@@ -115,12 +526,72 @@ class Hospital(BaseModel):
         blank=True, help_text="Operating hours if not 24x7"
     )
 
+    objects = HospitalQuerySet.as_manager()
+
     def __str__(self):
         return self.name
 
+    coordinate_fields = (("latitude", "latitude_e6"), ("longitude", "longitude_e6"))
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._saved_specializations = instance.__dict__.get("specializations")
+        return instance
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get("update_fields")
+        using = kwargs.get("using") or router.db_for_write(type(self), instance=self)
+        # A directory copy edited in the default database keeps its region
+        if self._state.adding or using != self._state.db:
+            self.home_region = region_for_shard(using)
+        specializations = None
+        if (
+            update_fields is None or "specializations" in update_fields
+        ) and self.specializations != getattr(self, "_saved_specializations", None):
+            specializations = Specialization.resolve(self.specializations)
+            self.specialization_mask = Specialization.mask_for(specializations)
+            if update_fields is not None:
+                kwargs["update_fields"] = {*update_fields, "specialization_mask"}
+
+        super().save(*args, **kwargs)
+
+        if specializations is not None:
+            self._sync_specializations(specializations)
+            self._saved_specializations = self.specializations
+
+    def _sync_specializations(self, specializations):
+        """Make the hospital's specialization links match its vocabulary"""
+        using = self._state.db
+        if using != DEFAULT_DB_ALIAS:
+            Specialization.objects.using(using).bulk_create(
+                specializations, ignore_conflicts=True
+            )
+        ids = [specialization.id for specialization in specializations]
+        links = HospitalSpecialization.objects.using(using).filter(hospital=self)
+        links.exclude(specialization_id__in=ids).delete()
+        HospitalSpecialization.objects.using(using).bulk_create(
+            [
+                HospitalSpecialization(
+                    hospital=self, specialization_id=specialization_id
+                )
+                for specialization_id in ids
+            ],
+            ignore_conflicts=True,
+        )
+
+    def get_specializations_list(self):
+        """Return the hospital's specialization names"""
+        if self.specialization_mask & SPECIALIZATION_OVERFLOW:
+            return list(split_specializations(self.specializations).values())
+        return Specialization.names_for_mask(self.specialization_mask)
+
     def get_location(self):
         """Return hospital's location as tuple (latitude, longitude)"""
-        return (float(self.latitude), float(self.longitude))
+        if self.latitude_e6 is None or self.longitude_e6 is None:
+            # Not saved yet, so the microdegree columns are not filled
+            return (float(self.latitude), float(self.longitude))
+        return (self.latitude_e6 / MICRODEGREES, self.longitude_e6 / MICRODEGREES)
 
     def calculate_distance_to_user(self, user):
         """Calculate distance in kilometers to a user"""
@@ -137,9 +608,53 @@ class Hospital(BaseModel):
 
     class Meta:
         ordering = ["name"]
+        indexes = [
+            # Partial indexes: Django compiles boolean filters to bare column
+            # predicates, which SQLite only matches against index conditions
+            models.Index(
+                fields=["available_ambulances"],
+                condition=models.Q(is_active=True, has_emergency_services=True),
+                name="hospital_emergency_ready_idx",
+            ),
+            # Regional hospital lists filter on home_region and sort by name
+            models.Index(
+                fields=["home_region", "name"],
+                condition=models.Q(is_active=True),
+                name="hospital_region_name_idx",
+            ),
+            models.Index(
+                fields=["latitude_e6", "longitude_e6"],
+                name="hospital_coordinates_idx",
+            ),
+        ]
+
+
+class HospitalSpecialization(models.Model):
+    """
+    Link between a hospital and a Specialization vocabulary entry
+    """
 
+    hospital = models.ForeignKey(
+        Hospital, on_delete=models.CASCADE, related_name="specialization_links"
+    )
+    specialization = models.ForeignKey(
+        Specialization, on_delete=models.CASCADE, related_name="hospital_links"
+    )
 
-class Emergency(BaseModel):
+    def __str__(self):
+        return f"{self.hospital_id} - {self.specialization_id}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["hospital", "specialization"],
+                name="unique_hospital_specialization",
+            )
+        ]
+        indexes = [models.Index(fields=["specialization", "hospital"])]
+
+
+class Emergency(MicrodegreeCoordinatesMixin, BaseModel):
     """
     Emergency request model
     """
@@ -176,6 +691,8 @@ class Emergency(BaseModel):
     location_longitude = models.DecimalField(
         max_digits=11, decimal_places=8, null=True, blank=True
     )
+    location_latitude_e6 = models.IntegerField(null=True, blank=True, editable=False)
+    location_longitude_e6 = models.IntegerField(null=True, blank=True, editable=False)
     location_address = models.TextField(blank=True)
 
     # Response
@@ -198,10 +715,21 @@ class Emergency(BaseModel):
             f"Emergency #{self.id} - {self.patient.first_name} {self.patient.last_name}"
         )
 
+    coordinate_fields = (
+        ("location_latitude", "location_latitude_e6"),
+        ("location_longitude", "location_longitude_e6"),
+    )
+
     def get_emergency_location(self):
         """Get emergency location coordinates"""
-        if self.location_latitude and self.location_longitude:
-            return (float(self.location_latitude), float(self.location_longitude))
+        if (
+            self.location_latitude_e6 is not None
+            and self.location_longitude_e6 is not None
+        ):
+            return (
+                self.location_latitude_e6 / MICRODEGREES,
+                self.location_longitude_e6 / MICRODEGREES,
+            )
         return self.patient.get_location()
 
     def mark_ambulance_dispatched(self, hospital):
@@ -219,6 +747,12 @@ class Emergency(BaseModel):
     class Meta:
         ordering = ["-created_at"]
         verbose_name_plural = "Emergencies"
+        indexes = [
+            # Newest-first staff list without filters
+            models.Index(fields=["created_at"]),
+            models.Index(fields=["status", "created_at"]),
+            models.Index(fields=["patient", "status"]),
+        ]
 
 
 class Notification(BaseModel):
@@ -309,6 +843,13 @@ class Notification(BaseModel):
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            # Newest-first staff list without filters
+            models.Index(fields=["created_at"]),
+            models.Index(fields=["user", "status"]),
+            models.Index(fields=["hospital", "status", "created_at"]),
+            models.Index(fields=["status", "created_at"]),
+        ]
 
 
 class MedicalRecord(BaseModel):
@@ -342,7 +883,15 @@ class MedicalRecord(BaseModel):
     doctor_notes = models.TextField(blank=True)
 
     # Files
-    attachments = models.FileField(upload_to="medical_records/", null=True, blank=True)
+    attachments = models.FileField(
+        upload_to="medical_records/",
+        storage=get_content_storage,
+        null=True,
+        blank=True,
+    )
+    # Name the attachment was uploaded with; the stored file is named by
+    # its content hash
+    attachment_filename = models.CharField(max_length=255, blank=True, editable=False)
 
     # Visit details
     visit_date = models.DateTimeField(default=timezone.now)
@@ -355,9 +904,64 @@ class MedicalRecord(BaseModel):
 
     class Meta:
         ordering = ["-visit_date"]
+        indexes = [models.Index(fields=["patient", "-visit_date"])]
+
+
+class StoredBlob(models.Model):
+    """
+    One distinct file content in the content-addressed storage
+
+    `refcount` is the number of model file fields pointing at the blob;
+    blobs at zero are deleted by `manage.py collect_blobs`.
+    """
+
+    digest = models.CharField(max_length=64, primary_key=True)
+    name = models.CharField(max_length=255)
+    size = models.BigIntegerField()
+    refcount = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_saved_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.name} ({self.refcount} references)"
+
+    class Meta:
+        indexes = [models.Index(fields=["refcount", "last_saved_at"])]
 
 
-class Ambulance(BaseModel):
+class AttachmentUpload(BaseModel):
+    """
+    In-progress chunked upload of a medical record attachment
+
+    Chunks are appended in order to a part file under
+    ATTACHMENT_UPLOAD_DIR; `received` is the number of bytes written so
+    far, so an interrupted client resumes from there. The row is deleted
+    once the file is attached to the record.
+    """
+
+    medical_record = models.ForeignKey(
+        MedicalRecord, on_delete=models.CASCADE, related_name="attachment_uploads"
+    )
+    uploaded_by = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="attachment_uploads"
+    )
+    filename = models.CharField(max_length=255)
+    size = models.BigIntegerField()
+    checksum = models.CharField(
+        max_length=64, blank=True, help_text="SHA-256 of the whole file (hex)"
+    )
+    received = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.filename} ({self.received}/{self.size} bytes)"
+
+    @property
+    def part_path(self):
+        """Path of the part file holding the bytes received so far"""
+        return Path(settings.ATTACHMENT_UPLOAD_DIR) / f"{self.id}.part"
+
+
+class Ambulance(MicrodegreeCoordinatesMixin, BaseModel):
     """
     Ambulance tracking model
     """
@@ -375,6 +979,14 @@ class Ambulance(BaseModel):
     vehicle_number = models.CharField(max_length=20, unique=True)
     driver_name = models.CharField(max_length=100)
     driver_phone = models.CharField(max_length=15)
+    # Account allowed to report the ambulance's position
+    driver = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="driven_ambulances",
+    )
     status = models.CharField(
         max_length=15, choices=STATUS_CHOICES, default="AVAILABLE"
     )
@@ -386,6 +998,9 @@ class Ambulance(BaseModel):
     current_longitude = models.DecimalField(
         max_digits=11, decimal_places=8, null=True, blank=True
     )
+    current_latitude_e6 = models.IntegerField(null=True, blank=True, editable=False)
+    current_longitude_e6 = models.IntegerField(null=True, blank=True, editable=False)
+    location_updated_at = models.DateTimeField(null=True, blank=True)
 
     # Equipment
     has_ventilator = models.BooleanField(default=False)
@@ -405,17 +1020,164 @@ class Ambulance(BaseModel):
     def __str__(self):
         return f"{self.vehicle_number} - {self.hospital.name}"
 
+    coordinate_fields = (
+        ("current_latitude", "current_latitude_e6"),
+        ("current_longitude", "current_longitude_e6"),
+    )
+
     def get_current_location(self):
         """Get current ambulance location"""
-        if self.current_latitude and self.current_longitude:
-            return (float(self.current_latitude), float(self.current_longitude))
+        if (
+            self.current_latitude_e6 is not None
+            and self.current_longitude_e6 is not None
+        ):
+            return (
+                self.current_latitude_e6 / MICRODEGREES,
+                self.current_longitude_e6 / MICRODEGREES,
+            )
         return None
 
     class Meta:
         ordering = ["hospital", "vehicle_number"]
+        indexes = [
+            models.Index(fields=["hospital", "status"]),
+            models.Index(fields=["status"]),
+        ]
 
 
-class EmergencyContact(BaseModel):
+def _pack_track(values):
+    """Pack a flat list of int32 values into little-endian bytes"""
+    packed = array("i", values)
+    if sys.byteorder == "big":
+        packed.byteswap()
+    return packed.tobytes()
+
+
+def _unpack_track(data):
+    """Unpack little-endian bytes into a flat array of int32 values"""
+    values = array("i")
+    values.frombytes(bytes(data))
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+
+class AmbulanceLocationSegment(BaseModel):
+    """
+    Compact segment of an ambulance's location history
+
+    Fixes are stored as int32 triples of (milliseconds, latitude
+    microdegrees, longitude microdegrees). The first triple holds absolute
+    coordinates at started_at; every following triple is a delta from the
+    previous fix. Times are kept at millisecond precision: each delta is
+    taken from the previous decoded time, which ended_at holds, so rounding
+    does not accumulate along the segment.
+    """
+
+    ambulance = models.ForeignKey(
+        Ambulance, on_delete=models.CASCADE, related_name="location_segments"
+    )
+    started_at = models.DateTimeField()
+    ended_at = models.DateTimeField()
+    resolution = models.PositiveIntegerField(
+        default=0, help_text="Downsampling interval in seconds (0 = raw fixes)"
+    )
+    point_count = models.PositiveIntegerField(default=0)
+    last_latitude_e6 = models.IntegerField()
+    last_longitude_e6 = models.IntegerField()
+    data = models.BinaryField()
+
+    def __str__(self):
+        return f"{self.ambulance_id} {self.started_at} ({self.point_count} points)"
+
+    @classmethod
+    def from_points(cls, ambulance_id, points, resolution=0):
+        """
+        Build an unsaved segment from (timestamp, latitude, longitude) points
+
+        Args:
+            ambulance_id: Ambulance primary key
+            points: Non-empty list of (datetime, float, float) sorted by time
+            resolution: Downsampling interval of the points in seconds
+        """
+        timestamp, latitude, longitude = points[0]
+        segment = cls(
+            ambulance_id=ambulance_id,
+            started_at=timestamp,
+            ended_at=timestamp,
+            resolution=resolution,
+            point_count=1,
+            last_latitude_e6=to_microdegrees(latitude),
+            last_longitude_e6=to_microdegrees(longitude),
+        )
+        segment.data = _pack_track(
+            [0, segment.last_latitude_e6, segment.last_longitude_e6]
+        )
+        segment.append_points(points[1:])
+        return segment
+
+    def append_points(self, points):
+        """
+        Append (timestamp, latitude, longitude) points at least a
+        millisecond newer than ended_at
+
+        Args:
+            points: List of (datetime, float, float) sorted by time
+
+        Returns:
+            Number of points appended
+        """
+        values = []
+        ended_at = self.ended_at
+        latitude_e6 = self.last_latitude_e6
+        longitude_e6 = self.last_longitude_e6
+
+        for timestamp, latitude, longitude in points:
+            milliseconds = (timestamp - ended_at) // timedelta(milliseconds=1)
+            if milliseconds < 1:
+                continue
+            next_latitude_e6 = to_microdegrees(latitude)
+            next_longitude_e6 = to_microdegrees(longitude)
+            values.extend(
+                (
+                    milliseconds,
+                    next_latitude_e6 - latitude_e6,
+                    next_longitude_e6 - longitude_e6,
+                )
+            )
+            ended_at += timedelta(milliseconds=milliseconds)
+            latitude_e6 = next_latitude_e6
+            longitude_e6 = next_longitude_e6
+
+        if values:
+            self.data = bytes(self.data) + _pack_track(values)
+            self.point_count += len(values) // 3
+            self.ended_at = ended_at
+            self.last_latitude_e6 = latitude_e6
+            self.last_longitude_e6 = longitude_e6
+        return len(values) // 3
+
+    def get_points(self):
+        """Return the segment's fixes as a list of (datetime, float, float)"""
+        values = _unpack_track(self.data)
+        points = []
+        timestamp = self.started_at
+        latitude_e6 = longitude_e6 = 0
+        for index in range(0, len(values), 3):
+            timestamp += timedelta(milliseconds=values[index])
+            latitude_e6 += values[index + 1]
+            longitude_e6 += values[index + 2]
+            points.append(
+                (timestamp, latitude_e6 / MICRODEGREES, longitude_e6 / MICRODEGREES)
+            )
+        return points
+
+    class Meta:
+        ordering = ["ambulance", "started_at"]
+        indexes = [models.Index(fields=["ambulance", "started_at"])]
+
+
+class EmergencyContact(PhoneNumberMixin, BaseModel):
     """
     Additional emergency contacts for patients
     """
@@ -436,6 +1198,9 @@ class EmergencyContact(BaseModel):
     )
     name = models.CharField(max_length=100)
     phone_number = models.CharField(max_length=15)
+    phone_e164 = models.CharField(
+        max_length=16, null=True, blank=True, editable=False, db_index=True
+    )
     email = models.EmailField(blank=True)
     relationship = models.CharField(max_length=15, choices=RELATIONSHIP_CHOICES)
     address = models.TextField(blank=True)
@@ -445,5 +1210,98 @@ class EmergencyContact(BaseModel):
     def __str__(self):
         return f"{self.name} - {self.patient.first_name} {self.patient.last_name}"
 
+    phone_fields = (("phone_number", "phone_e164"),)
+    duplicate_phone_message = (
+        "An emergency contact with this phone number already exists."
+    )
+
     class Meta:
         ordering = ["-is_primary", "name"]
+
+
+class CompactJSONEncoder(DjangoJSONEncoder):
+    """DjangoJSONEncoder without whitespace between items"""
+
+    def __init__(self, *args, **kwargs):
+        kwargs["separators"] = (",", ":")
+        super().__init__(*args, **kwargs)
+
+
+class EmergencyCard(models.Model):
+    """
+    Precomputed emergency card of a patient
+
+    Everything responders need at a glance (blood group, conditions,
+    medications, contacts and the latest medical records) as one JSON
+    document, so emergency and notification views read it by primary key
+    instead of querying several tables. api.cards rebuilds the affected
+    section when the patient, their contacts or their records change.
+    """
+
+    patient = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="emergency_card",
+    )
+    card = models.JSONField(default=dict, encoder=CompactJSONEncoder)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Emergency card of {self.patient_id}"
+
+
+class ArchivedEmergency(models.Model):
+    """
+    Closed emergency moved out of the hot Emergency table
+
+    Rows keep the original id and timestamps. The full API representation
+    at archive time is kept in `data`, so history endpoints can return
+    archived and live emergencies in the same shape.
+    """
+
+    id = models.UUIDField(primary_key=True, editable=False)
+    patient = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="archived_emergencies"
+    )
+    assigned_hospital_id = models.UUIDField(null=True, blank=True)
+    priority = models.CharField(max_length=10, choices=Emergency.PRIORITY_CHOICES)
+    status = models.CharField(max_length=15, choices=Emergency.STATUS_CHOICES)
+    created_at = models.DateTimeField()
+    completed_at = models.DateTimeField(null=True, blank=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
+    data = models.JSONField(encoder=DjangoJSONEncoder)
+
+    def __str__(self):
+        return f"Archived emergency #{self.id}"
+
+    class Meta:
+        ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["patient", "created_at"]),
+            models.Index(fields=["status"]),
+        ]
+
+
+class ArchivedNotification(models.Model):
+    """
+    Notification of an archived emergency, stored like ArchivedEmergency
+    """
+
+    id = models.UUIDField(primary_key=True, editable=False)
+    emergency = models.ForeignKey(
+        ArchivedEmergency, on_delete=models.CASCADE, related_name="notifications"
+    )
+    hospital_id = models.UUIDField(null=True, blank=True)
+    user_id = models.UUIDField(null=True, blank=True)
+    notification_type = models.CharField(
+        max_length=25, choices=Notification.NOTIFICATION_TYPES
+    )
+    created_at = models.DateTimeField()
+    data = models.JSONField(encoder=DjangoJSONEncoder)
+
+    def __str__(self):
+        return f"Archived {self.notification_type} #{self.id}"
+
+    class Meta:
+        ordering = ["-created_at"]
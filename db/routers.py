@@ -0,0 +1,104 @@
+"""
+Database routers for regional shards and read replicas
+"""
+
+import contextvars
+import random
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from .sharding import get_current_shard, is_regional
+
+# Apps whose reads always go to the primary. Authentication must see a
+# token or session the moment it is created, before it reaches a replica.
+PRIMARY_ONLY_APPS = {"authtoken", "sessions"}
+
+_replica_reads = contextvars.ContextVar("replica_reads", default=None)
+
+
+class ReplicaReadState:
+    """Per-request flag allowing reads to be served by a replica"""
+
+    def __init__(self, allowed=False):
+        self.allowed = allowed
+        self.wrote = False
+
+
+@contextmanager
+def replica_reads(allowed=True):
+    """
+    Allow or forbid replica reads for the code inside the block
+
+    Args:
+        allowed: Whether reads may go to a replica
+
+    Yields:
+        ReplicaReadState for the block
+    """
+    state = ReplicaReadState(allowed)
+    token = _replica_reads.set(state)
+    try:
+        yield state
+    finally:
+        _replica_reads.reset(token)
+
+
+class PrimaryReplicaRouter:
+    """
+    Route reads to DATABASE_REPLICAS when the current request allows it
+
+    Reads use the primary unless they run inside replica_reads(), so
+    management commands, signals and background work are unaffected. A
+    write in the block switches the rest of it back to the primary, and
+    reads inside a transaction on the primary stay there.
+    """
+
+    def db_for_read(self, model, **hints):
+        replicas = getattr(settings, "DATABASE_REPLICAS", [])
+        state = _replica_reads.get()
+        if (
+            not replicas
+            or state is None
+            or not state.allowed
+            or model._meta.app_label in PRIMARY_ONLY_APPS
+            or connections[DEFAULT_DB_ALIAS].in_atomic_block
+        ):
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        state = _replica_reads.get()
+        if state is not None:
+            state.allowed = False
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary
+        return True
+
+
+class RegionalShardRouter:
+    """
+    Route regional models to the shard of the current use_shard() block
+
+    Objects loaded from a shard keep using it for their own saves and
+    related lookups. Everything else falls through to the next router.
+    """
+
+    def _db_for_model(self, model, **hints):
+        if not is_regional(model):
+            return None
+        instance = hints.get("instance")
+        if instance is not None and is_regional(type(instance)):
+            if instance._state.db not in (None, DEFAULT_DB_ALIAS):
+                return instance._state.db
+        alias = get_current_shard()
+        if alias in (None, DEFAULT_DB_ALIAS):
+            return None
+        return alias
+
+    db_for_read = _db_for_model
+    db_for_write = _db_for_model
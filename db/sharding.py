@@ -0,0 +1,335 @@
+"""
+Regional sharding of hospitals, ambulances, emergencies and notifications
+
+Each region in DATABASE_SHARD_REGIONS has its own database holding the
+region's hospitals, ambulances, location history, emergencies and
+notifications. Users, emergency contacts and medical records stay in the
+default database, which also acts as the region for every location and
+state not covered by a shard. Hospitals saved in a shard are mirrored to
+the default database as a directory copy, so medical records can
+reference them and the hospital total is a single count. Copies keep the
+home_region of their shard and regional queries skip them
+(HospitalQuerySet.regional()).
+"""
+
+import contextvars
+import copy
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# Models (db app) that live in the regional shards
+REGIONAL_MODELS = {
+    "hospital",
+    "hospitalspecialization",
+    "ambulance",
+    "ambulancelocationsegment",
+    "emergency",
+    "notification",
+    "archivedemergency",
+    "archivednotification",
+}
+
+DEFAULT_REGION = "default"
+
+_current_shard = contextvars.ContextVar("current_shard", default=None)
+
+
+class ShardScope:
+    """Database alias regional queries use for the current block"""
+
+    def __init__(self, alias=None):
+        self.alias = alias
+
+
+@contextmanager
+def use_shard(alias=None):
+    """
+    Send regional queries inside the block to a shard
+
+    Args:
+        alias: Shard database alias; may also be set later on the scope
+
+    Yields:
+        ShardScope for the block
+    """
+    scope = ShardScope(alias)
+    token = _current_shard.set(scope)
+    try:
+        yield scope
+    finally:
+        _current_shard.reset(token)
+
+
+def get_current_shard():
+    """Return the shard alias of the enclosing use_shard() block, if any"""
+    scope = _current_shard.get()
+    return scope.alias if scope is not None else None
+
+
+def is_regional(model):
+    """Return whether a model's rows live in the regional shards"""
+    return model._meta.app_label == "db" and model._meta.model_name in REGIONAL_MODELS
+
+
+def get_shard_aliases():
+    """Return every database holding regional data, default first"""
+    return [DEFAULT_DB_ALIAS, *getattr(settings, "DATABASE_SHARDS", {}).values()]
+
+
+def shard_for_region(region):
+    """
+    Get the database alias of a region
+
+    Args:
+        region: Region name
+
+    Returns:
+        Database alias, or None for an unknown region
+    """
+    if region == DEFAULT_REGION:
+        return DEFAULT_DB_ALIAS
+    return getattr(settings, "DATABASE_SHARDS", {}).get(region)
+
+
+def region_for_shard(alias):
+    """Return the region name served by a database alias"""
+    for region, shard in getattr(settings, "DATABASE_SHARDS", {}).items():
+        if shard == alias:
+            return region
+    return DEFAULT_REGION
+
+
+def region_for_location(latitude, longitude):
+    """
+    Get the region containing a point
+
+    Args:
+        latitude: Point latitude
+        longitude: Point longitude
+
+    Returns:
+        Region name, DEFAULT_REGION when no region's bounds contain the point
+    """
+    latitude = float(latitude)
+    longitude = float(longitude)
+    regions = getattr(settings, "DATABASE_SHARD_REGIONS", {})
+    for region, config in regions.items():
+        for min_lat, min_lon, max_lat, max_lon in config.get("bounds", ()):
+            if min_lat <= latitude <= max_lat and min_lon <= longitude <= max_lon:
+                return region
+    return DEFAULT_REGION
+
+
+def shard_for_location(latitude, longitude):
+    """
+    Get the shard whose region contains a point
+
+    Args:
+        latitude: Point latitude
+        longitude: Point longitude
+
+    Returns:
+        Database alias
+    """
+    return shard_for_region(region_for_location(latitude, longitude))
+
+
+def shard_for_state(state):
+    """
+    Get the shard whose region contains a state
+
+    Args:
+        state: State name as stored on Hospital.state
+
+    Returns:
+        Database alias
+    """
+    state = (state or "").strip().casefold()
+    regions = getattr(settings, "DATABASE_SHARD_REGIONS", {})
+    for region, config in regions.items():
+        if state in {name.casefold() for name in config.get("states", ())}:
+            return shard_for_region(region)
+    return DEFAULT_DB_ALIAS
+
+
+def fan_out(func, aliases=None):
+    """
+    Run a function against every shard in parallel
+
+    Each call runs in its own thread inside use_shard(alias), so regional
+    queries in it hit that shard.
+
+    Args:
+        func: Callable taking the database alias
+        aliases: Aliases to run against (defaults to every shard)
+
+    Returns:
+        Dict mapping alias to the function's result
+    """
+    aliases = list(aliases or get_shard_aliases())
+    if len(aliases) == 1:
+        with use_shard(aliases[0]):
+            return {aliases[0]: func(aliases[0])}
+
+    def run(alias):
+        try:
+            with use_shard(alias):
+                return func(alias)
+        finally:
+            # Connections are per thread; do not leak the worker's
+            connections.close_all()
+
+    with ThreadPoolExecutor(max_workers=len(aliases)) as pool:
+        return dict(zip(aliases, pool.map(run, aliases)))
+
+
+class ShardLocationCache:
+    """
+    Bounded LRU cache of (model, primary key) -> shard alias
+
+    Regional rows stay in the shard they were created in, so entries need
+    no expiry. The cache is per process; a row that moved shards is found
+    again once its stale entry is forgotten (see forget_shard_location).
+    """
+
+    def __init__(self, max_size=None):
+        self.max_size = max_size or getattr(
+            settings, "SHARD_LOCATION_CACHE_SIZE", 100000
+        )
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        """Return the cached alias for a key, or None"""
+        with self._lock:
+            alias = self._entries.get(key)
+            if alias is not None:
+                self._entries.move_to_end(key)
+            return alias
+
+    def set(self, key, alias):
+        """Cache the alias of a key"""
+        with self._lock:
+            self._entries[key] = alias
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def pop(self, key):
+        """Drop a key, returning its alias or None"""
+        with self._lock:
+            return self._entries.pop(key, None)
+
+    def clear(self):
+        """Drop every entry"""
+        with self._lock:
+            self._entries.clear()
+
+
+shard_locations = ShardLocationCache()
+
+
+def _location_key(model, pk):
+    return model._meta.label_lower, str(pk)
+
+
+def locate_shard(model, pk):
+    """
+    Find the shard holding a regional row
+
+    Locations are cached per process. On a miss the shards are checked one
+    by one on this thread's persistent connections, regional shards first
+    because default may hold a directory copy of the row.
+
+    Args:
+        model: Regional model class
+        pk: Primary key
+
+    Returns:
+        Database alias, or None if no shard has the row
+    """
+    try:
+        pk = model._meta.pk.to_python(pk)
+    except ValidationError:
+        return None
+    key = _location_key(model, pk)
+    alias = shard_locations.get(key)
+    if alias is not None:
+        return alias
+    for alias in reversed(get_shard_aliases()):
+        if model._base_manager.using(alias).filter(pk=pk).exists():
+            shard_locations.set(key, alias)
+            return alias
+    return None
+
+
+def forget_shard_location(model, pk):
+    """
+    Drop the cached shard of a row, e.g. after it moved or was not found
+
+    Returns:
+        The alias that was cached, or None
+    """
+    try:
+        pk = model._meta.pk.to_python(pk)
+    except ValidationError:
+        return None
+    return shard_locations.pop(_location_key(model, pk))
+
+
+def mirror_row(instance, alias):
+    """
+    Copy or refresh a row in another database
+
+    Rows referenced across databases (patients of regional emergencies,
+    hospitals of medical records) are mirrored so foreign keys hold.
+
+    Args:
+        instance: Saved model instance
+        alias: Target database alias
+    """
+    if alias == (instance._state.db or DEFAULT_DB_ALIAS):
+        return
+    mirror_rows([instance], alias)
+
+
+def mirror_rows(instances, alias, batch_size=None):
+    """
+    Copy or refresh rows of one model in another database
+
+    Fields listed in the model's mirror_redacted_fields are written with
+    their placeholder value instead, so secrets such as password hashes
+    stay in the source database.
+
+    Args:
+        instances: Saved model instances of the same model
+        alias: Target database alias
+        batch_size: Rows per INSERT statement
+    """
+    if not instances:
+        return
+    model = type(instances[0])
+    redacted = getattr(model, "mirror_redacted_fields", {})
+    clones = []
+    for instance in instances:
+        clone = copy.copy(instance)
+        clone._state = copy.copy(instance._state)
+        for field, value in redacted.items():
+            setattr(clone, field, value)
+        clones.append(clone)
+    fields = [
+        field.name for field in model._meta.concrete_fields if not field.primary_key
+    ]
+    model._default_manager.using(alias).bulk_create(
+        clones,
+        batch_size=batch_size,
+        update_conflicts=True,
+        unique_fields=[model._meta.pk.name],
+        update_fields=fields,
+    )
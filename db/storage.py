@@ -0,0 +1,171 @@
+"""
+Content-addressed, deduplicating file storage
+"""
+
+import hashlib
+import os
+import tempfile
+from pathlib import Path
+
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage
+from django.db.models import F, FileField
+from django.utils import timezone
+from django.utils.deconstruct import deconstructible
+
+BLOB_PREFIX = "blobs/"
+COPY_BUFFER_SIZE = 64 * 1024
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    FileSystemStorage that stores each distinct file content once
+
+    Saved files are hashed with SHA-256 while they are streamed to disk and
+    named blobs/<aa>/<bb>/<digest><ext>. A StoredBlob row per digest records
+    the one name its content is stored under, so saving the same bytes
+    again, whatever the file's extension, returns that name without writing
+    a second copy. The row also counts the model fields that reference the
+    blob (kept by api.signals); `manage.py collect_blobs` deletes blobs
+    nobody references.
+    Names saved before this storage was used keep resolving as plain files.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # Names are content addresses: an existing name already holds the
+        # same bytes, so it must be reused rather than suffixed
+        return name
+
+    def _save(self, name, content):
+        from db.models import StoredBlob
+
+        extension = Path(name).suffix.lower()
+        directory = Path(self.location) / BLOB_PREFIX
+        directory.mkdir(parents=True, exist_ok=True)
+        digest = hashlib.sha256()
+
+        if hasattr(content, "temporary_file_path"):
+            # Already on disk: hash it in place and move it if it is new
+            source = content.temporary_file_path()
+            with open(source, "rb") as file:
+                for data in iter(lambda: file.read(COPY_BUFFER_SIZE), b""):
+                    digest.update(data)
+            size = os.path.getsize(source)
+        else:
+            handle, source = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            size = 0
+            with os.fdopen(handle, "wb") as file:
+                for data in content.chunks(COPY_BUFFER_SIZE):
+                    file.write(data)
+                    digest.update(data)
+                    size += len(data)
+
+        hexdigest = digest.hexdigest()
+        name = f"{BLOB_PREFIX}{hexdigest[:2]}/{hexdigest[2:4]}/{hexdigest}{extension}"
+
+        # Record the save before touching the file, so collect_blobs never
+        # removes a blob that is being saved again (it skips recent saves)
+        blob, created = StoredBlob.objects.get_or_create(
+            digest=hexdigest, defaults={"name": name, "size": size}
+        )
+        if not created:
+            StoredBlob.objects.filter(digest=hexdigest).update(
+                last_saved_at=timezone.now()
+            )
+            # The content is stored once, under the name of its first save
+            name = blob.name
+        path = Path(self.path(name))
+
+        try:
+            os.utime(path)
+            stored = True
+        except FileNotFoundError:
+            stored = False
+        if stored:
+            if not hasattr(content, "temporary_file_path"):
+                os.unlink(source)
+        else:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            file_move_safe(source, path, allow_overwrite=True)
+            if self.file_permissions_mode is not None:
+                os.chmod(path, self.file_permissions_mode)
+        return name
+
+    def delete(self, name):
+        # Blobs may be shared; they are only removed by collect_blobs
+        if not name.startswith(BLOB_PREFIX):
+            super().delete(name)
+
+
+content_storage = ContentAddressedStorage()
+
+
+def get_content_storage():
+    """Storage for patient files that are often uploaded more than once"""
+    return content_storage
+
+
+def blob_digest(name):
+    """Digest of a blob storage name, whatever its extension"""
+    return Path(name).stem
+
+
+def change_blob_references(names, delta):
+    """
+    Adjust the reference counts of stored blobs
+
+    Args:
+        names: Storage names; names outside the blob store are ignored
+        delta: +1 or -1 per name
+    """
+    from db.models import StoredBlob
+
+    for name in names:
+        if name and name.startswith(BLOB_PREFIX):
+            StoredBlob.objects.filter(digest=blob_digest(name)).update(
+                refcount=F("refcount") + delta
+            )
+
+
+def blob_files(blob):
+    """
+    Storage names of the files holding a blob's content
+
+    Blobs saved before StoredBlob names were reused may also be stored under
+    another extension next to the recorded name.
+
+    Args:
+        blob: StoredBlob instance
+
+    Returns:
+        List of storage names, the recorded name first
+    """
+    directory = Path(blob.name).parent
+    names = [blob.name]
+    try:
+        entries = os.listdir(content_storage.path(str(directory)))
+    except FileNotFoundError:
+        return names
+    for entry in sorted(entries):
+        name = f"{directory}/{entry}"
+        if Path(entry).stem == blob.digest and name != blob.name:
+            names.append(name)
+    return names
+
+
+def blob_reference_fields():
+    """
+    Find the model file fields stored in the content-addressed storage
+
+    Returns:
+        List of (model, field) pairs, proxy models included
+    """
+    from django.apps import apps
+
+    return [
+        (model, field)
+        for model in apps.get_models()
+        for field in model._meta.concrete_fields
+        if isinstance(field, FileField) and field.storage is content_storage
+    ]